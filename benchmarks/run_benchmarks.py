@@ -0,0 +1,292 @@
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import importlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmarks do pipeline com dados sintéticos (src/synthetic_cvm.py): roda offline
+# em qualquer máquina Linux e compara com a baseline gravada na mesma máquina.
+#
+#   python benchmarks/run_benchmarks.py                   # mede e compara com a baseline
+#   python benchmarks/run_benchmarks.py --save-baseline   # grava a baseline desta máquina
+#   python benchmarks/run_benchmarks.py --check           # exit 1 se algum estágio regrediu
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT, "src")
+sys.path.insert(0, SRC_DIR)
+
+import pandas as pd  # noqa: E402
+import pyarrow as pa  # noqa: E402
+import streamlit.logger  # noqa: E402
+
+import synthetic_cvm  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+
+# Regressão = mais lento que a baseline em mais de TOLERANCE e em mais de NOISE_FLOOR segundos,
+# ou pico de RSS maior em mais de TOLERANCE e em mais de MEMORY_NOISE_FLOOR MB
+TOLERANCE = 0.25
+NOISE_FLOOR = 0.05
+MEMORY_NOISE_FLOOR = 16.0
+
+DEMOS = ["BPA", "BPP", "DRE"]
+
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c")) if ctypes.util.find_library("c") else None
+
+
+def _proc_status_mb(field):
+    with open("/proc/self/status", "r", encoding="ascii") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 2**10
+    raise OSError(field)
+
+
+def _reset_peak_rss():
+    """
+    Zera o pico de RSS do processo (VmHWM, Linux) e devolve o RSS atual em MB; None
+    onde não há /proc. Antes, devolve ao sistema a memória livre do Python/libc e do Arrow
+    para que o estágio anterior não mascare o crescimento do próximo.
+    """
+    gc.collect()
+    pa.default_memory_pool().release_unused()
+    if _libc is not None and hasattr(_libc, "malloc_trim"):
+        _libc.malloc_trim(0)  # glibc: páginas livres do heap voltam ao sistema
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return _proc_status_mb("VmRSS")
+    except OSError:
+        return None
+
+
+def measure(fn, repeat):
+    """
+    Mediana/mínimo de `repeat` execuções, aumento do pico de RSS em cada uma (inclui a
+    memória do Arrow, que o tracemalloc não vê; vale o menor, sem efeitos da primeira
+    execução) e pico do heap Python (tracemalloc) numa execução extra.
+    """
+    times = []
+    rss_peaks = []
+    result = None
+    for _ in range(repeat):
+        result = None  # o resultado anterior não conta no RSS desta execução
+        rss_before = _reset_peak_rss()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+        if rss_before is not None:
+            rss_peaks.append(_proc_status_mb("VmHWM") - rss_before)
+
+    # Execução separada para memória: o tracemalloc deixa o código mais lento
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = {
+        "seconds": round(statistics.median(times), 4),
+        "min_seconds": round(min(times), 4),
+        "peak_mb": round(peak / 2**20, 1),
+        "rss_peak_mb": round(min(rss_peaks), 1) if rss_peaks else None,
+    }
+    return stats, result
+
+
+def prepare_data(workdir, companies, years, accounts, seed):
+    """Gera os ZIPs sintéticos em workdir/data_raw (reaproveita se a escala for a mesma)."""
+    scale = {"companies": companies, "years": years, "accounts": accounts, "seed": seed}
+    marker = os.path.join(workdir, "data_raw", "synthetic_scale.json")
+    if os.path.exists(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            if json.load(f) == scale:
+                return scale
+
+    print(f"Gerando dados sintéticos em {workdir}/data_raw ...")
+    synthetic_cvm.generate(os.path.join(workdir, "data_raw"), companies, years, accounts, seed)
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(scale, f)
+    return scale
+
+
+def run_stages(years, repeat):
+    """Mede cada estágio do pipeline; os caminhos relativos apontam para o workdir atual."""
+    extract = importlib.import_module("02_extract_metrics")
+    import cvm_parquet
+    from derived_metrics import evaluate
+    from exports import export_dataset
+    from validation import check_dataset, check_statements
+    # Fora do `streamlit run` os caches avisam que não há runtime; o benchmark não precisa dele
+    streamlit.logger.set_log_level(logging.ERROR)
+    import dashboard_data
+
+    year = years[-1]
+    files = {demo: extract.statement_filename(year, demo) for demo in DEMOS}
+    read_opts = {"companies": None, "ordem_exerc": list(extract.ORDEM_SUFFIX)}
+    results = {}
+
+    def load_csv_stream():
+        return {demo: extract.load_csv(year, name, use_cache=False, **read_opts) for demo, name in files.items()}
+
+    def parquet_ingest():
+        for name in files.values():
+            cvm_parquet.ingest_statement(year, name, force=True)
+
+    def load_csv_parquet():
+        return {demo: extract.load_csv(year, name, use_cache=True, **read_opts) for demo, name in files.items()}
+
+    results["load_csv (CSV/ZIP, 1 ano)"], _ = measure(load_csv_stream, repeat)
+    results["parquet_ingest (1 ano)"], _ = measure(parquet_ingest, repeat)
+    results["load_csv (Parquet, 1 ano)"], statements = measure(load_csv_parquet, repeat)
+
+    results["extract_metrics (1 ano)"], _ = measure(lambda: extract.extract_metrics(statements), repeat)
+
+    def unmapped():
+        return {
+            demo: extract.build_unmapped_report(
+                df, demo, year, extract.DS_CONTA_BY_DEMO[demo], extract.CD_CONTA_BY_DEMO[demo]
+            )
+            for demo, df in statements.items()
+        }
+
+    results["build_unmapped_report (1 ano)"], _ = measure(unmapped, repeat)
+    results["validação demonstrações (1 ano)"], _ = measure(lambda: check_statements(statements, year), repeat)
+
+    # Métricas base de todos os anos (fora da medição) para os estágios seguintes
+    all_data = [extract.process_year(y, True, "all")[0] for y in years]
+    final_df = pd.concat(all_data, ignore_index=True)
+
+    results["pivot + métricas derivadas"], pivot = measure(
+        lambda: evaluate(extract.build_pivot(final_df)), repeat
+    )
+
+    results["validação do dataset"], _ = measure(lambda: check_dataset(pivot), repeat)
+
+    os.makedirs("outputs", exist_ok=True)
+    results["export Arrow"], _ = measure(lambda: export_dataset(pivot, "arrow"), repeat)
+    results["export CSV"], _ = measure(lambda: export_dataset(pivot, "csv"), repeat)
+    results["export Excel"], _ = measure(lambda: export_dataset(pivot, "xlsx"), repeat)
+
+    def dashboard_prep():
+        # Caches limpos: mede o trabalho de um processo novo (parse + ranking)
+        for cached in (dashboard_data._final_dataset, dashboard_data._peer_groups, dashboard_data._rankings):
+            cached.clear()
+        df = dashboard_data.load_final_dataset()
+        groups = dashboard_data.load_peer_groups()
+        dashboard_data.load_rankings(groups["Todas as companhias"], sorted(df["year"].unique()))
+
+    results["dashboard prep (cold)"], _ = measure(dashboard_prep, repeat)
+    return results
+
+
+def _mb(value):
+    return f"{value:>8.1f} MB" if value is not None else f"{'-':>8} MB"
+
+
+def compare(results, baseline):
+    """Linhas da comparação e lista dos estágios que regrediram (tempo ou pico de RSS)."""
+    lines = []
+    regressions = []
+    for stage, stats in results.items():
+        rss = stats.get("rss_peak_mb")
+        measured = f"{stage:<34} {stats['seconds']:>8.3f}s {_mb(rss)} RSS {_mb(stats['peak_mb'])} Python"
+        base = baseline.get("stages", {}).get(stage)
+        if base is None:
+            lines.append(f"{measured}   (sem baseline)")
+            continue
+        ratio = stats["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+        slower = stats["seconds"] - base["seconds"] > NOISE_FLOOR and ratio > 1 + TOLERANCE
+        comparison = f"baseline {base['seconds']:.3f}s ({ratio:.2f}x)"
+
+        # baselines sem rss_peak_mb (ou sem /proc) só comparam tempo
+        base_rss = base.get("rss_peak_mb")
+        bigger = False
+        if rss is not None and base_rss is not None:
+            bigger = rss - base_rss > MEMORY_NOISE_FLOOR and rss > base_rss * (1 + TOLERANCE)
+            comparison += f" {base_rss:.1f} MB"
+
+        flag = "  REGRESSÃO" if slower else ""
+        flag += "  REGRESSÃO (memória)" if bigger else ""
+        lines.append(f"{measured}   {comparison}{flag}")
+        if slower or bigger:
+            regressions.append(stage)
+    return lines, regressions
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline com dados sintéticos da CVM.")
+    parser.add_argument("--companies", type=int, default=synthetic_cvm.DEFAULT_COMPANIES)
+    parser.add_argument("--years", type=int, nargs="+", default=[2023, 2024])
+    parser.add_argument("--accounts", type=int, default=synthetic_cvm.DEFAULT_ACCOUNTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--workdir",
+        default=os.path.join(tempfile.gettempdir(), "brazil-banks-bench"),
+        help="onde ficam os dados sintéticos e os outputs do benchmark (reaproveitado entre execuções)",
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="grava o resultado como baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 se algum estágio regrediu")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    scale = prepare_data(args.workdir, args.companies, args.years, args.accounts, args.seed)
+
+    cwd = os.getcwd()
+    os.chdir(args.workdir)
+    try:
+        stages = run_stages(args.years, args.repeat)
+    finally:
+        os.chdir(cwd)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "scale": scale,
+        "repeat": args.repeat,
+        "stages": stages,
+    }
+    write_json(RESULTS_PATH, report)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != scale:
+            print(f"Aviso: baseline gravada em outra escala ({baseline.get('scale')}); comparação ignorada.")
+            baseline = {}
+
+    lines, regressions = compare(stages, baseline)
+    print(f"\nEscala: {scale} | repetições: {args.repeat}")
+    print("\n".join(lines))
+    print(f"\nResultado salvo: {RESULTS_PATH}")
+
+    if args.save_baseline or not baseline:
+        write_json(args.baseline, report)
+        print(f"Baseline salva: {args.baseline}")
+
+    if args.check and regressions:
+        print(f"\nRegressões: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
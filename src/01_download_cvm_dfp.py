@@ -1,41 +1,66 @@
+import argparse
 import os
-import requests
-import zipfile
+
+from cvm_download import DEFAULT_JOBS, DownloadManifest, download_many
+from cvm_reader import SOURCES, extract_members, statement_files
 
 # ===== CONFIGURAÇÃO =====
 YEARS = [2020, 2021, 2022, 2023, 2024]
-BASE_URL = "https://dados.cvm.gov.br/dados/CIA_ABERTA/DOC/DFP/DADOS/"
 OUTPUT_DIR = "data_raw"
 
-def download_file(url, output_path):
-    print(f"Baixando: {url}")
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        with open(output_path, "wb") as f:
-            f.write(response.content)
-        print(f"Arquivo salvo em: {output_path}")
-        
-        # Extrair automaticamente o ZIP
-        extract_dir = os.path.splitext(output_path)[0]
-        os.makedirs(extract_dir, exist_ok=True)
-
-        with zipfile.ZipFile(output_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+def extract_zip(output_path, year, source):
+    # Extrai só os CSVs consolidados que o pipeline lê (BPA/BPP/DRE _con), como o
+    # ensure_raw_data do 02_extract_metrics.py; DFC/DVA/DMPL/_ind ficam no ZIP
+    extract_dir = os.path.splitext(output_path)[0]
+    extract_members(output_path, statement_files(year, [source]), extract_dir)
 
-        print(f"Arquivos extraídos em: {extract_dir}")        
-    else:
-        print(f"Erro ao baixar {url} - Status code: {response.status_code}")
+    print(f"Arquivos extraídos em: {extract_dir}")
 
 def main():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    parser = argparse.ArgumentParser(description="Baixa os ZIPs anuais da DFP/ITR (CVM).")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="downloads simultâneos")
+    parser.add_argument(
+        "--sources",
+        nargs="+",
+        choices=list(SOURCES),
+        default=["dfp"],
+        help="fontes a baixar: dfp (anual) e/ou itr (trimestral)",
+    )
+    parser.add_argument("--base-url", help="substitui a URL da CVM (só com uma fonte)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="extrai só os CSVs usados dos ZIPs baixados (o 02_extract_metrics.py lê direto do ZIP)",
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.base_url and len(args.sources) > 1:
+        parser.error("--base-url só pode ser usado com uma única fonte")
 
-    for year in YEARS:
-        filename = f"dfp_cia_aberta_{year}.zip"
-        url = BASE_URL + filename
-        output_path = os.path.join(OUTPUT_DIR, filename)
-        
-        download_file(url, output_path)
+    targets = []
+    for source in args.sources:
+        base_url = args.base_url or SOURCES[source]["url"]
+        for year in YEARS:
+            filename = f"{SOURCES[source]['prefix']}_{year}.zip"
+            url = base_url + filename
+            output_path = os.path.join(args.output_dir, filename)
+            targets.append((url, output_path, year, source))
+
+    manifest = DownloadManifest(os.path.join(args.output_dir, "download_manifest.json"))
+    results = download_many([(url, path) for url, path, _, _ in targets], jobs=args.jobs, manifest=manifest)
+
+    if not args.extract:
+        return
+
+    for _, output_path, year, source in targets:
+        status = results[output_path]
+        extract_dir = os.path.splitext(output_path)[0]
+        # Só reextrai o que mudou (ou o que ainda não foi extraído)
+        if status in ("downloaded", "resumed") or (status == "unchanged" and not os.path.isdir(extract_dir)):
+            extract_zip(output_path, year, source)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
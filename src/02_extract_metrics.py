@@ -1,38 +1,39 @@
 import pandas as pd
+import numpy as np
+import argparse
+import functools
+import hashlib
+import json
 import os
-import zipfile
-import requests
+from concurrent.futures import ProcessPoolExecutor
+
+from account_map import CD_CONTA_MAP, DS_CONTA_MAP, METRIC_DEMO, SUBTREE_METRICS
+from account_tree import subtree_metrics
+from cvm_download import DEFAULT_JOBS, download_many
+from cvm_parquet import ingest_statement, partition_path, read_cached
+from cvm_reader import (
+    DEMOS, extract_members, extracted_dir, extracted_path, read_statement, statement_filename,
+    statement_files, statement_fingerprint, statement_size, zip_path, zip_url,
+)
+from derived_metrics import PRIOR_SUFFIX, evaluate
+from diagnostics import UNMAPPED_COUNTS, UNMAPPED_ROOT, consolidate_counts, has_unmapped, write_unmapped
+from dq_cube import build_dq_cube, dq_cube_paths, write_dq_cube
+from exports import CANONICAL_FORMAT, DEFAULT_EXPORTS, SECONDARY_FORMATS, export_dataset, output_path, write_output
+from run_report import LAST_RUN, RUN_HISTORY, RunReport, profiled
+from universe import DEFAULT_UNIVERSE, NO_SECTOR, UNIVERSES, company_sectors, load_sectors, universe_companies
+from validation import VIOLATIONS, check_dataset, check_statements, write_violations
 
 YEARS = [2020, 2021, 2022, 2023, 2024]
 
-BANKS = [
-    "ITAU UNIBANCO HOLDING S.A.",
-    "BCO BRASIL S.A.",
-    "BCO BRADESCO S.A.",
-    "BCO SANTANDER (BRASIL) S.A.",
-    "BCO BTG PACTUAL S.A."
+# Colunas lidas dos CSVs (extração + relatório de unmapped); o resto nem é convertido
+READ_COLUMNS = [
+    "DENOM_CIA", "CD_CVM", "DT_REFER", "VERSAO", "DT_INI_EXERC", "DT_FIM_EXERC", "ORDEM_EXERC",
+    "CD_CONTA", "DS_CONTA", "VL_CONTA", "GRUPO_DFP", "ESCALA_MOEDA", "MOEDA",
 ]
 
-DS_CONTA_MAP = {
-    "total_assets": [
-        "Ativo Total",
-    ],
-    "equity": [
-        "Patrimônio Líquido Consolidado",
-        # opcional (dependendo de ano/companhia, pode existir variação):
-        "Patrimônio Líquido",
-    ],
-    "net_income": [
-        "Lucro ou Prejuízo Líquido Consolidado do Período",
-        # opcionais comuns em variações:
-        "Lucro/Prejuízo do Período",
-        "Lucro (Prejuízo) Líquido do Período",
-    ],
-        "operating_result_proxy": [
-        "Resultado Bruto de Intermediação Financeira",
-        "Resultado Bruto Intermediação Financeira",
-    ],
-}
+# Exercícios lidos de cada arquivo: o corrente (ÚLTIMO) e o comparativo do ano
+# anterior (PENÚLTIMO), que vira a métrica `<métrica>_prior` na mesma linha
+ORDEM_SUFFIX = {"ÚLTIMO": "", "PENÚLTIMO": PRIOR_SUFFIX}
 
 DS_CONTA_BY_DEMO = {
     "BPA": DS_CONTA_MAP["total_assets"],
@@ -40,204 +41,556 @@ DS_CONTA_BY_DEMO = {
     "DRE": DS_CONTA_MAP["net_income"] + DS_CONTA_MAP["operating_result_proxy"],
 }
 
-def build_unmapped_report(df, demo_label, year, used_ds_conta_list):
+CD_CONTA_BY_DEMO = {
+    demo: [cd for metric, d in METRIC_DEMO.items() if d == demo for cd in CD_CONTA_MAP.get(metric, [])]
+    for demo in DS_CONTA_BY_DEMO
+}
+
+def build_mapping_table():
     """
-    Retorna linhas (dos BANKS, ÚLTIMO) cujo DS_CONTA NÃO está em used_ds_conta_list.
-    Mantém colunas essenciais para análise.
+    Tabela de mapeamento (demo, metric, key, value, rank): uma linha por candidato.
+    `key` é a coluna comparada (CD_CONTA ou DS_CONTA); rank menor = maior prioridade
+    (códigos primeiro, depois os rótulos na ordem de DS_CONTA_MAP).
     """
-    df_u = df.copy()
+    rows = []
+    for metric, demo in METRIC_DEMO.items():
+        candidates = [("CD_CONTA", cd) for cd in CD_CONTA_MAP.get(metric, [])]
+        candidates += [("DS_CONTA", ds) for ds in DS_CONTA_MAP[metric]]
+        for rank, (key, value) in enumerate(candidates):
+            rows.append({"demo": demo, "metric": metric, "key": key, "value": value, "rank": rank})
+    return pd.DataFrame(rows)
 
-    # filtros padrão do projeto
-    df_u = df_u[df_u["DENOM_CIA"].isin(BANKS)]
-    if "ORDEM_EXERC" in df_u.columns:
-        df_u = df_u[df_u["ORDEM_EXERC"] == "ÚLTIMO"]
+MAPPING_TABLE = build_mapping_table()
 
-    # exclui linhas mapeadas
-    df_u = df_u[~df_u["DS_CONTA"].isin(used_ds_conta_list)]
+def build_unmapped_report(df, demo_label, year, used_ds_conta_list, used_cd_conta_list=(), companies=None):
+    """
+    Retorna linhas (das `companies` do universo, ÚLTIMO) cujo DS_CONTA NÃO está em
+    used_ds_conta_list (nem o CD_CONTA em used_cd_conta_list). companies=None = todas.
+    Mantém colunas essenciais para análise.
+    """
+    # filtros padrão do projeto + exclusão das linhas mapeadas numa única máscara
+    # (sem cópia do statement inteiro: só as linhas/colunas selecionadas são materializadas)
+    mask = ~df["DS_CONTA"].isin(used_ds_conta_list)
+    if companies is not None:
+        mask &= df["DENOM_CIA"].isin(companies)
+    if used_cd_conta_list and "CD_CONTA" in df.columns:
+        mask &= ~df["CD_CONTA"].isin(used_cd_conta_list)
+    if "ORDEM_EXERC" in df.columns:
+        mask &= df["ORDEM_EXERC"] == "ÚLTIMO"
 
     # seleciona colunas úteis (só as que existirem)
     cols_pref = ["DENOM_CIA", "DT_REFER", "DS_CONTA", "CD_CONTA", "VL_CONTA", "GRUPO_DFP", "ESCALA_MOEDA", "MOEDA"]
-    cols = [c for c in cols_pref if c in df_u.columns]
+    cols = [c for c in cols_pref if c in df.columns]
 
-    df_u = df_u[cols].copy()
+    df_u = df.loc[mask, cols]
     df_u.insert(0, "demo", demo_label)
     df_u.insert(0, "year", year)
 
     return df_u
 
-def ensure_raw_data(year):
+# Fontes lidas em cada modo (--periods): anual = só DFP; trimestral = ITR (1T-3T) + DFP (4T)
+PERIOD_SOURCES = {
+    "annual": ["dfp"],
+    "quarterly": ["dfp", "itr"],
+}
+
+def ensure_raw_data(years, extract=False, jobs=DEFAULT_JOBS, sources=("dfp",), refresh=False):
     """
-    Garante que o ZIP do ano foi baixado e extraído em data_raw/dfp_cia_aberta_{year}/
+    Garante que os ZIPs dos anos foram baixados em data_raw/{dfp|itr}_cia_aberta_{year}.zip
+    (os que faltam são baixados em paralelo). Os CSVs são lidos direto do ZIP;
+    com extract=True, grava só os CSVs usados em data_raw/{dfp|itr}_cia_aberta_{year}/.
+    Com refresh=True, revalida todos os ZIPs na CVM com GET condicional (ETag /
+    Last-Modified do manifesto): os inalterados voltam 304 e não são baixados, os
+    republicados são substituídos. Sem rede, os ZIPs locais continuam valendo.
     """
-    folder = f"data_raw/dfp_cia_aberta_{year}"
-    os.makedirs(folder, exist_ok=True)
-
-    # Se os CSVs principais já existem, não faz nada
-    expected = [
-        f"{folder}/dfp_cia_aberta_BPA_con_{year}.csv",
-        f"{folder}/dfp_cia_aberta_BPP_con_{year}.csv",
-        f"{folder}/dfp_cia_aberta_DRE_con_{year}.csv",
-    ]
-    if all(os.path.exists(p) for p in expected):
-        return
-
-    url = f"https://dados.cvm.gov.br/dados/CIA_ABERTA/DOC/DFP/DADOS/dfp_cia_aberta_{year}.zip"
-    zip_path = f"{folder}/dfp_cia_aberta_{year}.zip"
-
-    # Baixa ZIP se não existir
-    if not os.path.exists(zip_path):
-        r = requests.get(url, stream=True, timeout=120)
-        r.raise_for_status()
-        with open(zip_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
-
-    # Extrai
-    with zipfile.ZipFile(zip_path, "r") as z:
-        z.extractall(folder)
-
-def load_csv(year: int, filename: str) -> pd.DataFrame:
-    path = f"data_raw/dfp_cia_aberta_{year}/{filename}"
-    return pd.read_csv(path, sep=";", encoding="latin1")
-
-def extract_metric(df: pd.DataFrame, ds_conta: str) -> pd.DataFrame:
-    # Pega apenas o exercício atual ("ÚLTIMO") e a conta exata pelo texto.
-    return df[
-        (df["DS_CONTA"] == ds_conta) &
-        (df["ORDEM_EXERC"] == "ÚLTIMO")
-    ][["DENOM_CIA", "DT_REFER", "VL_CONTA"]].copy()
-
-def extract_metric_mapped(df, metric_name, ds_conta_candidates):
+    targets = []
+    for year in years:
+        for source in sources:
+            path = zip_path(year, source=source)
+            if refresh:
+                targets.append((zip_url(year, source), path))
+                continue
+
+            # Se os CSVs principais já foram extraídos, não precisa do ZIP
+            expected = [extracted_path(year, name) for name in statement_files(year, [source])]
+            if all(os.path.exists(p) for p in expected):
+                continue
+
+            # Baixa ZIP se não existir (retoma download parcial, se houver)
+            if not os.path.exists(path):
+                targets.append((zip_url(year, source), path))
+
+    if targets:
+        results = download_many(targets, jobs=min(jobs, len(targets)))
+        failed = [path for path, status in results.items() if status.startswith("error")]
+        stale = [path for path in failed if os.path.exists(path)]
+        if stale:
+            print(f"Aviso: não foi possível revalidar {', '.join(sorted(stale))}; usando a cópia local.")
+        missing = sorted(set(failed) - set(stale))
+        if missing:
+            raise RuntimeError(f"Falha ao baixar: {', '.join(missing)}")
+
+    if extract:
+        for year in years:
+            for source in sources:
+                path = zip_path(year, source=source)
+                if os.path.exists(path):
+                    extract_members(path, statement_files(year, [source]), extracted_dir(year, source=source))
+
+def load_csv(year: int, filename: str, companies=None, ordem_exerc=None, use_cache=True,
+             columns=READ_COLUMNS) -> pd.DataFrame:
     """
-    Tenta extrair uma métrica usando uma lista de possíveis DS_CONTA.
-    Retorna o primeiro resultado não vazio.
-    Anexa o DS_CONTA escolhido em tmp.attrs["ds_conta_used"] para rastreabilidade.
+    Lê um statement da DFP/ITR só com as colunas usadas e já filtrado por companhia/ORDEM_EXERC.
+    Com use_cache=True, o CSV é convertido uma única vez para o dataset Parquet
+    (data_parquet/{dfp|itr}/year=/demo=) e as leituras seguintes são scans colunares;
+    sem cache, o CSV é filtrado bloco a bloco enquanto é lido.
     """
-    last_empty = None
+    if use_cache:
+        ingest_statement(year, filename)
+        return read_cached(year, filename, companies=companies, ordem_exerc=ordem_exerc, columns=columns)
 
-    for ds in ds_conta_candidates:
-        tmp = extract_metric(df, ds)
-        if tmp is not None and not tmp.empty:
-            tmp["metric"] = metric_name
-            tmp.attrs["ds_conta_used"] = ds
-            return tmp
-        last_empty = tmp
+    return read_statement(year, filename, columns=columns, companies=companies, ordem_exerc=ordem_exerc)
 
-    if last_empty is None:
-        empty = df.head(0).assign(metric=metric_name)[["DENOM_CIA", "DT_REFER", "VL_CONTA", "metric"]]
-        empty.attrs["ds_conta_used"] = None
-        return empty
+def statement_bytes(year: int, filename: str, use_cache=True) -> int:
+    """Tamanho do arquivo que load_csv leu: a partição Parquet (cache) ou o CSV/membro do ZIP."""
+    if use_cache:
+        return os.path.getsize(partition_path(year, filename))
+    return statement_size(year, filename)
 
-    last_empty["metric"] = metric_name
-    last_empty.attrs["ds_conta_used"] = None
-    return last_empty
+def extract_metrics(statements, mapping=MAPPING_TABLE):
+    """
+    Resolve todas as métricas base numa passada por demonstração.
 
-def main():
-    all_data = []
-    mapping_usage = []
-    unmapped_all = []
-    for year in YEARS:
-        print(f"Processando ano {year}")
-        ensure_raw_data(year)
-
-        df_bpa = load_csv(year, f"dfp_cia_aberta_BPA_con_{year}.csv")
-        df_bpp = load_csv(year, f"dfp_cia_aberta_BPP_con_{year}.csv")
-
-        # Filtrar só os 5 bancos
-        df_bpa = df_bpa[df_bpa["DENOM_CIA"].isin(BANKS)]
-        df_bpp = df_bpp[df_bpp["DENOM_CIA"].isin(BANKS)]
-        df_dre = load_csv(year, f"dfp_cia_aberta_DRE_con_{year}.csv")
-        df_dre = df_dre[df_dre["DENOM_CIA"].isin(BANKS)]
-
-        # Unmapped reports (diagnóstico)
-        unmapped_bpa = build_unmapped_report(df_bpa, "BPA", year, DS_CONTA_BY_DEMO["BPA"])
-        unmapped_bpp = build_unmapped_report(df_bpp, "BPP", year, DS_CONTA_BY_DEMO["BPP"])
-        unmapped_dre = build_unmapped_report(df_dre, "DRE", year, DS_CONTA_BY_DEMO["DRE"])
-
-        unmapped_bpa.to_csv(f"outputs/unmapped_lines_{year}_BPA.csv", index=False, sep=";", encoding="latin1")
-        unmapped_bpp.to_csv(f"outputs/unmapped_lines_{year}_BPP.csv", index=False, sep=";", encoding="latin1")
-        unmapped_dre.to_csv(f"outputs/unmapped_lines_{year}_DRE.csv", index=False, sep=";", encoding="latin1")
-
-        # Extrair métricas base
-        total_assets = extract_metric_mapped(df_bpa, "total_assets", DS_CONTA_MAP["total_assets"])
-        equity = extract_metric_mapped(df_bpp, "equity", DS_CONTA_MAP["equity"])
-        net_income = extract_metric_mapped(df_dre, "net_income", DS_CONTA_MAP["net_income"])
-        operating_result_proxy = extract_metric_mapped(
-            df_dre,
-            "operating_result_proxy",
-            DS_CONTA_MAP["operating_result_proxy"]
+    `statements` = {demo: df}. Cada df é cruzado (merge) com os candidatos da
+    tabela de mapeamento daquela demo e, por companhia/DT_REFER/métrica, fica o
+    candidato de menor rank (empate: primeira linha do arquivo). Assim cada banco
+    usa o rótulo que ele mesmo publica. Linhas PENÚLTIMO viram `<métrica>_prior`.
+
+    Retorna (dados, uso): dados tem DENOM_CIA/DT_REFER/VL_CONTA/metric; uso tem a
+    proveniência por companhia/DT_REFER (DS_CONTA/CD_CONTA escolhidos e a chave que casou).
+    """
+    found = []
+    for demo, df in statements.items():
+        suffix = df["ORDEM_EXERC"].astype(str).map(ORDEM_SUFFIX)
+        for key, cand in mapping[mapping["demo"] == demo].groupby("key", sort=False):
+            hit = suffix.notna() & df[key].isin(cand["value"])
+            rows = df.loc[hit, ["DENOM_CIA", "DT_REFER", "VL_CONTA", "DS_CONTA", "CD_CONTA"]]
+            rows = rows.assign(row=np.flatnonzero(hit), match_value=rows[key].astype(str), suffix=suffix[hit])
+            found.append(
+                rows.merge(cand[["metric", "key", "value", "rank"]], left_on="match_value", right_on="value")
+            )
+
+    cols = ["DENOM_CIA", "DT_REFER", "VL_CONTA", "metric"]
+    if not found:
+        return pd.DataFrame(columns=cols), pd.DataFrame(
+            columns=["DENOM_CIA", "DT_REFER", "metric", "ds_conta_used", "cd_conta_used", "matched_by"]
         )
 
-        net_income["metric"] = "net_income"
-        mapping_usage.append({"year": year, "metric": "total_assets", "ds_conta_used": total_assets.attrs.get("ds_conta_used")})
-        mapping_usage.append({"year": year, "metric": "equity", "ds_conta_used": equity.attrs.get("ds_conta_used")})
-        mapping_usage.append({"year": year, "metric": "net_income", "ds_conta_used": net_income.attrs.get("ds_conta_used")})   
-        mapping_usage.append({"year": year, "metric": "operating_result_proxy", "ds_conta_used": operating_result_proxy.attrs.get("ds_conta_used")})
+    best = (
+        pd.concat(found, ignore_index=True)
+        .sort_values(["rank", "row"], kind="stable")
+        .drop_duplicates(["DENOM_CIA", "DT_REFER", "metric", "suffix"])
+    )
 
-        total_assets["metric"] = "total_assets"
-        equity["metric"] = "equity"
+    # Ordem estável: métricas na ordem de METRIC_DEMO, linhas na ordem do arquivo
+    best["metric_order"] = best["metric"].map({m: i for i, m in enumerate(METRIC_DEMO)})
+    best = best.sort_values(["metric_order", "row"])
 
-        year_data = pd.concat([total_assets, equity, net_income, operating_result_proxy], ignore_index=True)
-        year_data["year"] = year
+    # Proveniência do exercício corrente (o comparativo usa o mesmo plano de contas)
+    usage = best.loc[best["suffix"] == "", ["DENOM_CIA", "DT_REFER", "metric", "DS_CONTA", "CD_CONTA", "key"]].rename(
+        columns={"DS_CONTA": "ds_conta_used", "CD_CONTA": "cd_conta_used", "key": "matched_by"}
+    )
+    best["metric"] = best["metric"] + best["suffix"]
+    return best[cols].reset_index(drop=True), usage.reset_index(drop=True)
 
-        all_data.append(year_data)
+def mapping_usage_report(usage, companies, year):
+    """
+    Proveniência por companhia/DT_REFER/métrica do ano (no modo trimestral, uma linha
+    por trimestre: troca de rótulo entre trimestres fica visível). Métricas sem
+    candidato numa data em que a companhia publicou outras aparecem com ds_conta_used
+    vazio, e companhias sem nenhuma métrica com DT_REFER vazio (lacuna visível em vez de silenciosa).
+    """
+    keys = ["DENOM_CIA", "DT_REFER", "metric"]
+    usage = usage.astype({"DENOM_CIA": str, "DT_REFER": str}).drop_duplicates(keys)
+    dates = usage[["DENOM_CIA", "DT_REFER"]].drop_duplicates()
+    missing = sorted(set(companies) - set(dates["DENOM_CIA"]))
+    dates = pd.concat([dates, pd.DataFrame({"DENOM_CIA": missing, "DT_REFER": None})], ignore_index=True)
+    dates = dates.sort_values(["DENOM_CIA", "DT_REFER"], kind="stable")
+
+    grid = dates.merge(pd.DataFrame({"metric": list(METRIC_DEMO)}), how="cross")
+    report = grid.merge(usage, on=keys, how="left")
+    report.insert(0, "year", year)
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extrai métricas dos bancos a partir da DFP/ITR (CVM).")
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="também extrai os CSVs usados para data_raw/ (por padrão são lidos direto do ZIP)",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="revalida os ZIPs já baixados na CVM (GET condicional; só baixa os republicados)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="lê os CSVs a cada execução em vez do cache Parquet (data_parquet/)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="processa N anos em paralelo (pool de processos); 1 = serial",
+    )
+    parser.add_argument(
+        "--universe",
+        choices=list(UNIVERSES),
+        default=DEFAULT_UNIVERSE,
+        help="companhias processadas: 'banks' (5 bancos) ou 'all' (todas as companhias da DFP)",
+    )
+    parser.add_argument(
+        "--periods",
+        choices=list(PERIOD_SOURCES),
+        default="annual",
+        help="'annual' (só DFP) ou 'quarterly' (ITR 1T-3T + DFP 4T, uma linha por trimestre)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="ignora o manifesto da última execução e reprocessa todos os anos",
+    )
+    parser.add_argument(
+        "--export",
+        nargs="*",
+        choices=SECONDARY_FORMATS,
+        default=DEFAULT_EXPORTS,
+        help="formatos extras do dataset final além do Arrow (outputs/final_dataset.arrow); "
+             "padrão: csv. Ex.: --export csv xlsx; --export sem valores = só Arrow",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["cprofile", "tracemalloc"],
+        help="grava um profile da execução em outputs/run_report/ (use com --jobs 1 para incluir os anos)",
+    )
+    return parser.parse_args()
 
-    final_df = pd.concat(all_data, ignore_index=True)
+def keep_latest_version(df):
+    """
+    Um documento (companhia/DT_REFER) reapresentado aparece com VERSAO maior; fica
+    só a versão mais recente de cada um.
+    """
+    if "VERSAO" not in df.columns or df.empty:
+        return df
+    latest = df.groupby(["DENOM_CIA", "DT_REFER"], observed=True)["VERSAO"].transform("max")
+    return df[df["VERSAO"] == latest]
 
-    # Pivot para ter assets e equity na mesma linha por banco/ano
-    pivot = final_df.pivot_table(
-        index=["DENOM_CIA", "year", "DT_REFER"],
-        columns="metric",
-        values="VL_CONTA",
-        aggfunc="first"
-    ).reset_index()
+def keep_year_to_date(df):
+    """
+    A DRE do ITR traz, para o mesmo DT_REFER, o trimestre isolado e o acumulado no ano
+    (DT_INI_EXERC diferentes). Fica só o acumulado (menor DT_INI_EXERC), que é
+    comparável com o valor anual da DFP no 4T.
+    """
+    if "DT_INI_EXERC" not in df.columns or df.empty:
+        return df
+    start = df.groupby(["DENOM_CIA", "DT_REFER", "ORDEM_EXERC"], observed=True)["DT_INI_EXERC"].transform("min")
+    return df[df["DT_INI_EXERC"].isna() | (df["DT_INI_EXERC"] == start)]
 
-    # Derivar passivo: liabilities = assets - equity
-    pivot["total_liabilities"] = pivot["total_assets"] - pivot["equity"]
+def keep_comparable_prior(df):
+    """
+    Linhas PENÚLTIMO só valem como comparativo se cobrem o mesmo período um ano antes
+    (DT_FIM_EXERC = DT_REFER - 1 ano). No ITR o balanço compara com o fim do exercício
+    anterior (31/12), que não é o mesmo trimestre: essas linhas saem.
+    """
+    if "DT_FIM_EXERC" not in df.columns or df.empty:
+        return df
+    refer = df["DT_REFER"].astype(str)
+    year_before = (refer.str[:4].astype(int) - 1).astype(str) + refer.str[4:]
+    return df[(df["ORDEM_EXERC"] != "PENÚLTIMO") | (df["DT_FIM_EXERC"].astype(str) == year_before)]
 
-    # Métricas derivadas
-    pivot["ROE"] = pivot["net_income"] / pivot["equity"]
-    pivot["ROA"] = pivot["net_income"] / pivot["total_assets"]
-    pivot["operating_ROA"] = pivot["operating_result_proxy"] / pivot["total_assets"]
+def quarter_of(dt_refer):
+    """DT_REFER (AAAA-MM-DD) -> trimestre 1..4."""
+    return (pd.to_datetime(dt_refer).dt.month - 1) // 3 + 1
 
-    # ---------------------------
-    # YoY Growth (Year over Year)
-    # ---------------------------
+def process_year(year, use_cache=True, universe=DEFAULT_UNIVERSE, periods="annual", report=None):
+    """
+    Todo o trabalho independente de um ano: leitura, filtro, unmapped e métricas base.
+    No modo trimestral, lê também o ITR do ano (1T-3T); a DFP fornece o 4T.
+    Retorna (year_data, mapping_usage do ano, {demo: unmapped}, companhias DENOM_CIA/CD_CVM,
+    violações das regras sobre as demonstrações).
+    Roda no processo principal (--jobs 1) ou num worker do ProcessPoolExecutor.
+    Os tempos de cada estágio vão para `report` (RunReport).
+    """
+    print(f"Processando ano {year}")
+    report = report if report is not None else RunReport()
+    companies = universe_companies(universe)
+
+    # Só as companhias do universo, exercício corrente e comparativo (filtro aplicado já na leitura)
+    read_opts = {"companies": companies, "ordem_exerc": list(ORDEM_SUFFIX), "use_cache": use_cache}
+    statements = {}
+    for demo in DEMOS:
+        frames = []
+        for source in PERIOD_SOURCES[periods]:
+            filename = statement_filename(year, demo, source)
+            with report.stage(f"read_{source}", year, demo) as stage:
+                df = keep_latest_version(load_csv(year, filename, **read_opts))
+                frames.append(keep_comparable_prior(keep_year_to_date(df)))
+                stage["rows_out"] = len(frames[-1])
+                stage["bytes_read"] = statement_bytes(year, filename, use_cache)
+        statements[demo] = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    rows_read = sum(len(df) for df in statements.values())
+
+    # Unmapped reports (diagnóstico)
+    with report.stage("unmapped", year, rows_in=rows_read) as stage:
+        unmapped = {
+            demo: build_unmapped_report(df, demo, year, DS_CONTA_BY_DEMO[demo], CD_CONTA_BY_DEMO[demo], companies)
+            for demo, df in statements.items()
+        }
+        stage["rows_out"] = sum(len(df_u) for df_u in unmapped.values())
+
+    # Extrair métricas base (todas de uma vez, melhor candidato por companhia e período)
+    with report.stage("extract_metrics", year, rows_in=rows_read) as stage:
+        year_data, usage = extract_metrics(statements)
+        if SUBTREE_METRICS:
+            # Uma árvore por exercício (ÚLTIMO e PENÚLTIMO têm as mesmas contas e DT_REFER)
+            subtrees = [year_data]
+            for ordem, suffix in ORDEM_SUFFIX.items():
+                part = {demo: df[df["ORDEM_EXERC"] == ordem] for demo, df in statements.items()}
+                sub = subtree_metrics(part, SUBTREE_METRICS)
+                subtrees.append(sub.assign(metric=sub["metric"] + suffix))
+            year_data = pd.concat(subtrees, ignore_index=True)
+        stage["rows_out"] = len(year_data)
+
+    # Regras de validação que precisam das linhas das demonstrações (identidades, pai = soma dos filhos)
+    with report.stage("validate_statements", year, rows_in=rows_read) as stage:
+        violations = check_statements(statements, year)
+        stage["rows_out"] = len(violations)
+    year_data["year"] = year
+    if periods == "quarterly":
+        year_data["quarter"] = quarter_of(year_data["DT_REFER"])
+
+    year_companies = (
+        pd.concat([df[["DENOM_CIA", "CD_CVM"]].astype({"DENOM_CIA": str}) for df in statements.values()])
+        .drop_duplicates("DENOM_CIA")
+        .reset_index(drop=True)
+    )
+    mapping_usage = mapping_usage_report(usage, year_companies["DENOM_CIA"], year)
 
-    yoy_metrics = [
-        "total_assets",
-        "equity",
-        "net_income",
-        "operating_result_proxy",
-    ]
+    return year_data, mapping_usage, unmapped, year_companies, violations
 
-    for metric in yoy_metrics:
-        if metric in pivot.columns:
-            pivot = pivot.sort_values(["DENOM_CIA", "year"])
-            pivot[f"{metric}_YoY"] = (
-                pivot.groupby("DENOM_CIA")[metric]
-                .pct_change(fill_method=None)
-            )
+def _process_year_timed(year, **kwargs):
+    # No worker: RunReport próprio, devolvido junto com o resultado do ano
+    report = RunReport()
+    return process_year(year, report=report, **kwargs), report.records
 
-    # Salvar dataset final
-    pivot.to_csv("outputs/final_dataset.csv", index=False)
-    pivot.to_excel("outputs/final_dataset.xlsx", index=False)
-    print(f"Unmapped {year} | BPA: {len(unmapped_bpa)} | BPP: {len(unmapped_bpp)} | DRE: {len(unmapped_dre)}")
+def run_years(years, jobs=1, use_cache=True, universe=DEFAULT_UNIVERSE, periods="annual", report=None):
+    """
+    Executa process_year para cada ano. Com jobs > 1, os anos vão para um pool de
+    processos; os resultados voltam sempre na ordem de `years` (executor.map),
+    então o merge é idêntico ao da execução serial. Os tempos dos workers são
+    juntados em `report`.
+    """
+    report = report if report is not None else RunReport()
+    if jobs <= 1 or len(years) <= 1:
+        return [process_year(year, use_cache, universe, periods, report) for year in years]
+
+    worker = functools.partial(_process_year_timed, use_cache=use_cache, universe=universe, periods=periods)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(years))) as pool:
+        results = list(pool.map(worker, years))
+    for _, records in results:
+        report.adopt(records)
+    return [result for result, _ in results]
+
+def period_keys(df):
+    """Chaves do período: (year) no modo anual, (year, quarter) no trimestral."""
+    return ["year", "quarter"] if "quarter" in df.columns else ["year"]
+
+def build_pivot(final_df):
+    """Pivot (banco/período) das métricas base; as derivadas vêm de derived_metrics.evaluate."""
+    return final_df.pivot_table(
+        index=["DENOM_CIA", *period_keys(final_df), "DT_REFER"],
+        columns="metric",
+        values="VL_CONTA",
+        aggfunc="first",
+        observed=True,
+    ).reset_index()
 
-    unmapped_all.append(unmapped_bpa)
-    unmapped_all.append(unmapped_bpp)
-    unmapped_all.append(unmapped_dre)
+def add_sector(pivot, companies, sectors):
+    """Coluna `sector` (SETOR_ATIV do cadastro da CVM) logo após DENOM_CIA."""
+    sector = pivot["DENOM_CIA"].astype(str).map(company_sectors(companies, sectors)).fillna(NO_SECTOR)
+    pivot = pivot.drop(columns="sector", errors="ignore")
+    pivot.insert(1, "sector", sector)
+    return pivot
+
+# ---------------------------
+# Execução incremental
+# ---------------------------
+
+RUN_MANIFEST = "outputs/run_manifest.json"
+YEAR_CACHE_DIR = "outputs/cache"
+PIVOT_CACHE = f"{YEAR_CACHE_DIR}/pivot.pkl"
+
+# Incrementar quando a lógica de extração mudar (invalida o cache por ano)
+PIPELINE_VERSION = 9
+
+def config_hash(universe=DEFAULT_UNIVERSE, periods="annual"):
+    """Hash da configuração de mapeamento: mudou => todos os anos são reprocessados."""
+    config = {
+        "PIPELINE_VERSION": PIPELINE_VERSION,
+        "universe": universe,
+        "periods": periods,
+        "companies": universe_companies(universe),
+        "DS_CONTA_MAP": DS_CONTA_MAP,
+        "CD_CONTA_MAP": CD_CONTA_MAP,
+        "SUBTREE_METRICS": SUBTREE_METRICS,
+        "READ_COLUMNS": READ_COLUMNS,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+def year_input_hash(year, periods="annual"):
+    """Hash dos CSVs (BPA/BPP/DRE _con, DFP e ITR conforme `periods`) de entrada do ano."""
+    h = hashlib.sha256()
+    for filename in statement_files(year, PERIOD_SOURCES[periods]):
+        h.update(statement_fingerprint(year, filename).encode())
+    return h.hexdigest()
+
+def year_cache_path(year):
+    return f"{YEAR_CACHE_DIR}/year_{year}.pkl"
+
+def load_run_manifest():
+    if not os.path.exists(RUN_MANIFEST):
+        return {}
+    with open(RUN_MANIFEST, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_run_manifest(manifest):
+    tmp = RUN_MANIFEST + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, RUN_MANIFEST)
+
+def changed_years(manifest, cfg_hash, input_hashes):
+    """Anos cujo hash de entrada (ou a configuração) mudou desde a última execução."""
+    if manifest.get("config_hash") != cfg_hash:
+        return list(input_hashes)
+
+    previous = manifest.get("years", {})
+    return [
+        year for year, h in input_hashes.items()
+        if previous.get(str(year)) != h or not os.path.exists(year_cache_path(year))
+    ]
+
+def run_pipeline(args, report):
+    all_data = []
+    mapping_usage = []
+    statement_violations = []
+    unmapped_lines = 0
+    companies = []
+
+    os.makedirs(YEAR_CACHE_DIR, exist_ok=True)
+    sources = PERIOD_SOURCES[args.periods]
+    with report.stage("download"):
+        ensure_raw_data(YEARS, extract=args.extract, sources=sources, refresh=args.refresh)
+
+    with report.stage("input_hashes"):
+        cfg_hash = config_hash(args.universe, args.periods)
+        input_hashes = {year: year_input_hash(year, args.periods) for year in YEARS}
+    manifest = {} if args.full else load_run_manifest()
+    changed = changed_years(manifest, cfg_hash, input_hashes)
+
+    formats = [CANONICAL_FORMAT, *args.export]
+    required = [output_path(fmt) for fmt in formats] + [VIOLATIONS, *dq_cube_paths().values()]
+    outputs_ready = all(os.path.exists(path) for path in required)
+    if not changed and os.path.exists(PIVOT_CACHE) and outputs_ready:
+        print("Nenhuma entrada mudou desde a última execução; outputs/ já está atualizado.")
+        return
 
-    df_unmapped_all = pd.concat(unmapped_all, ignore_index=True)
-    df_unmapped_all.to_csv("outputs/unmapped_lines_all_years.csv", index=False, sep=";", encoding="latin1")
+    print(f"Anos a reprocessar: {changed if changed else 'nenhum'}")
+    with report.stage("process_years") as stage:
+        fresh = dict(zip(changed, run_years(changed, args.jobs, not args.no_cache, args.universe, args.periods, report)))
+        stage["rows_out"] = sum(len(result[0]) for result in fresh.values())
 
-    print("\nArquivo salvo: outputs/unmapped_lines_all_years.csv")
-    print("Total linhas unmapped (all years):", len(df_unmapped_all))
+    for year in YEARS:
+        with report.stage("year_cache", year):
+            if year in fresh:
+                pd.to_pickle(fresh[year], year_cache_path(year))
+                year_data, year_mapping, unmapped, year_companies, year_violations = fresh[year]
+            else:
+                year_data, year_mapping, unmapped, year_companies, year_violations = pd.read_pickle(year_cache_path(year))
+
+        # Diagnóstico: partições year=/demo= só dos anos reprocessados (ou que faltam em disco)
+        with report.stage("write_unmapped", year) as stage:
+            for demo, df_u in unmapped.items():
+                if year in fresh or not has_unmapped(year, demo):
+                    write_unmapped(year, demo, df_u)
+            stage["rows_out"] = sum(len(df_u) for df_u in unmapped.values())
+        unmapped_lines += sum(len(df_u) for df_u in unmapped.values())
+        print(f"Unmapped {year} | BPA: {len(unmapped['BPA'])} | BPP: {len(unmapped['BPP'])} | DRE: {len(unmapped['DRE'])}")
+
+        mapping_usage.append(year_mapping)
+        all_data.append(year_data)
+        companies.append(year_companies)
+        statement_violations.append(year_violations)
+
+    incremental = manifest.get("config_hash") == cfg_hash and os.path.exists(PIVOT_CACHE)
+    with report.stage("pivot") as stage:
+        if incremental:
+            # Reaproveita as linhas dos anos sem mudança; só os anos alterados passam pelo pivot
+            previous = pd.read_pickle(PIVOT_CACHE)
+            kept = previous[previous["year"].isin(YEARS) & ~previous["year"].isin(changed)]
+            pivot = kept
+            if changed:
+                # (sem anos alterados, ex. outputs/ apagado, só regrava os outputs a partir do cache)
+                new_rows = build_pivot(pd.concat([fresh[y][0] for y in changed], ignore_index=True))
+                pivot = pd.concat([kept, new_rows], ignore_index=True)
+            stage["rows_in"] = sum(len(fresh[y][0]) for y in changed)
+        else:
+            final_df = pd.concat(all_data, ignore_index=True)
+            pivot = build_pivot(final_df)
+            stage["rows_in"] = len(final_df)
+        stage["rows_out"] = len(pivot)
+
+    # Métricas derivadas (razões, YoY/QoQ, médias, CAGR, reapresentações) de todas as linhas numa passada
+    with report.stage("derived_metrics", rows_in=len(pivot)):
+        pivot = evaluate(pivot).reset_index(drop=True)
+
+    pd.to_pickle(pivot, PIVOT_CACHE)
+
+    # Setor (cadastro da CVM) por companhia, para grupos de pares no dashboard
+    with report.stage("add_sector"):
+        pivot = add_sector(pivot, pd.concat(companies, ignore_index=True), load_sectors())
+
+    # Salvar dataset final: Arrow (canônico, lido pelo dashboard) + formatos extras pedidos
+    saved = []
+    for fmt in formats:
+        with report.stage(f"export_{fmt}", rows_in=len(pivot)):
+            saved.append(export_dataset(pivot, fmt))
+
+    with report.stage("consolidate_counts") as stage:
+        counts = consolidate_counts(YEARS)
+        stage["rows_out"] = len(counts)
+
+    # Cubo da página Data Quality: faltantes métrica x companhia x ano + resumo dos unmapped
+    with report.stage("dq_cube", rows_in=len(pivot)) as stage:
+        cube = build_dq_cube(pivot, counts)
+        write_dq_cube(cube)
+        stage["rows_out"] = len(cube["missing"])
+
+    # Validação: regras das demonstrações (por ano, do cache) + regras do dataset (todos os anos)
+    with report.stage("validation", rows_in=len(pivot)) as stage:
+        violations = pd.concat([*statement_violations, check_dataset(pivot)], ignore_index=True)
+        write_violations(violations)
+        stage["rows_out"] = len(violations)
+
+    print(f"\nDiagnóstico salvo: {UNMAPPED_ROOT}/ (linhas por year=/demo= + {UNMAPPED_COUNTS})")
+    print("Total linhas unmapped (all years):", unmapped_lines)
+    print(f"Violações de validação: {len(violations)} ({VIOLATIONS})")
 
     print("\nArquivos salvos em outputs/:")
-    print(" - final_dataset.csv")
-    print(" - final_dataset.xlsx")
+    for path in saved:
+        print(f" - {os.path.basename(path)}")
 
     print("\nColunas do pivot:")
     print(list(pivot.columns))
@@ -245,7 +598,7 @@ def main():
     print("\nChecagem (incluindo operating_result_proxy):")
     print(
         pivot[
-            ["DENOM_CIA", "year", "total_assets", "equity", "net_income", "operating_result_proxy", "total_liabilities", "ROE", "ROA"]
+            ["DENOM_CIA", *period_keys(pivot), "total_assets", "equity", "net_income", "operating_result_proxy", "total_liabilities", "ROE", "ROA"]
         ].head(10)
     )
 
@@ -253,12 +606,48 @@ def main():
 
     print("\nTotal linhas (pivot):", pivot.shape)
 
-    df_mapping = pd.DataFrame(mapping_usage)
-    df_mapping.to_csv("outputs/mapping_usage.csv", index=False, sep=";")
+    df_mapping = pd.concat(mapping_usage, ignore_index=True)
+    with report.stage("export_mapping_usage", rows_in=len(df_mapping)):
+        write_output("outputs/mapping_usage.csv", df_mapping.to_csv, index=False, sep=";")
 
-    print("\nMapping usage (DS_CONTA por ano/métrica):")
+    print("\nMapping usage (DS_CONTA/CD_CONTA por ano/banco/métrica):")
     print(df_mapping)
     print("\nArquivo salvo: outputs/mapping_usage.csv")
 
+    # Só grava o manifesto depois que todos os outputs foram escritos
+    save_run_manifest({
+        "config_hash": cfg_hash,
+        "years": {str(year): h for year, h in input_hashes.items()},
+    })
+
+def print_stage_summary(stages):
+    """Tempo dos estágios de primeiro nível (somando os anos), do mais lento ao mais rápido."""
+    summary = (
+        stages[stages["parent"] == "total"]
+        .groupby("stage")[["wall_s", "cpu_s"]]
+        .sum()
+        .sort_values("wall_s", ascending=False)
+    )
+    print("\nTempo por estágio (s):")
+    print(summary.round(3).to_string())
+
+def main():
+    args = parse_args()
+    # Tempos/memória por estágio e por ano: outputs/run_report/ (também em caso de falha)
+    report = RunReport()
+    status = "failed"
+    try:
+        with profiled(args.profile), report.stage("total"):
+            run_pipeline(args, report)
+        status = "ok"
+    finally:
+        stages = report.save(
+            status=status,
+            args=vars(args),
+            years=YEARS,
+        )
+        print_stage_summary(stages)
+        print(f"\nRelatório de desempenho: {LAST_RUN} e {RUN_HISTORY}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
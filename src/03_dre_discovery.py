@@ -1,49 +1,73 @@
-import pandas as pd
-
-PATTERNS = [
-    "resultado operacional",
-    "resultado antes",
-    "resultado bruto",
-    "intermedia",
-    "margem",
-    "lucro operacional",
-    "receita",
-    "despesa",
-]
+import argparse
+import time
 
-def main():
-    df = pd.read_csv("outputs/unmapped_lines_all_years.csv", sep=";", encoding="latin1")
-
-    df = df[df["demo"] == "DRE"].copy()
-    df["ds_lower"] = df["DS_CONTA"].astype(str).str.lower()
+from account_map import METRIC_DEMO
+from diagnostics import read_unmapped_counts, read_unmapped_rows
+from discovery import discover
 
-    mask = False
-    for p in PATTERNS:
-        mask = mask | df["ds_lower"].str.contains(p, na=False)
+# Padrões padrão por métrica (busca de candidatos para o proxy de resultado operacional)
+METRIC_PATTERNS = {
+    "operating_result_proxy": [
+        "resultado operacional",
+        "resultado antes",
+        "resultado bruto",
+        "intermedia",
+        "margem",
+        "lucro operacional",
+        "receita",
+        "despesa",
+    ],
+}
 
-    hits = df[mask].copy()
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Ranqueia rótulos (DS_CONTA) não mapeados candidatos a uma métrica."
+    )
+    parser.add_argument(
+        "--metric",
+        choices=list(METRIC_DEMO),
+        default="operating_result_proxy",
+        help="métrica alvo (a demonstração vem de METRIC_DEMO)",
+    )
+    parser.add_argument(
+        "--demo",
+        choices=sorted(set(METRIC_DEMO.values())),
+        help="em vez de uma métrica, todos os rótulos da demonstração",
+    )
+    parser.add_argument(
+        "--pattern",
+        action="append",
+        help="filtra rótulos que contêm o padrão (repetível; sem acento/caixa). "
+             "Padrão: METRIC_PATTERNS da métrica; --pattern '' desliga o filtro",
+    )
+    parser.add_argument("--top", type=int, default=40)
+    return parser.parse_args()
 
-    print("\nTotal DRE unmapped:", len(df))
-    print("Total hits por padrão:", len(hits))
+def main():
+    args = parse_args()
+    metric = None if args.demo else args.metric
+    patterns = args.pattern if args.pattern is not None else METRIC_PATTERNS.get(metric, [])
+    patterns = [p for p in patterns if p]
 
-    # Top DS_CONTA por frequência (geral)
-    top = (
-        hits.groupby("DS_CONTA")
-        .size()
-        .sort_values(ascending=False)
-        .head(40)
-        .reset_index(name="freq")
-    )
+    t0 = time.perf_counter()
+    # Só as contagens pré-calculadas pelo pipeline (ano/demo/DS_CONTA), não as linhas
+    counts = read_unmapped_counts()
+    top = discover(counts, metric=metric, demo=args.demo, patterns=patterns).head(args.top)
+    elapsed = time.perf_counter() - t0
 
-    print("\nTop DS_CONTA candidatos (freq):")
-    print(top.to_string(index=False))
+    target = metric or f"demo {args.demo}"
+    print(f"\nCandidatos para {target} ({len(top)} rótulos, {elapsed:.2f}s):")
+    print(top.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
 
-    # Opcional: salvar para você olhar com calma
-    top.to_csv("outputs/dre_operating_candidates_top.csv", index=False, sep=";", encoding="latin1")
-    hits.to_csv("outputs/dre_operating_candidates_lines.csv", index=False, sep=";", encoding="latin1")
+    # Opcional: salvar para você olhar com calma (linhas lidas só para os candidatos)
+    name = metric or args.demo.lower()
+    demo = METRIC_DEMO[metric] if metric else args.demo
+    lines = read_unmapped_rows(demo=demo, ds_conta=top["DS_CONTA"].tolist())
+    top.to_csv(f"outputs/{name}_candidates_top.csv", index=False, sep=";", encoding="latin1")
+    lines.to_csv(f"outputs/{name}_candidates_lines.csv", index=False, sep=";", encoding="latin1")
     print("\nArquivos salvos em outputs/:")
-    print(" - dre_operating_candidates_top.csv")
-    print(" - dre_operating_candidates_lines.csv")
+    print(f" - {name}_candidates_top.csv")
+    print(f" - {name}_candidates_lines.csv")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
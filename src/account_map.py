@@ -0,0 +1,51 @@
+# Mapeamento das métricas base para as contas da DFP/ITR.
+# Usado pela extração (02_extract_metrics.py) e pela descoberta de rótulos (03_dre_discovery.py).
+
+DS_CONTA_MAP = {
+    "total_assets": [
+        "Ativo Total",
+    ],
+    "equity": [
+        "Patrimônio Líquido Consolidado",
+        # opcional (dependendo de ano/companhia, pode existir variação):
+        "Patrimônio Líquido",
+    ],
+    "net_income": [
+        "Lucro ou Prejuízo Líquido Consolidado do Período",
+        # opcionais comuns em variações:
+        "Lucro/Prejuízo do Período",
+        "Lucro (Prejuízo) Líquido do Período",
+    ],
+    "operating_result_proxy": [
+        "Resultado Bruto de Intermediação Financeira",
+        "Resultado Bruto Intermediação Financeira",
+    ],
+}
+
+# CD_CONTA tem prioridade sobre DS_CONTA quando o código é estável entre layouts
+# (ver docs/mapping_notes.md). "1" é a raiz do BPA (Ativo Total) em todos os layouts da CVM.
+CD_CONTA_MAP = {
+    "total_assets": ["1"],
+}
+
+# Demonstração de origem de cada métrica base
+METRIC_DEMO = {
+    "total_assets": "BPA",
+    "equity": "BPP",
+    "net_income": "DRE",
+    "operating_result_proxy": "DRE",
+}
+
+# Métricas "soma da subárvore" de um CD_CONTA, resolvidas pelo índice hierárquico
+# (account_tree.py) sem nova passada nas linhas: {metric: (demo, CD_CONTA[, rótulos])}.
+# Usa o valor da própria conta e, se ela faltar, a soma das folhas da subárvore;
+# com rótulos, só vale a própria conta e com um desses DS_CONTA. Abaixo do Ativo Total ("1"), o nível 2 muda de significado conforme o layout:
+# 1.01/1.02 são Ativo Circulante/Não Circulante nas companhias em geral e Caixa e
+# Equivalentes/Ativos Financeiros nas instituições financeiras. Por isso cada métrica
+# só aceita a conta com o rótulo do seu layout.
+SUBTREE_METRICS = {
+    "current_assets": ("BPA", "1.01", ["Ativo Circulante"]),
+    "noncurrent_assets": ("BPA", "1.02", ["Ativo Não Circulante"]),
+    "cash_and_equivalents": ("BPA", "1.01", ["Caixa e Equivalentes de Caixa"]),
+    "financial_assets": ("BPA", "1.02", ["Ativos Financeiros"]),
+}
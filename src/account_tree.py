@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+# Índice hierárquico das contas (CD_CONTA "1", "1.01", "1.01.02"...) de uma demonstração.
+#
+# Cada conta vira uma chave de texto "<companhia>|<DT_REFER>|001.001.002" (segmentos
+# com largura fixa). Ordenadas, as chaves ficam em pré-ordem (pai antes dos filhos)
+# e a subárvore de X numa companhia/data é o intervalo contíguo
+# [chave(X), chave(X) + "/"), achado com duas buscas binárias ("/" vem logo depois
+# de "." e antes dos dígitos). Somas de subárvore saem de somas acumuladas.
+
+SEGMENT_WIDTH = 3
+GROUP_KEYS = ["DENOM_CIA", "DT_REFER"]
+_SEP = "|"
+
+# Diferença tolerada na checagem pai = soma dos filhos (arredondamento na escala MIL)
+CHECK_TOLERANCE = 1.0
+
+
+def pad_code(code: str) -> str:
+    """"1.01.2" -> "001.001.002" (ordem de texto = ordem hierárquica)."""
+    return ".".join(seg.zfill(SEGMENT_WIDTH) for seg in str(code).split("."))
+
+
+class AccountTree:
+    """
+    Árvore de contas de uma demonstração para todas as companhias/datas de `df`
+    (colunas DENOM_CIA, DT_REFER, CD_CONTA, DS_CONTA, VL_CONTA). Construída com
+    uma ordenação; as consultas não voltam às linhas brutas.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        nodes = df[GROUP_KEYS + ["CD_CONTA", "DS_CONTA", "VL_CONTA"]].astype(
+            {"DENOM_CIA": str, "DT_REFER": str, "CD_CONTA": str, "DS_CONTA": str}
+        )
+        group = nodes["DENOM_CIA"] + _SEP + nodes["DT_REFER"] + _SEP
+
+        # Nível, pai e códigos com largura fixa só nos códigos distintos (centenas), não nas linhas
+        code, codes = pd.factorize(nodes["CD_CONTA"])
+        codes = pd.Series(codes)
+        level = codes.str.count(r"\.").to_numpy()[code] + 1
+        parent = codes.str.rpartition(".")[0]
+        nodes = nodes.assign(
+            key=group + codes.map(pad_code).to_numpy()[code],
+            level=level,
+            parent=parent.to_numpy()[code],
+        )
+        nodes["parent"] = nodes["parent"].where(level > 1)
+        # Uma linha por conta (a primeira, como no resto do pipeline)
+        nodes = nodes.drop_duplicates("key").sort_values("key", kind="stable").reset_index(drop=True)
+
+        keys = nodes["key"].to_numpy(dtype=str)
+        # folha = a próxima chave não está dentro da subárvore desta
+        nxt = np.append(keys[1:], "")
+        nodes["is_leaf"] = ~np.char.startswith(nxt, np.char.add(keys, "."))
+
+        values = nodes["VL_CONTA"].fillna(0).to_numpy(dtype=float)
+        self.nodes = nodes
+        self._keys = keys
+        self._cum = np.concatenate([[0.0], np.cumsum(values)])
+        self._cum_leaves = np.concatenate([[0.0], np.cumsum(np.where(nodes["is_leaf"], values, 0.0))])
+        self._groups = nodes[GROUP_KEYS].drop_duplicates().reset_index(drop=True)
+
+    def _prefixes(self, code: str) -> np.ndarray:
+        groups = self._groups["DENOM_CIA"] + _SEP + self._groups["DT_REFER"] + _SEP
+        return (groups + pad_code(code)).to_numpy(dtype=str)
+
+    def _ranges(self, code: str):
+        """[lo, hi) da subárvore de `code` em cada companhia/data (busca binária)."""
+        prefixes = self._prefixes(code)
+        lo = np.searchsorted(self._keys, prefixes, side="left")
+        hi = np.searchsorted(self._keys, np.char.add(prefixes, "/"), side="left")
+        return lo, hi
+
+    def _subtree_nodes(self, code: str) -> pd.DataFrame:
+        lo, hi = self._ranges(code)
+        idx = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)]) if len(lo) else np.array([], dtype=int)
+        return self.nodes.iloc[idx]
+
+    def subtree(self, code: str) -> pd.DataFrame:
+        """Todas as contas de `code` para baixo (inclusive), por companhia/data."""
+        return self._subtree_nodes(code).drop(columns="key")
+
+    def node_value(self, code: str) -> pd.DataFrame:
+        """VL_CONTA e DS_CONTA da própria conta `code` por companhia/data (NaN onde não existe)."""
+        lo, hi = self._ranges(code)
+        # a subárvore existe e a primeira chave é a própria conta (não só descendentes)
+        exact = hi > lo
+        exact[exact] = self._keys[lo[exact]] == self._prefixes(code)[exact]
+        value = np.full(len(lo), np.nan)
+        value[exact] = self.nodes["VL_CONTA"].to_numpy(dtype=float)[lo[exact]]
+        label = np.full(len(lo), None, dtype=object)
+        label[exact] = self.nodes["DS_CONTA"].to_numpy()[lo[exact]]
+        return self._groups.assign(VL_CONTA=value, DS_CONTA=label)
+
+    def rollup(self, code: str, leaves_only: bool = True) -> pd.DataFrame:
+        """
+        Soma da subárvore de `code` por companhia/data em O(log n) por grupo.
+        leaves_only=True soma só as folhas (o total "reconstruído" da conta);
+        False soma todos os nós. Grupos sem a conta ficam NaN.
+        """
+        lo, hi = self._ranges(code)
+        cum = self._cum_leaves if leaves_only else self._cum
+        total = np.where(hi > lo, cum[hi] - cum[lo], np.nan)
+        return self._groups.assign(VL_CONTA=total)
+
+    def children(self, code: str) -> pd.DataFrame:
+        """Filhos diretos de `code` por companhia/data: o nível seguinte dentro do intervalo da subárvore."""
+        nodes = self._subtree_nodes(code)
+        return nodes[nodes["level"] == code.count(".") + 2].drop(columns="key")
+
+    def level(self, n: int, root: str = None) -> pd.DataFrame:
+        """
+        Quebra por nível: contas de nível `n` (dentro de `root`, se informado) em
+        formato largo, uma linha por companhia/data e uma coluna por CD_CONTA.
+        Ex.: level(2) na DRE = 3.01, 3.02, ... lado a lado.
+        """
+        nodes = self._subtree_nodes(root) if root is not None else self.nodes
+        sel = nodes[nodes["level"] == n]
+        return sel.pivot_table(index=GROUP_KEYS, columns="CD_CONTA", values="VL_CONTA", aggfunc="first").reset_index()
+
+    def check_children(self, tolerance: float = CHECK_TOLERANCE) -> pd.DataFrame:
+        """
+        Contas cujo valor difere da soma dos filhos diretos (além de `tolerance`), na
+        ordem da árvore. Mesma regra (e implementação) da check_children do módulo,
+        aplicada aos nós já ordenados.
+        """
+        return check_children(self.nodes, tolerance)
+
+
+def check_children(df: pd.DataFrame, tolerance: float = CHECK_TOLERANCE) -> pd.DataFrame:
+    """
+    Pai = soma dos filhos diretos direto nas linhas de uma demonstração, sem montar
+    a árvore: companhia/data/conta viram um inteiro e o pai de cada conta é resolvido
+    nos códigos distintos, então tudo são somas por grupo sobre inteiros. Mesmas
+    linhas do AccountTree.check_children (na ordem do arquivo); contas repetidas
+    valem pela primeira linha.
+    """
+    company = pd.factorize(df["DENOM_CIA"])[0].astype(np.int64)
+    date, dates = pd.factorize(df["DT_REFER"])
+    code, codes = pd.factorize(df["CD_CONTA"].astype(str))
+    codes = pd.Series(codes)
+    # índice do pai de cada código distinto (-1: conta de nível 1 ou pai ausente no arquivo)
+    parent = pd.Index(codes).get_indexer(codes.str.rpartition(".")[0])
+
+    group = company * max(len(dates), 1) + date
+    key = group * len(codes) + code
+    first = np.flatnonzero(~pd.Series(key).duplicated().to_numpy())
+    values = df["VL_CONTA"].to_numpy(dtype=float)
+
+    child = first[parent[code[first]] >= 0]
+    parent_key = group[child] * len(codes) + parent[code[child]]
+    sums = pd.Series(values[child]).groupby(parent_key, sort=False).sum()
+
+    # soma dos filhos de cada conta (NaN = conta sem filhos), na ordem das linhas
+    children_sum = sums.reindex(key[first]).to_numpy()
+    diff = values[first] - children_sum
+    bad = np.abs(diff) > tolerance
+    out = df.iloc[first[bad]][GROUP_KEYS + ["CD_CONTA", "DS_CONTA", "VL_CONTA"]].reset_index(drop=True)
+    return out.assign(children_sum=children_sum[bad], diff=diff[bad])
+
+
+def subtree_metrics(statements: dict, definitions: dict) -> pd.DataFrame:
+    """
+    Métricas do tipo "soma da subárvore X": `definitions` = {metric: (demo, CD_CONTA)}
+    ou {metric: (demo, CD_CONTA, rótulos)}. Uma árvore por demonstração usada; saída no
+    formato de extract_metrics (DENOM_CIA, DT_REFER, VL_CONTA, metric). Usa o valor da
+    própria conta e, se ela não vier no arquivo, a soma das folhas da subárvore.
+    Com `rótulos`, só vale a conta cujo DS_CONTA é um deles (o mesmo código tem
+    significados diferentes nos layouts da CVM) e não há soma das folhas.
+    """
+    cols = ["DENOM_CIA", "DT_REFER", "VL_CONTA", "metric"]
+    trees = {}
+    rows = []
+    for metric, (demo, code, *labels) in definitions.items():
+        if demo not in trees:
+            trees[demo] = AccountTree(statements[demo])
+        tree = trees[demo]
+        value = tree.node_value(code)
+        if labels:
+            value = value[value["DS_CONTA"].isin(labels[0])]
+        else:
+            value["VL_CONTA"] = value["VL_CONTA"].fillna(tree.rollup(code)["VL_CONTA"])
+        rows.append(value.dropna(subset=["VL_CONTA"]).assign(metric=metric))
+
+    if not rows:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(rows, ignore_index=True)[cols]
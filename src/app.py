@@ -1,95 +1,138 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+import pandas as pd
 import os
-import subprocess
-import sys
+
+from dashboard_data import (
+    CHART_MODES, FINAL_DATASET, MAX_LINE_COMPANIES, MONEY_COLUMNS, OTHERS_LABEL, TOP_N, WEBGL_MIN_POINTS,
+    load_chart_data, load_dq_cube, load_final_dataset, load_mapping_usage,
+    load_peer_groups, load_rankings, load_run_history, load_validation, metric_options,
+    money_config, percent_config, period_column, ranking_table, ratio_columns,
+)
+from pipeline_job import last_run_args, log_tail, pipeline_status, start_pipeline
 
 st.set_page_config(page_title="Brazil Banks Benchmark", layout="wide")
 
-def ensure_outputs():
-    # Garante que outputs/final_dataset.csv exista no ambiente (Cloud ou local)
-    if not os.path.exists("outputs/final_dataset.csv"):
-        os.makedirs("outputs", exist_ok=True)
-
-        # Executa o pipeline de extração
-        # Usa o mesmo Python do ambiente do Streamlit
-        result = subprocess.run(
-            [sys.executable, "src/02_extract_metrics.py"],
-            capture_output=True,
-            text=True
-        )
+MAX_DEFAULT_SELECTION = 20
+
+# Violações exibidas por regra na página Data Quality (as de maior |score|)
+MAX_VIOLATIONS_SHOWN = 500
 
-        if result.returncode != 0:
-            st.error("Falha ao gerar o dataset automaticamente.")
-            st.code(result.stdout)
-            st.code(result.stderr)
-            st.stop()
+PIPELINE_POLL_SECONDS = 2
+
+@st.fragment(run_every=PIPELINE_POLL_SECONDS)
+def pipeline_progress():
+    # Acompanha a execução em segundo plano sem bloquear a sessão
+    status = pipeline_status()
+    if status["state"] == "running":
+        st.info("Gerando o dataset a partir dos dados da CVM (download + extração). A página atualiza sozinha.")
+        st.code(log_tail() or "Iniciando...")
+    elif os.path.exists(FINAL_DATASET):
+        st.rerun()
+    else:
+        st.error("Falha ao gerar o dataset automaticamente.")
+        st.code(log_tail())
+
+def band_figure(bands, period_col):
+    """Mediana do grupo com as faixas de percentis (p10–p90 mais clara, p25–p75 mais escura)."""
+    fig = go.Figure()
+    for low, high, opacity in (("p10", "p90", 0.15), ("p25", "p75", 0.3)):
+        fig.add_trace(go.Scatter(
+            x=bands[period_col], y=bands[high], name=high, mode="lines", line_width=0, showlegend=False,
+        ))
+        fig.add_trace(go.Scatter(
+            x=bands[period_col], y=bands[low], name=f"{low}–{high}", mode="lines", line_width=0,
+            fill="tonexty", fillcolor=f"rgba(31, 119, 180, {opacity})",
+        ))
+    fig.add_trace(go.Scatter(x=bands[period_col], y=bands["p50"], name="Mediana", mode="lines+markers"))
+    return fig
+
+def single_trace_figure(chart, period_col, metric_col):
+    """
+    Todas as companhias num único traço WebGL (linhas separadas por um ponto vazio
+    entre companhias): centenas de séries sem um traço/legenda por companhia.
+    """
+    starts = chart["DENOM_CIA"].ne(chart["DENOM_CIA"].shift()).to_numpy()
+    starts[0] = False
+    gaps = chart[starts].assign(**{metric_col: float("nan")})
+    gaps.index = gaps.index - 0.5
+    lines = pd.concat([chart, gaps]).sort_index()
+    return go.Figure(go.Scattergl(
+        x=lines[period_col], y=lines[metric_col], text=lines["DENOM_CIA"], mode="lines+markers",
+        name="Companhias", line_width=1, marker_size=4, opacity=0.6,
+    ))
+
+def ensure_outputs():
+    # Garante que outputs/final_dataset.arrow exista no ambiente (Cloud ou local).
+    # O pipeline roda em segundo plano e no máximo uma vez por vez: as demais
+    # sessões só acompanham o progresso da execução já iniciada
+    if os.path.exists(FINAL_DATASET):
+        return
+
+    # Mesmo universo/períodos da última execução (se houver): não sobrescreve um
+    # dataset --universe all/--periods quarterly com os defaults
+    start_pipeline(last_run_args())
+    pipeline_progress()
+    st.stop()
+
+def pipeline_sidebar():
+    # Reprocessamento sob demanda: o dataset atual continua servido até o novo
+    # ser gravado (troca atômica em outputs/; o cache relê pelo mtime)
+    with st.sidebar.expander("Atualização dos dados"):
+        status = pipeline_status()
+        running = status["state"] == "running"
+        if st.button("Reprocessar pipeline", disabled=running):
+            # --refresh: revalida os ZIPs na CVM (DFP republicada entra sem rodar o 01 antes);
+            # universo/períodos/exportações repetem os da última execução
+            running = start_pipeline(["--refresh", *last_run_args()])
+        if running:
+            st.caption("Pipeline em execução; o dataset atual continua disponível.")
+            st.code(log_tail(5) or "Iniciando...")
+        elif status["state"] == "failed":
+            st.caption("Última execução falhou.")
+            st.code(log_tail(5))
 
 st.title("Brazil Banks Financial Benchmark")
 page = st.sidebar.selectbox("Página", ["Benchmark", "Data Quality"])
+pipeline_sidebar()
 
 if page == "Benchmark":
     
-    st.markdown("Comparação dos 5 principais bancos brasileiros (DFP CVM)")
-
-    # ---------- Helpers ----------
-    def format_brl(x):
-        if pd.isna(x):
-            return "-"
-        # garante float
-        x = float(x)
-        return f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    st.markdown("Comparação entre companhias abertas brasileiras por grupo de pares (DFP CVM)")
 
     ensure_outputs()
     # ---------- Load data ----------
-    df = pd.read_csv("outputs/final_dataset.csv")
-
-    # Garantir tipos numéricos no dataset (evita problemas de formatação e gráfico)
-    for col in ["total_assets", "total_liabilities", "equity", "net_income", "ROE", "ROA", "operating_result_proxy", "operating_ROA"]:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-
-    
+    # Parse + tipos numéricos feitos uma vez por versão do arquivo (compartilhado entre sessões)
+    df = load_final_dataset()
+    period_col = period_column(df)
 
     # ---------- Sidebar filters ----------
     st.sidebar.header("Filtros")
 
-    banks = sorted(df["DENOM_CIA"].dropna().unique().tolist())
+    # Grupos de pares (fixos + um por setor) escolhidos na hora da consulta
+    groups = load_peer_groups()
+    group_name = st.sidebar.selectbox("Grupo de pares", list(groups))
+    group_members = groups[group_name]
     years = sorted(df["year"].dropna().unique().tolist())
 
-    selected_banks = st.sidebar.multiselect("Bancos", banks, default=banks)
+    # Grupos grandes começam sem seleção explícita (= grupo inteiro), para não
+    # renderizar centenas de chips no multiselect
+    chosen = st.sidebar.multiselect(
+        "Companhias (vazio = grupo inteiro)",
+        group_members,
+        default=group_members if len(group_members) <= MAX_DEFAULT_SELECTION else [],
+    )
+    selected_banks = chosen or group_members
     selected_years = st.sidebar.multiselect("Anos", years, default=years)
 
-    metric_options = {
-        "Ativo Total": "total_assets",
-        "Passivo Total (derivado)": "total_liabilities",
-        "Patrimônio Líquido": "equity",
-        "Lucro Líquido": "net_income",
-        "ROE": "ROE",
-        "ROA": "ROA",
-        "Resultado Operacional (proxy)": "operating_result_proxy",
-        "ROA Operacional": "operating_ROA",
-    }
-    # Adiciona automaticamente colunas YoY no seletor
-    yoy_cols = [c for c in df.columns if c.endswith("_YoY")]
-    for c in sorted(yoy_cols):
-        # label amigável: "total_assets_YoY" -> "Crescimento YoY - total_assets"
-        metric_options[f"Crescimento YoY - {c.replace('_YoY','')}"] = c
-    metric_label = st.sidebar.selectbox("Métrica", list(metric_options.keys()))
-    metric_col = metric_options[metric_label]
-
-    is_money_metric = metric_col in [
-    "total_assets",
-    "total_liabilities",
-    "equity",
-    "net_income",
-    "operating_result_proxy",
-]
-
-    is_ratio_metric = (metric_col in ["ROE", "ROA", "operating_ROA"]) or (
-        isinstance(metric_col, str) and metric_col.endswith("_YoY")
-    )
+    # Rótulos do registro de métricas (base + derivadas presentes no dataset)
+    options = metric_options(df)
+    metric_label = st.sidebar.selectbox("Métrica", list(options.keys()))
+    metric_col = options[metric_label]
+
+    is_money_metric = metric_col in MONEY_COLUMNS
+    is_ratio_metric = metric_col in ratio_columns(df)
 
     # ---------- Filtered numeric df (for chart/calcs) ----------
     df_f = df[
@@ -97,168 +140,159 @@ if page == "Benchmark":
         df["year"].isin(selected_years)
     ].copy()
 
-    # Reforçar tipos numéricos após filtro (segurança extra)
-    for col in ["total_assets", "total_liabilities", "equity", "net_income", "ROE", "ROA", "operating_result_proxy", "operating_ROA"]:
-        if col in df_f.columns:
-            df_f[col] = pd.to_numeric(df_f[col], errors="coerce")
-
-    # ---------- Display df (formatted for table only) ----------
-    df_f_display = df_f.copy()
-
-    # Formatar colunas monetárias na tabela
-    for col in ["total_assets", "total_liabilities", "equity", "net_income", "operating_result_proxy"]:
-        if col in df_f_display.columns:
-            df_f_display[col] = df_f_display[col].apply(format_brl)
-
-    # Formatar ROE/ROA como %
-    for col in ["ROE", "ROA", "operating_ROA"]:
-        if col in df_f_display.columns:
-            df_f_display[col] = df_f_display[col].apply(lambda v: "-" if pd.isna(v) else f"{v:.2%}")
-
-    # Formatar colunas YoY como %
-    for col in [c for c in df_f_display.columns if c.endswith("_YoY")]:
-        df_f_display[col] = df_f_display[col].apply(lambda v: "-" if pd.isna(v) else f"{v:.2%}")
-
+    # ---------- Table ----------
+    # Colunas numéricas (ordenam por valor); R$ e % só na exibição, via column_config
     st.subheader("Tabela filtrada")
-    st.dataframe(df_f_display.sort_values(["DENOM_CIA", "year"]), use_container_width=True)
+    st.dataframe(
+        df_f.sort_values(["DENOM_CIA", period_col]),
+        column_config={
+            **money_config([c for c in MONEY_COLUMNS if c in df.columns]),
+            **percent_config(ratio_columns(df)),
+        },
+        width="stretch",
+    )
 
     # ---------- Chart ----------
     st.subheader(f"Gráfico - {metric_label}")
 
     if not df_f.empty:
-        fig = px.line(
-            df_f,
-            x="year",
-            y=metric_col,
-            color="DENOM_CIA",
-            markers=True,
+        # Universo grande: visão agregada por padrão (só as séries agregadas vão para o navegador)
+        n_companies = df_f["DENOM_CIA"].nunique()
+        mode = st.radio(
+            "Visão",
+            CHART_MODES,
+            index=0 if n_companies <= MAX_LINE_COMPANIES else CHART_MODES.index("Top N + outros"),
+            horizontal=True,
         )
+        chart = load_chart_data(mode, selected_banks, selected_years, metric_col)
+        # WebGL (scattergl) quando há muitos pontos; SVG no resto
+        render_mode = "webgl" if len(chart) >= WEBGL_MIN_POINTS else "svg"
+
+        single_trace = mode == "Companhias" and n_companies > MAX_LINE_COMPANIES
+        if mode == "Mediana e percentis":
+            fig = band_figure(chart, period_col)
+            st.caption(f"Faixas p10–p90 e p25–p75 e mediana de {n_companies} companhias por período")
+        elif single_trace:
+            fig = single_trace_figure(chart.reset_index(drop=True), period_col, metric_col)
+            st.caption(f"{n_companies} companhias num único traço WebGL (passe o mouse para ver a companhia)")
+        else:
+            fig = px.line(
+                chart,
+                x=period_col,
+                y=metric_col,
+                color="DENOM_CIA",
+                markers=True,
+                render_mode=render_mode,
+            )
+            if mode == "Top N + outros":
+                fig.update_traces(line_dash="dash", selector={"name": OTHERS_LABEL})
+                st.caption(f"Top {TOP_N} no último período + mediana das outras {max(n_companies - TOP_N, 0)} companhias")
 
-        # Hover formatado sem alterar dados
+        # Hover formatado sem alterar dados (no traço único, a companhia vem do `text` de cada ponto)
+        name = "%{text}" if single_trace else "%{fullData.name}"
         if is_money_metric:
             fig.update_traces(
-                hovertemplate="%{fullData.name}<br>Ano=%{x}<br>Valor=%{y:,.2f}<extra></extra>"
+                hovertemplate=f"{name}<br>Ano=%{{x}}<br>Valor=%{{y:,.2f}}<extra></extra>"
             )
         elif is_ratio_metric:
             fig.update_traces(
-                hovertemplate="%{fullData.name}<br>Ano=%{x}<br>Valor=%{y:.2%}<extra></extra>"
+                hovertemplate=f"{name}<br>Ano=%{{x}}<br>Valor=%{{y:.2%}}<extra></extra>"
             )
 
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig, width="stretch")
     else:
         st.warning("Nenhum dado disponível para os filtros selecionados.")
 
     # ---------- Ranking ----------
-    st.subheader("Ranking por Ano")
+    st.subheader("Ranking por Ano" if period_col == "year" else "Ranking por Trimestre")
 
     if not df_f.empty:
-        for y in sorted(df_f["year"].dropna().unique()):
-            st.markdown(f"### Ano {int(y)}" if float(y).is_integer() else f"### Ano {y}")
-
-            df_year = df_f[df_f["year"] == y].copy()
-            df_year = df_year.sort_values(metric_col, ascending=False)
-            df_year["Rank"] = range(1, len(df_year) + 1)
-
-            df_year_display = df_year[["Rank", "DENOM_CIA", metric_col]].copy()
-
-            if is_money_metric:
-                df_year_display[metric_col] = df_year_display[metric_col].apply(format_brl)
-            elif is_ratio_metric:
-                df_year_display[metric_col] = df_year_display[metric_col].apply(
-                    lambda v: "-" if pd.isna(v) else f"{v:.2%}"
-                )
-
-            st.dataframe(df_year_display, use_container_width=True)
+        # Posições de todas as métricas calculadas de uma vez para a seleção (em cache);
+        # aqui só o pivot companhia x período da métrica escolhida
+        ranks = load_rankings(selected_banks, selected_years)
+        st.caption(f"Posição em {metric_label} por período (1 = maior valor)")
+        st.dataframe(ranking_table(ranks, metric_col), width="stretch")
     else:
         st.warning("Nenhum dado para ranking.")
 
 elif page == "Data Quality":
     st.header("Data Quality")
     ensure_outputs()
-    # 1) Carregar dataset final (mesma fonte do Benchmark)
-    df = pd.read_csv("outputs/final_dataset.csv")
-
-    st.subheader("Visão geral")
-    st.write(f"Linhas: {df.shape[0]} | Colunas: {df.shape[1]}")
-
-    # 2) NaNs por métrica (colunas numéricas principais)
-    metric_cols = [
-        "total_assets",
-        "equity",
-        "net_income",
-        "operating_result_proxy",
-        "total_liabilities",
-        "ROE",
-        "ROA",
-        "operating_ROA",
-    ]
-    metric_cols = [c for c in metric_cols if c in df.columns]
-
-    nan_counts = df[metric_cols].isna().sum().reset_index()
-    nan_counts.columns = ["metric", "nan_count"]
-    nan_counts = nan_counts.sort_values("nan_count", ascending=False)
-
-    st.subheader("NaNs por métrica")
-    st.dataframe(nan_counts, use_container_width=True)
-
-    # 3) Matriz de faltantes (banco x ano) para uma métrica escolhida
-    st.subheader("Faltantes por banco e ano")
-
-    metric_q = st.selectbox("Métrica para checar faltantes", metric_cols, index=0)
-
-    missing = df.copy()
-    missing["missing"] = missing[metric_q].isna()
-
-    missing_pivot = (
-        missing.pivot_table(
-            index="DENOM_CIA",
-            columns="year",
-            values="missing",
-            aggfunc="max",
-        )
-        .fillna(False)
-        .astype(bool)
-        .reset_index()
-    )
+    # 1) Cubo de Data Quality pré-calculado pelo pipeline (outputs/dq_cube/): a página só fatia
+    try:
+        cube = load_dq_cube()
+    except FileNotFoundError:
+        cube = None
+        st.warning("Cubo de Data Quality outputs/dq_cube/ não encontrado. Rode o pipeline (src/02_extract_metrics.py).")
 
-    st.caption("True = valor ausente (NaN)")
-    st.dataframe(missing_pivot, use_container_width=True)
+    if cube is not None:
+        st.subheader("Visão geral")
+        st.write(f"Linhas: {cube['overview']['rows']} | Colunas: {cube['overview']['columns']}")
 
-    # 4) DS_CONTA usado (mapping_usage.csv)
-    st.subheader("Rastreabilidade de DS_CONTA (mapping_usage.csv)")
+        # 2) NaNs por métrica (todas as métricas do registro presentes no dataset)
+        st.subheader("NaNs por métrica")
+        st.dataframe(cube["nan_counts"], width="stretch")
+
+        # 3) Matriz de faltantes (banco x ano) para uma métrica escolhida
+        st.subheader("Faltantes por banco e ano")
+        metric_q = st.selectbox("Métrica para checar faltantes", list(cube["missing"]), index=0)
+        st.caption("True = valor ausente (NaN)")
+        st.dataframe(cube["missing"][metric_q], width="stretch")
+
+    # 4) Validação (regras de outputs/validation/violations.parquet, avaliadas pelo pipeline)
+    st.subheader("Validação (identidades contábeis, sinais e outliers)")
     try:
-        df_map = pd.read_csv("outputs/mapping_usage.csv", sep=";")
-        st.dataframe(df_map, use_container_width=True)
+        rules_summary, violations = load_validation()
+        st.dataframe(rules_summary, width="stretch")
+
+        rules_hit = rules_summary.loc[rules_summary["violations"] > 0, "rule"].tolist()
+        rule_sel = st.selectbox("Regra", rules_hit) if rules_hit else None
+        if rule_sel is not None:
+            shown = violations[violations["rule"] == rule_sel].head(MAX_VIOLATIONS_SHOWN)
+            st.caption("value = valor checado | expected = referência (outra conta, soma dos filhos, média do histórico) | score = diferença relativa ou z-score")
+            st.dataframe(shown.drop(columns=["rule", "severity"]), width="stretch")
+
     except FileNotFoundError:
-        st.warning("Arquivo outputs/mapping_usage.csv não encontrado. Rode o pipeline (src/02_extract_metrics.py).")
+        st.warning("Validação outputs/validation/violations.parquet não encontrada. Rode o pipeline (src/02_extract_metrics.py).")
 
-    # 5) Unmapped (unmapped_lines_all_years.csv)
-    st.subheader("Resumo de linhas não mapeadas (unmapped_lines_all_years.csv)")
+    # 5) DS_CONTA usado (mapping_usage.csv)
+    st.subheader("Rastreabilidade de DS_CONTA (mapping_usage.csv)")
     try:
-        df_unm = pd.read_csv("outputs/unmapped_lines_all_years.csv", sep=";", encoding="latin1")
-
-        # resumo por ano e demo
-        grp = (
-            df_unm.groupby(["year", "demo"])
-            .size()
-            .reset_index(name="unmapped_count")
-            .sort_values(["year", "demo"])
-        )
+        df_map = load_mapping_usage()
+        st.dataframe(df_map, width="stretch")
+    except FileNotFoundError:
+        st.warning("Arquivo outputs/mapping_usage.csv não encontrado. Rode o pipeline (src/02_extract_metrics.py).")
 
-        st.dataframe(grp, use_container_width=True)
+    # 6) Unmapped (contagens por ano/demo e top DS_CONTA, do cubo)
+    if cube is not None:
+        st.subheader("Resumo de linhas não mapeadas (outputs/unmapped/)")
+        st.dataframe(cube["unmapped_by_year_demo"], width="stretch")
 
         # opcional: filtro para inspecionar DS_CONTA mais frequentes
         st.subheader("Top DS_CONTA (unmapped) por demo")
-        demo_sel = st.selectbox("Demo", sorted(df_unm["demo"].unique().tolist()))
-        top_ds = (
-            df_unm[df_unm["demo"] == demo_sel]
-            .groupby("DS_CONTA")
-            .size()
-            .sort_values(ascending=False)
-            .head(30)
-            .reset_index(name="freq")
+        demo_sel = st.selectbox("Demo", sorted(cube["unmapped_top"]))
+        if demo_sel is not None:
+            st.dataframe(cube["unmapped_top"][demo_sel], width="stretch")
+
+    # 7) Desempenho do pipeline (outputs/run_report/, gravado a cada execução)
+    st.subheader("Pipeline Performance")
+    try:
+        stages, runs, top_level = load_run_history()
+
+        st.caption("Tempo de cada estágio por execução (s)")
+        fig = px.bar(top_level, x="started", y="wall_s", color="stage")
+        fig.update_xaxes(type="category", title="execução")
+        st.plotly_chart(fig, width="stretch")
+
+        st.dataframe(
+            runs.rename(columns={"rss_peak_delta_mb": "peak_rss_growth_mb"}),
+            width="stretch",
         )
-        st.dataframe(top_ds, use_container_width=True)
+
+        # Detalhe da última execução: cada estágio por ano/demonstração
+        last = stages[stages["run_id"] == runs["run_id"].iloc[-1]]
+        st.caption(f"Última execução ({runs['started'].iloc[-1]}): estágios por ano e demonstração")
+        st.dataframe(last.drop(columns=["run_id", "started"]), width="stretch")
 
     except FileNotFoundError:
-        st.warning("Arquivo outputs/unmapped_lines_all_years.csv não encontrado. Rode o pipeline (src/02_extract_metrics.py).")
\ No newline at end of file
+        st.warning("Relatório outputs/run_report/stages.parquet não encontrado. Rode o pipeline (src/02_extract_metrics.py).")
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_TIMEOUT = 120
+DEFAULT_JOBS = 4
+MANIFEST_PATH = "data_raw/download_manifest.json"
+
+
+def make_session(pool_size: int = DEFAULT_JOBS) -> requests.Session:
+    """
+    Cria uma Session com pool de conexões dimensionado para `pool_size` downloads
+    simultâneos e retry com backoff para erros transitórios (429/5xx).
+    """
+    retry = Retry(
+        total=5,
+        backoff_factor=1.0,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class DownloadManifest:
+    """
+    Manifesto local (JSON) com ETag/Last-Modified/tamanho de cada arquivo baixado.
+    Chave = caminho local do arquivo. Seguro para uso a partir de várias threads.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            return dict(self._entries.get(key, {}))
+
+    def update(self, key: str, **fields):
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            entry.update(fields)
+            self._save()
+
+    def _save(self):
+        # Escrita atômica: nunca deixa o manifesto pela metade
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def _validators(response) -> dict:
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def download_file(session, url, output_path, manifest, timeout=DEFAULT_TIMEOUT):
+    """
+    Baixa `url` para `output_path` em streaming (chunks de CHUNK_SIZE).
+
+    - Arquivo completo + validadores no manifesto: GET condicional
+      (If-None-Match / If-Modified-Since); 304 => não baixa de novo.
+    - Arquivo parcial (`output_path + ".part"`): retoma com Range + If-Range.
+    - O arquivo final só aparece (os.replace) depois do download completo.
+
+    Retorna "unchanged", "downloaded" ou "resumed".
+    """
+    key = os.path.normpath(output_path)
+    entry = manifest.get(key)
+    part_path = output_path + ".part"
+    validator = entry.get("etag") or entry.get("last_modified")
+
+    headers = {}
+    offset = 0
+    if os.path.exists(output_path) and entry.get("complete"):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    elif os.path.exists(part_path) and validator:
+        offset = os.path.getsize(part_path)
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 304:
+            print(f"Sem alterações: {url}")
+            return "unchanged"
+
+        if r.status_code == 416:
+            # Parcial inválido (ex.: arquivo encolheu no servidor) => descarta e baixa do zero
+            os.remove(part_path)
+            manifest.update(key, complete=False, etag=None, last_modified=None)
+            return download_file(session, url, output_path, manifest, timeout=timeout)
+
+        r.raise_for_status()
+
+        if r.status_code == 206:
+            mode, status = "ab", "resumed"
+            print(f"Retomando: {url} (a partir de {offset} bytes)")
+        else:
+            # 200: servidor ignorou Range/If-Range (ou não havia parcial) => recomeça
+            mode, status = "wb", "downloaded"
+            print(f"Baixando: {url}")
+            manifest.update(key, url=url, complete=False, **_validators(r))
+
+        folder = os.path.dirname(output_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(part_path, mode) as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+
+    os.replace(part_path, output_path)
+    manifest.update(key, complete=True, size=os.path.getsize(output_path))
+    print(f"Arquivo salvo em: {output_path}")
+    return status
+
+
+def download_many(targets, jobs=DEFAULT_JOBS, session=None, manifest=None):
+    """
+    Baixa uma lista de (url, output_path) com no máximo `jobs` downloads simultâneos,
+    compartilhando uma única Session (pool de conexões) e um único manifesto.
+
+    Retorna {output_path: status}; falhas aparecem como "error: <mensagem>".
+    """
+    session = session or make_session(jobs)
+    manifest = manifest or DownloadManifest()
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(download_file, session, url, path, manifest): (url, path)
+            for url, path in targets
+        }
+        for fut in as_completed(futures):
+            url, path = futures[fut]
+            try:
+                results[path] = fut.result()
+            except requests.RequestException as e:
+                print(f"Erro ao baixar {url} - {e}")
+                results[path] = f"error: {e}"
+
+    return results
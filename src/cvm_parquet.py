@@ -0,0 +1,101 @@
+import os
+import re
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from cvm_reader import (
+    filter_expression,
+    iter_statement_batches,
+    source_of,
+    statement_fingerprint,
+    statement_schema,
+    to_pandas,
+)
+
+# Um dataset por fonte: data_parquet/dfp, data_parquet/itr
+PARQUET_ROOT = "data_parquet"
+
+ROW_GROUP_SIZE = 256 * 1024
+
+# Metadado do Parquet com o statement_fingerprint da origem (ZIP/CSV) convertida
+FINGERPRINT_KEY = b"cvm_source_fingerprint"
+
+_FILENAME_RE = re.compile(r"^(?:dfp|itr)_cia_aberta_(?P<demo>[A-Z]+_(?:con|ind))_(?P<year>\d{4})\.csv$")
+
+
+def demo_from_filename(filename: str) -> str:
+    """dfp_cia_aberta_BPA_con_2023.csv -> "BPA_con" (valor da partição `demo`)."""
+    m = _FILENAME_RE.match(filename)
+    if not m:
+        raise ValueError(f"Nome de arquivo DFP/ITR inesperado: {filename}")
+    return m.group("demo")
+
+
+def partition_path(year: int, filename: str, root: str = PARQUET_ROOT) -> str:
+    """data_parquet/{fonte}/year={year}/demo={demo}/part-0.parquet"""
+    demo = demo_from_filename(filename)
+    return os.path.join(root, source_of(filename), f"year={year}", f"demo={demo}", "part-0.parquet")
+
+
+def is_fresh(year: int, filename: str, root: str = PARQUET_ROOT) -> bool:
+    """
+    A partição está em dia se foi gravada a partir do mesmo conteúdo de origem
+    (statement_fingerprint, o mesmo hash do manifesto por ano). Não depende de
+    mtime: um ZIP restaurado com data antiga (cp -p, rsync -t) também invalida.
+    """
+    path = partition_path(year, filename, root)
+    if not os.path.exists(path):
+        return False
+    try:
+        fingerprint = statement_fingerprint(year, filename)
+    except (FileNotFoundError, KeyError):
+        # Origem removida (ex.: só o cache foi copiado): o cache é o que há
+        return True
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(FINGERPRINT_KEY) == fingerprint.encode()
+
+
+def ingest_statement(year: int, filename: str, root: str = PARQUET_ROOT, force: bool = False) -> str:
+    """
+    Converte um CSV da DFP/ITR (latin1, ';') em uma partição Parquet year=/demo=.
+    O CSV é lido e gravado bloco a bloco (DENOM_CIA/DS_CONTA/CD_CONTA/ORDEM_EXERC
+    já chegam dictionary-encoded do leitor). Não faz nada se a partição já
+    estiver em dia (a menos que force=True).
+    """
+    path = partition_path(year, filename, root)
+    if not force and is_fresh(year, filename, root):
+        return path
+
+    # Grava em arquivo temporário e troca atomicamente (leitores nunca veem parquet pela metade).
+    # O writer é aberto com o schema do cabeçalho: CSV sem linhas vira partição vazia válida.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    schema = statement_schema(year, filename).with_metadata(
+        {FINGERPRINT_KEY: statement_fingerprint(year, filename).encode()}
+    )
+    with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        for batch in iter_statement_batches(year, filename):
+            writer.write_batch(batch, row_group_size=ROW_GROUP_SIZE)
+
+    os.replace(tmp, path)
+    return path
+
+
+def read_cached(year: int, filename: str, companies=None, ordem_exerc=None, columns=None,
+                root: str = PARQUET_ROOT) -> pd.DataFrame:
+    """
+    Lê o statement do dataset Parquet com filtros empurrados para o scan:
+    year/demo escolhem a partição; DENOM_CIA/ORDEM_EXERC são avaliados pelo
+    Arrow (estatísticas de row group + filtro no scan) antes de virar pandas.
+    Colunas dictionary-encoded voltam como categorical.
+    """
+    # Cada demo tem seu próprio schema (ex.: DRE tem DT_INI_EXERC), por isso o
+    # dataset é aberto na partição e não na raiz.
+    dataset = ds.dataset(partition_path(year, filename, root), format="parquet")
+    if columns is not None:
+        columns = [c for c in dataset.schema.names if c in columns]
+
+    table = dataset.to_table(columns=columns, filter=filter_expression(companies, ordem_exerc))
+    return to_pandas(table)
@@ -0,0 +1,270 @@
+import contextlib
+import hashlib
+import os
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+RAW_DIR = "data_raw"
+
+# Fontes da CVM com o mesmo layout de arquivos: DFP (anual) e ITR (trimestral)
+SOURCES = {
+    "dfp": {
+        "url": "https://dados.cvm.gov.br/dados/CIA_ABERTA/DOC/DFP/DADOS/",
+        "prefix": "dfp_cia_aberta",
+    },
+    "itr": {
+        "url": "https://dados.cvm.gov.br/dados/CIA_ABERTA/DOC/ITR/DADOS/",
+        "prefix": "itr_cia_aberta",
+    },
+}
+
+# Demonstrações consolidadas lidas pelo pipeline (o resto do ZIP nunca é lido)
+DEMOS = ["BPA", "BPP", "DRE"]
+
+CSV_SEP = ";"
+CSV_ENCODING = "latin1"
+
+# Blocos de ~8 MB: o pico de memória da leitura é um bloco + o resultado já filtrado
+BLOCK_SIZE = 8 * 1024 * 1024
+
+# Colunas de texto muito repetitivas => dictionary (categorical no pandas)
+DICT_COLUMNS = ["DENOM_CIA", "DS_CONTA", "CD_CONTA", "ORDEM_EXERC"]
+
+# Tipos fixos das colunas numéricas da DFP/ITR; o resto é lido como texto.
+# CD_CONTA é um código hierárquico ("3.01", "3.10"), nunca número.
+NUMERIC_TYPES = {
+    "VL_CONTA": pa.float64(),
+    "VERSAO": pa.int64(),
+    "CD_CVM": pa.int64(),
+}
+
+
+def source_of(filename: str) -> str:
+    """itr_cia_aberta_DRE_con_2023.csv -> "itr" (a fonte é o prefixo do arquivo)."""
+    for source, cfg in SOURCES.items():
+        if filename.startswith(cfg["prefix"] + "_"):
+            return source
+    raise ValueError(f"Arquivo de fonte desconhecida: {filename}")
+
+
+def statement_filename(year: int, demo: str, source: str = "dfp") -> str:
+    """Nome do CSV consolidado de `demo` (BPA, BPP, DRE...) dentro do ZIP da fonte."""
+    return f"{SOURCES[source]['prefix']}_{demo}_con_{year}.csv"
+
+
+def statement_files(year: int, sources=("dfp",)):
+    """CSVs de DEMOS das fontes pedidas: os únicos membros do ZIP que o pipeline lê (e extrai)."""
+    return [statement_filename(year, demo, source) for source in sources for demo in DEMOS]
+
+
+def zip_url(year: int, source: str = "dfp") -> str:
+    cfg = SOURCES[source]
+    return f"{cfg['url']}{cfg['prefix']}_{year}.zip"
+
+
+def zip_path(year: int, raw_dir: str = RAW_DIR, source: str = "dfp") -> str:
+    """
+    Caminho do ZIP anual da fonte. O local canônico é data_raw/{prefixo}_{year}.zip
+    (mesmo do 01_download_cvm_dfp.py); o local antigo dentro da pasta extraída
+    continua sendo aceito se já existir.
+    """
+    prefix = SOURCES[source]["prefix"]
+    canonical = os.path.join(raw_dir, f"{prefix}_{year}.zip")
+    legacy = os.path.join(raw_dir, f"{prefix}_{year}", f"{prefix}_{year}.zip")
+    if not os.path.exists(canonical) and os.path.exists(legacy):
+        return legacy
+    return canonical
+
+
+def extracted_dir(year: int, raw_dir: str = RAW_DIR, source: str = "dfp") -> str:
+    return os.path.join(raw_dir, f"{SOURCES[source]['prefix']}_{year}")
+
+
+def extracted_path(year: int, filename: str, raw_dir: str = RAW_DIR) -> str:
+    return os.path.join(extracted_dir(year, raw_dir, source_of(filename)), filename)
+
+
+def _extracted_csv(year: int, filename: str, raw_dir: str = RAW_DIR):
+    """
+    CSV extraído de `filename`, se ele existir e não for mais antigo que o ZIP; None
+    para ler do ZIP. Um ZIP baixado de novo depois da extração (DFP reapresentada)
+    ganha do CSV velho. A extração grava os CSVs com o mtime da hora em que roda.
+    """
+    csv_path = extracted_path(year, filename, raw_dir)
+    if not os.path.exists(csv_path):
+        return None
+    zip_file = zip_path(year, raw_dir, source_of(filename))
+    if os.path.exists(zip_file) and os.path.getmtime(csv_path) < os.path.getmtime(zip_file):
+        return None
+    return csv_path
+
+
+def statement_source(year: int, filename: str, raw_dir: str = RAW_DIR) -> str:
+    """Arquivo de onde `filename` é lido: o CSV extraído (ver _extracted_csv) ou o ZIP."""
+    return _extracted_csv(year, filename, raw_dir) or zip_path(year, raw_dir, source_of(filename))
+
+
+def statement_fingerprint(year: int, filename: str, raw_dir: str = RAW_DIR) -> str:
+    """
+    Hash do conteúdo de `filename`. Para o membro do ZIP usa CRC-32 + tamanho do
+    diretório central (não precisa descompactar); para o CSV extraído, sha256 do arquivo.
+    """
+    csv_path = _extracted_csv(year, filename, raw_dir)
+    h = hashlib.sha256()
+    if csv_path is not None:
+        with open(csv_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    with zipfile.ZipFile(zip_path(year, raw_dir, source_of(filename)), "r") as z:
+        info = z.getinfo(filename)
+    h.update(f"{filename}:{info.CRC}:{info.file_size}".encode())
+    return h.hexdigest()
+
+
+def statement_size(year: int, filename: str, raw_dir: str = RAW_DIR) -> int:
+    """Bytes em disco de `filename`: o CSV extraído ou o membro (comprimido) dentro do ZIP."""
+    csv_path = _extracted_csv(year, filename, raw_dir)
+    if csv_path is not None:
+        return os.path.getsize(csv_path)
+
+    with zipfile.ZipFile(zip_path(year, raw_dir, source_of(filename)), "r") as z:
+        return z.getinfo(filename).compress_size
+
+
+@contextlib.contextmanager
+def open_statement(year: int, filename: str, raw_dir: str = RAW_DIR):
+    """
+    Abre `filename` (ex.: dfp_cia_aberta_BPA_con_2023.csv, itr_cia_aberta_DRE_con_2023.csv)
+    em modo binário.
+    Usa o CSV extraído se ele existir e estiver em dia com o ZIP (extração opt-in);
+    senão o membro do ZIP é descompactado em streaming, sem gravar nada em disco.
+    """
+    csv_path = _extracted_csv(year, filename, raw_dir)
+    if csv_path is not None:
+        with open(csv_path, "rb") as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(zip_path(year, raw_dir, source_of(filename)), "r") as z:
+        with z.open(filename) as f:
+            yield f
+
+
+def _column_types(header):
+    types = {}
+    for col in header:
+        if col in NUMERIC_TYPES:
+            types[col] = NUMERIC_TYPES[col]
+        elif col in DICT_COLUMNS:
+            types[col] = pa.dictionary(pa.int32(), pa.string())
+        else:
+            types[col] = pa.string()
+    return types
+
+
+def _read_header(year: int, filename: str, raw_dir: str = RAW_DIR):
+    with open_statement(year, filename, raw_dir) as f:
+        return f.readline().decode(CSV_ENCODING).strip().split(CSV_SEP)
+
+
+def statement_schema(year: int, filename: str, raw_dir: str = RAW_DIR) -> pa.Schema:
+    """Schema dos RecordBatches de iter_statement_batches (todas as colunas), só pelo cabeçalho."""
+    types = _column_types(_read_header(year, filename, raw_dir))
+    return pa.schema(list(types.items()))
+
+
+def iter_statement_batches(year: int, filename: str, columns=None, raw_dir: str = RAW_DIR,
+                           block_size: int = BLOCK_SIZE):
+    """
+    Lê o CSV em blocos com o parser do Arrow e devolve RecordBatches já tipados
+    (ver NUMERIC_TYPES/DICT_COLUMNS). Com `columns`, só essas colunas são convertidas.
+    """
+    # Tipos explícitos para todas as colunas: a inferência por bloco poderia
+    # divergir entre blocos (ex.: coluna vazia no primeiro bloco)
+    header = _read_header(year, filename, raw_dir)
+
+    convert = pacsv.ConvertOptions(
+        column_types=_column_types(header),
+        include_columns=[c for c in header if columns is None or c in columns],
+        strings_can_be_null=True,
+    )
+
+    with open_statement(year, filename, raw_dir) as f:
+        reader = pacsv.open_csv(
+            f,
+            read_options=pacsv.ReadOptions(encoding=CSV_ENCODING, block_size=block_size),
+            parse_options=pacsv.ParseOptions(delimiter=CSV_SEP),
+            convert_options=convert,
+        )
+        for batch in reader:
+            yield batch
+
+
+def filter_expression(companies=None, ordem_exerc=None):
+    """
+    Expressão Arrow para o filtro padrão do projeto (companhias e/ou ORDEM_EXERC).
+    `ordem_exerc` é um valor ("ÚLTIMO") ou uma lista deles (["ÚLTIMO", "PENÚLTIMO"]).
+    """
+    expr = None
+    if companies is not None:
+        expr = pc.field("DENOM_CIA").isin(list(companies))
+    if ordem_exerc is not None:
+        if isinstance(ordem_exerc, str):
+            cond = pc.field("ORDEM_EXERC") == ordem_exerc
+        else:
+            cond = pc.field("ORDEM_EXERC").isin(list(ordem_exerc))
+        expr = cond if expr is None else expr & cond
+    return expr
+
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Table -> DataFrame sem cópias extras. Os dicionários ficam só com as categorias
+    presentes e em ordem alfabética, para que sort/pivot ordenem como texto.
+    """
+    df = table.to_pandas(self_destruct=True)
+    for col in DICT_COLUMNS:
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            cat = df[col].cat.remove_unused_categories()
+            df[col] = cat.cat.reorder_categories(sorted(cat.cat.categories))
+    return df
+
+
+def read_statement(year: int, filename: str, columns=None, companies=None, ordem_exerc=None,
+                   raw_dir: str = RAW_DIR) -> pd.DataFrame:
+    """
+    Lê um statement filtrando enquanto lê: cada bloco é filtrado por companhia/ORDEM_EXERC
+    antes de ser acumulado, então a memória acompanha o resultado filtrado e não o CSV.
+    Colunas de texto-chave voltam como categorical e VL_CONTA como float64.
+    """
+    expr = filter_expression(companies, ordem_exerc)
+    if columns is not None:
+        # As colunas do filtro precisam ser lidas mesmo que não sejam pedidas
+        columns = list(columns) + [c for c in ("DENOM_CIA", "ORDEM_EXERC") if c not in columns]
+
+    batches = []
+    schema = None
+    for batch in iter_statement_batches(year, filename, columns=columns, raw_dir=raw_dir):
+        schema = batch.schema
+        if expr is not None:
+            batch = batch.filter(expr)
+        if batch.num_rows:
+            batches.append(batch)
+
+    if schema is None:
+        return pd.DataFrame(columns=columns)
+    return to_pandas(pa.Table.from_batches(batches, schema=schema))
+
+
+def extract_members(path: str, members, folder: str):
+    """Extração opt-in: grava em `folder` apenas os membros pedidos."""
+    os.makedirs(folder, exist_ok=True)
+    with zipfile.ZipFile(path, "r") as z:
+        for member in members:
+            z.extract(member, folder)
@@ -0,0 +1,304 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+from derived_metrics import columns_with_format, metric_info
+from dq_cube import DQ_CUBE_ROOT, dq_cube_paths, read_dq_cube
+from exports import CANONICAL_FORMAT, output_path, read_arrow
+from run_report import RUN_HISTORY, read_run_history
+from universe import peer_groups
+from validation import RULES, VIOLATIONS, read_violations
+
+# Artefatos gerados pelo pipeline (src/02_extract_metrics.py)
+FINAL_DATASET = output_path(CANONICAL_FORMAT)  # outputs/final_dataset.arrow
+MAPPING_USAGE = "outputs/mapping_usage.csv"
+
+# Colunas por formato de exibição, do registro de métricas (derived_metrics.py)
+MONEY_COLUMNS = columns_with_format("money")
+RATIO_COLUMNS = columns_with_format("ratio")
+
+# Valores em R$ continuam numéricos na tabela (ordenação por valor); só a exibição é formatada
+MONEY_FORMAT = "R$ %,.2f"
+
+# Seleções (companhias x anos) cujo ranking fica em cache
+MAX_RANKING_SELECTIONS = 64
+
+# Versões antigas de cada artefato que ficam em memória depois que o pipeline regrava
+MAX_VERSIONS = 2
+
+# Gráfico de evolução. "Companhias" manda uma série por companhia para o navegador;
+# as visões agregadas são calculadas aqui e mandam só as séries agregadas (tamanho
+# fixo por período, qualquer que seja o universo). Acima de MAX_LINE_COMPANIES a
+# visão padrão passa a ser a agregada; a partir de WEBGL_MIN_POINTS pontos os traços
+# usam WebGL (scattergl) em vez de SVG.
+CHART_MODES = ["Companhias", "Mediana e percentis", "Top N + outros"]
+MAX_LINE_COMPANIES = 20
+WEBGL_MIN_POINTS = 1000
+TOP_N = 10
+BAND_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+OTHERS_LABEL = "Outros (mediana)"
+
+
+def file_version(path: str):
+    """
+    (mtime_ns, tamanho) do arquivo, ou None se ele não existir. Entra na chave dos
+    caches abaixo: quando o pipeline regrava um output, a chave muda e o próximo
+    rerun relê o arquivo; sem mudança, todas as sessões reaproveitam o mesmo parse.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _require(path: str):
+    version = file_version(path)
+    if version is None:
+        raise FileNotFoundError(path)
+    return version
+
+
+@st.cache_resource(max_entries=MAX_VERSIONS, show_spinner=False)
+def _final_dataset(path, version):
+    # Arrow IPC mapeado em memória: tipos gravados pelo pipeline, sem parse de texto
+    df = read_arrow(path)
+
+    # Dataset trimestral (--periods quarterly): eixo/ranking por trimestre ("2024-T3")
+    if "quarter" in df.columns:
+        df["period"] = df["year"].astype(int).astype(str) + "-T" + df["quarter"].astype(int).astype(str)
+
+    return df
+
+
+def period_column(df: pd.DataFrame) -> str:
+    """Coluna de período do dataset: `period` ("2024-T3") no trimestral, `year` no anual."""
+    return "period" if "period" in df.columns else "year"
+
+
+def ratio_columns(df: pd.DataFrame):
+    """Colunas em fração (exibidas como %): razões, crescimentos YoY/QoQ e CAGR."""
+    return [c for c in df.columns if c in RATIO_COLUMNS]
+
+
+def metric_options(df: pd.DataFrame) -> dict:
+    """{rótulo: coluna} das métricas do registro presentes no dataset, na ordem do registro."""
+    return {info["label"]: col for col, info in metric_info().items() if col in df.columns}
+
+
+def rank_columns(df: pd.DataFrame):
+    return [c for c in MONEY_COLUMNS + ratio_columns(df) if c in df.columns]
+
+
+def money_config(columns) -> dict:
+    """column_config do st.dataframe: valores em R$ formatados sem virar texto."""
+    return {col: st.column_config.NumberColumn(format=MONEY_FORMAT) for col in columns}
+
+
+def percent_config(columns) -> dict:
+    """column_config do st.dataframe: frações exibidas como % sem virar texto."""
+    return {col: st.column_config.NumberColumn(format="percent") for col in columns}
+
+
+def load_final_dataset(path: str = FINAL_DATASET) -> pd.DataFrame:
+    """
+    final_dataset.arrow já tipado, lido uma vez por versão do arquivo e
+    compartilhado entre sessões (cache_resource: sem cópia por rerun).
+    O frame é só leitura: filtre/copie antes de alterar.
+    """
+    return _final_dataset(path, _require(path))
+
+
+@st.cache_data(max_entries=MAX_RANKING_SELECTIONS, show_spinner=False)
+def _rankings(path, version, companies, years):
+    df = _final_dataset(path, version)
+    period = period_column(df)
+    metrics = rank_columns(df)
+    sel = df[df["DENOM_CIA"].isin(companies) & df["year"].isin(years)]
+
+    # Posição de cada companhia em cada período, para todas as métricas de uma vez
+    # (maior valor = 1; sem valor = sem posição)
+    ranks = sel.groupby(period)[metrics].rank(ascending=False, method="first")
+    ranks.insert(0, period, sel[period])
+    ranks.insert(0, "DENOM_CIA", sel["DENOM_CIA"])
+    return ranks.astype({m: "Int64" for m in metrics})
+
+
+def load_rankings(companies, years, path: str = FINAL_DATASET) -> pd.DataFrame:
+    """
+    Ranking por período de todas as métricas dentro da seleção (companhias x anos):
+    DENOM_CIA, período e uma coluna de posição por métrica. Calculado uma vez por
+    seleção e versão do dataset.
+    """
+    return _rankings(path, _require(path), tuple(sorted(companies)), tuple(sorted(years)))
+
+
+def ranking_table(ranks: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """
+    Uma tabela para todos os períodos: companhia x período com a posição em `metric`,
+    ordenada pela posição no período mais recente.
+    """
+    period = period_column(ranks)
+    # Uma posição por companhia/período: com duas linhas no mesmo período (dois
+    # DT_REFER no ano, dois CNPJ com a mesma DENOM_CIA) vale a melhor
+    table = ranks.groupby(["DENOM_CIA", period], observed=True)[metric].min().unstack(period)
+    table.columns = [str(c) for c in table.columns]
+    if len(table.columns):
+        table = table.sort_values(list(reversed(table.columns)), na_position="last")
+    return table
+
+
+def peer_bands(df: pd.DataFrame, metric: str, period: str) -> pd.DataFrame:
+    """Percentis BAND_QUANTILES (p10, p25, p50...) de `metric` por período e nº de companhias com valor."""
+    values = df.groupby(period)[metric]
+    bands = values.quantile(BAND_QUANTILES).unstack()
+    bands.columns = [f"p{round(q * 100)}" for q in bands.columns]
+    bands["n"] = values.count()
+    return bands.reset_index()
+
+
+def top_n_series(df: pd.DataFrame, metric: str, period: str, n: int = TOP_N) -> pd.DataFrame:
+    """
+    As `n` companhias com maior `metric` no último período em que cada uma tem valor,
+    uma série cada, mais a mediana das demais (OTHERS_LABEL). Formato longo
+    (DENOM_CIA, período, metric), como o da visão por companhia.
+    """
+    values = df[["DENOM_CIA", period, metric]].dropna(subset=[metric])
+    latest = values.sort_values(period).drop_duplicates("DENOM_CIA", keep="last")
+    top = latest.nlargest(n, metric)["DENOM_CIA"]
+    in_top = values["DENOM_CIA"].isin(top)
+    others = values[~in_top].groupby(period, as_index=False)[metric].median().assign(DENOM_CIA=OTHERS_LABEL)
+    return pd.concat([values[in_top], others], ignore_index=True)
+
+
+@st.cache_data(max_entries=MAX_RANKING_SELECTIONS, show_spinner=False)
+def _chart_data(path, version, mode, companies, years, metric, n):
+    df = _final_dataset(path, version)
+    period = period_column(df)
+    sel = df.loc[df["DENOM_CIA"].isin(companies) & df["year"].isin(years), ["DENOM_CIA", period, metric]]
+    if mode == "Mediana e percentis":
+        return peer_bands(sel, metric, period)
+    if mode == "Top N + outros":
+        return top_n_series(sel, metric, period, n)
+    return sel.astype({"DENOM_CIA": str}).sort_values(["DENOM_CIA", period])
+
+
+def load_chart_data(mode, companies, years, metric, n: int = TOP_N, path: str = FINAL_DATASET) -> pd.DataFrame:
+    """
+    Dados do gráfico de evolução na visão `mode` (CHART_MODES) para a seleção:
+    séries por companhia, percentis por período ou top N + outros. Só as colunas e
+    linhas que o gráfico desenha; calculado uma vez por seleção e versão do dataset.
+    """
+    return _chart_data(path, _require(path), mode, tuple(sorted(companies)), tuple(sorted(years)), metric, n)
+
+
+@st.cache_resource(max_entries=MAX_VERSIONS, show_spinner=False)
+def _peer_groups(path, version):
+    return peer_groups(_final_dataset(path, version))
+
+
+def load_peer_groups(path: str = FINAL_DATASET) -> dict:
+    """Grupos de pares do dataset final (recalculados só quando o arquivo muda)."""
+    return _peer_groups(path, _require(path))
+
+
+@st.cache_data(max_entries=MAX_VERSIONS, show_spinner=False)
+def _mapping_usage(path, version):
+    return pd.read_csv(path, sep=";")
+
+
+def load_mapping_usage(path: str = MAPPING_USAGE) -> pd.DataFrame:
+    return _mapping_usage(path, _require(path))
+
+
+@st.cache_data(max_entries=MAX_VERSIONS, show_spinner=False)
+def _dq_cube(root, version):
+    cube = read_dq_cube(root)
+    return {
+        "overview": cube["overview"].iloc[0].to_dict(),
+        "nan_counts": (
+            cube["metrics"][["metric", "nan_count"]]
+            .sort_values("nan_count", ascending=False, kind="stable")
+            .reset_index(drop=True)
+        ),
+        # {métrica: DENOM_CIA x ano}, na ordem do registro
+        "missing": {
+            metric: grp.drop(columns="metric").reset_index(drop=True)
+            for metric, grp in cube["missing"].groupby("metric", sort=False)
+        },
+        "unmapped_by_year_demo": cube["unmapped_by_year_demo"],
+        "unmapped_top": {
+            demo: grp.drop(columns="demo").reset_index(drop=True)
+            for demo, grp in cube["unmapped_top"].groupby("demo")
+        },
+    }
+
+
+def load_dq_cube(root: str = DQ_CUBE_ROOT) -> dict:
+    """
+    Cubo de Data Quality gravado pelo pipeline (outputs/dq_cube/), já separado nas
+    fatias que a página usa: overview, nan_counts, {métrica: faltantes por
+    companhia/ano}, unmapped_by_year_demo e {demo: top DS_CONTA}. Uma vez por versão.
+    """
+    version = tuple(_require(path) for path in dq_cube_paths(root).values())
+    return _dq_cube(root, version)
+
+
+@st.cache_data(max_entries=MAX_VERSIONS, show_spinner=False)
+def _validation(path, version):
+    violations = read_violations(path)
+
+    # Uma linha por regra do registro, inclusive as sem nenhuma violação
+    counts = violations.groupby("rule", observed=True).agg(
+        violations=("DENOM_CIA", "size"), companies=("DENOM_CIA", "nunique"), years=("year", "nunique"),
+    )
+    summary = pd.DataFrame(
+        [{"rule": name, "label": rule["label"], "severity": rule["severity"]} for name, rule in RULES.items()]
+    ).join(counts, on="rule")
+    summary[["violations", "companies", "years"]] = summary[["violations", "companies", "years"]].fillna(0).astype(int)
+
+    # Violações mais graves primeiro dentro de cada regra
+    violations = (
+        violations.assign(rule=violations["rule"].astype(str), magnitude=violations["score"].abs())
+        .sort_values(["rule", "magnitude"], ascending=[True, False])
+        .drop(columns="magnitude")
+        .reset_index(drop=True)
+    )
+    return summary, violations
+
+
+def load_validation(path: str = VIOLATIONS):
+    """
+    Resultado das regras de validação (outputs/validation/violations.parquet):
+    (resumo por regra, violações ordenadas por regra e gravidade). Uma vez por
+    versão do arquivo.
+    """
+    return _validation(path, _require(path))
+
+
+@st.cache_data(max_entries=MAX_VERSIONS, show_spinner=False)
+def _run_history(path, version):
+    stages = read_run_history(path)
+    # Uma linha por execução: o estágio "total" + a soma de linhas/bytes lidos
+    totals = stages[stages["stage"] == "total"].set_index("run_id")[["started", "wall_s", "cpu_s", "rss_peak_delta_mb"]]
+    read = stages[stages["stage"].str.startswith("read_")].groupby("run_id")[["rows_out", "bytes_read"]].sum()
+    runs = totals.join(read.rename(columns={"rows_out": "rows_read"})).reset_index().sort_values("started")
+
+    # Estágios de primeiro nível (filhos de "total"), somando os anos
+    top_level = (
+        stages[stages["parent"] == "total"]
+        .groupby(["run_id", "started", "stage"], as_index=False)["wall_s"]
+        .sum()
+        .sort_values("started")
+    )
+    return stages, runs, top_level
+
+
+def load_run_history(path: str = RUN_HISTORY):
+    """
+    Histórico de desempenho do pipeline (outputs/run_report/stages.parquet):
+    (estágios de todas as execuções, uma linha por execução, estágios de primeiro
+    nível por execução). Uma vez por versão do arquivo.
+    """
+    return _run_history(path, _require(path))
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+
+# Registro das métricas do dataset final. As base vêm da extração (account_map.py);
+# as derivadas declaram entradas e fórmula e são calculadas por evaluate() na ordem
+# do grafo de dependências. Para criar uma métrica basta uma entrada em DERIVED_METRICS.
+#
+# Tipos de métrica derivada:
+#   formula  fn(*entradas) sobre as colunas inteiras (linha a linha)
+#   growth   valor / valor `lag` períodos antes - 1
+#   cagr     (valor / valor `lag` anos antes) ** (1 / lag) - 1
+#   rolling  média das últimas `window` observações (inclui o período atual)
+#   restatement  valor do ano anterior reapresentado (PENÚLTIMO do arquivo do ano)
+#                menos o valor original (ÚLTIMO do arquivo do ano anterior)
+#
+# `scope` das janelas: "year" compara com o mesmo período do ano anterior (no
+# trimestral, o mesmo trimestre); "quarter" com o trimestre anterior (só existe no
+# modo trimestral). A janela só vale com períodos consecutivos: se a companhia não
+# publicou um período no meio, o resultado fica NaN.
+#
+# O valor de 1 ano antes (growth YoY, média de 2 anos) vem de preferência da coluna
+# `<métrica>_prior`: o comparativo (PENÚLTIMO) que o próprio arquivo do ano publica,
+# já reapresentado. Assim cada ano basta para o próprio YoY; sem comparativo, vale a
+# linha do ano anterior.
+
+# Formato de exibição: "money" (R$) ou "ratio" (fração exibida como %)
+BASE_METRICS = {
+    "total_assets": {"label": "Ativo Total", "format": "money"},
+    "equity": {"label": "Patrimônio Líquido", "format": "money"},
+    "net_income": {"label": "Lucro Líquido", "format": "money"},
+    "operating_result_proxy": {"label": "Resultado Operacional (proxy)", "format": "money"},
+    # quebra do Ativo Total por subárvore (SUBTREE_METRICS)
+    "current_assets": {"label": "Ativo Circulante", "format": "money"},
+    "noncurrent_assets": {"label": "Ativo Não Circulante", "format": "money"},
+    "cash_and_equivalents": {"label": "Caixa e Equivalentes de Caixa", "format": "money"},
+    "financial_assets": {"label": "Ativos Financeiros", "format": "money"},
+}
+
+# Mesmo período do ano anterior, como publicado no arquivo do ano (linhas PENÚLTIMO)
+PRIOR_SUFFIX = "_prior"
+PRIOR_METRICS = {
+    f"{name}{PRIOR_SUFFIX}": {"label": f"{info['label']} (ano anterior, reapresentado)", "format": info["format"]}
+    for name, info in BASE_METRICS.items()
+}
+
+
+def formula(inputs, fn, label, fmt):
+    return {"kind": "formula", "inputs": inputs, "fn": fn, "label": label, "format": fmt}
+
+
+def ratio(numerator, denominator, label):
+    return formula([numerator, denominator], np.divide, label, "ratio")
+
+
+def growth(metric, scope="year"):
+    period = "YoY" if scope == "year" else "QoQ"
+    return {
+        "kind": "growth", "inputs": [metric], "lag": 1, "scope": scope,
+        "label": f"Crescimento {period} - {metric}", "format": "ratio",
+    }
+
+
+def cagr(metric, years):
+    return {
+        "kind": "cagr", "inputs": [metric], "lag": years, "scope": "year",
+        "label": f"CAGR {years} anos - {metric}", "format": "ratio",
+    }
+
+
+def rolling_mean(metric, window, label, fmt="money", scope="year"):
+    return {"kind": "rolling", "inputs": [metric], "window": window, "scope": scope, "label": label, "format": fmt}
+
+
+def restatement(metric):
+    return {
+        "kind": "restatement", "inputs": [metric, f"{metric}{PRIOR_SUFFIX}"], "lag": 1, "scope": "year",
+        "label": f"Reapresentação - {metric}", "format": "money",
+    }
+
+
+# Ordem do dicionário = ordem das colunas no final_dataset
+DERIVED_METRICS = {
+    "total_liabilities": formula(["total_assets", "equity"], np.subtract, "Passivo Total (derivado)", "money"),
+    "ROE": ratio("net_income", "equity", "ROE"),
+    "ROA": ratio("net_income", "total_assets", "ROA"),
+    "operating_ROA": ratio("operating_result_proxy", "total_assets", "ROA Operacional"),
+    "total_assets_YoY": growth("total_assets"),
+    "equity_YoY": growth("equity"),
+    "net_income_YoY": growth("net_income"),
+    "operating_result_proxy_YoY": growth("operating_result_proxy"),
+    # Variação contra o trimestre anterior só para saldos (BPA/BPP); a DRE é acumulada no ano
+    "total_assets_QoQ": growth("total_assets", scope="quarter"),
+    "equity_QoQ": growth("equity", scope="quarter"),
+    # ROE sobre o PL médio (atual e de um ano antes)
+    "avg_equity": rolling_mean("equity", 2, "Patrimônio Líquido Médio"),
+    "ROAE": ratio("net_income", "avg_equity", "ROE (PL médio)"),
+    "total_assets_CAGR_3y": cagr("total_assets", 3),
+    "net_income_CAGR_3y": cagr("net_income", 3),
+    "net_income_avg_3y": rolling_mean("net_income", 3, "Lucro Líquido Médio (3 anos)"),
+    # Reapresentado - original do ano anterior (0 = sem reapresentação)
+    "total_assets_restatement": restatement("total_assets"),
+    "equity_restatement": restatement("equity"),
+    "net_income_restatement": restatement("net_income"),
+    "operating_result_proxy_restatement": restatement("operating_result_proxy"),
+}
+
+
+def metric_info(registry=DERIVED_METRICS) -> dict:
+    """{coluna: {"label", "format"}} de todas as métricas (base, ano anterior, derivadas), na ordem de exibição."""
+    info = {**BASE_METRICS, **PRIOR_METRICS}
+    info.update({name: {"label": spec["label"], "format": spec["format"]} for name, spec in registry.items()})
+    return info
+
+
+def columns_with_format(fmt: str, registry=DERIVED_METRICS):
+    return [name for name, info in metric_info(registry).items() if info["format"] == fmt]
+
+
+def resolve_order(registry=DERIVED_METRICS, available=(), quarterly=False):
+    """
+    Ordem de cálculo (topológica) das métricas derivadas computáveis: entradas
+    primeiro. Métricas de escopo "quarter" fora do modo trimestral, e as que
+    dependem delas, ficam de fora. Ciclo ou entrada desconhecida -> ValueError.
+    """
+    order = []
+    state = {}  # nome -> "visiting" | "done" | "skip"
+
+    def visit(name, path):
+        if name not in registry:
+            if name in available:
+                return True
+            if name in BASE_METRICS or name in PRIOR_METRICS:
+                return False  # métrica base sem nenhum valor extraído
+            raise ValueError(f"Métrica desconhecida: {name} (em {' -> '.join(path)})")
+        if state.get(name) == "visiting":
+            raise ValueError(f"Dependência circular: {' -> '.join(path + [name])}")
+        if name in state:
+            return state[name] == "done"
+
+        state[name] = "visiting"
+        spec = registry[name]
+        ok = all([visit(dep, path + [name]) for dep in spec["inputs"]])
+        ok = ok and (quarterly or spec.get("scope") != "quarter")
+        state[name] = "done" if ok else "skip"
+        if ok:
+            order.append(name)
+        return ok
+
+    for name in registry:
+        visit(name, [])
+    return order
+
+
+def _window_index(df: pd.DataFrame, scope: str):
+    """
+    (ordem, grupo, período) das linhas no escopo da janela: `ordem` põe cada grupo
+    contíguo e em ordem de período; `período` é inteiro (ano, ou ano*4+trimestre)
+    para checar se as observações são consecutivas.
+    """
+    company = pd.factorize(df["DENOM_CIA"])[0]
+    year = df["year"].to_numpy(dtype=int)
+    if "quarter" not in df.columns:
+        return np.arange(len(df)), company, year
+
+    quarter = df["quarter"].to_numpy(dtype=int)
+    if scope == "year":
+        # mesmo trimestre em anos seguidos
+        order = np.lexsort((year, quarter, company))
+        return order, (company * 4 + quarter)[order], year[order]
+    return np.arange(len(df)), company, year * 4 + quarter
+
+
+def _lag(values, group, period, k, prior=None):
+    """
+    Valor k observações antes dentro do grupo (NaN sem período k antes). Com
+    `prior` (comparativo do próprio período), ele substitui a observação de 1 antes.
+    """
+    if k == 0:
+        return values
+    out = np.full(len(values), np.nan)
+    if k < len(values):
+        ok = (group[k:] == group[:-k]) & (period[k:] - period[:-k] == k)
+        out[k:] = np.where(ok, values[:-k], np.nan)
+    if k == 1 and prior is not None:
+        out = np.where(np.isnan(prior), out, prior)
+    return out
+
+
+def _window(spec, values, index, prior=None):
+    order, group, period = index
+    v = values[order]
+    prior = None if prior is None else prior[order]
+    if spec["kind"] == "growth":
+        result = v / _lag(v, group, period, spec["lag"], prior) - 1
+    elif spec["kind"] == "cagr":
+        result = (v / _lag(v, group, period, spec["lag"], prior)) ** (1 / spec["lag"]) - 1
+    elif spec["kind"] == "rolling":
+        result = sum(_lag(v, group, period, k, prior) for k in range(spec["window"])) / spec["window"]
+    elif spec["kind"] == "restatement":
+        result = prior - _lag(v, group, period, spec["lag"])
+    else:
+        raise ValueError(f"Tipo de métrica desconhecido: {spec['kind']}")
+
+    out = np.empty_like(result)
+    out[order] = result
+    return out
+
+
+def evaluate(pivot: pd.DataFrame, registry=DERIVED_METRICS) -> pd.DataFrame:
+    """
+    Calcula todas as métricas derivadas sobre o pivot (banco/período com as
+    métricas base em colunas). O frame é ordenado uma única vez por companhia e
+    período; as janelas de cada escopo compartilham a mesma ordem/agrupamento e
+    cada métrica é uma operação NumPy sobre colunas inteiras. Métricas já
+    presentes (ex.: linhas vindas do cache incremental) são recalculadas.
+    Janelas anuais usam a coluna `<entrada>_prior`, se existir, como valor de 1 ano antes.
+    """
+    quarterly = "quarter" in pivot.columns
+    keys = ["DENOM_CIA", "year", "quarter"] if quarterly else ["DENOM_CIA", "year"]
+    df = pivot.sort_values(keys, kind="stable")
+
+    order = resolve_order(registry, available=set(df.columns), quarterly=quarterly)
+    columns = {}
+    indexes = {}
+
+    def column(name):
+        if name not in columns:
+            columns[name] = df[name].to_numpy(dtype=float)
+        return columns[name]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name in order:
+            spec = registry[name]
+            inputs = [column(dep) for dep in spec["inputs"]]
+            if spec["kind"] == "formula":
+                columns[name] = spec["fn"](*inputs)
+            else:
+                scope = spec["scope"]
+                if scope not in indexes:
+                    indexes[scope] = _window_index(df, scope)
+                prior = f"{spec['inputs'][0]}{PRIOR_SUFFIX}"
+                prior = column(prior) if scope == "year" and prior in df.columns else None
+                columns[name] = _window(spec, inputs[0], indexes[scope], prior)
+
+    # Uma única atribuição: colunas existentes mantêm a posição, as novas entram na ordem do registro
+    return df.assign(**{name: columns[name] for name in registry if name in order})
@@ -0,0 +1,136 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Linhas não mapeadas (diagnóstico), gravadas pelo 02_extract_metrics.py:
+#   outputs/unmapped/rows/year=/demo=/part-0.parquet    linhas (colunas de texto com dictionary)
+#   outputs/unmapped/counts/year=/demo=/part-0.parquet  contagens (e companhias) por DS_CONTA da partição
+#   outputs/unmapped/counts.parquet                     todas as contagens (o que os consumidores leem)
+UNMAPPED_ROOT = "outputs/unmapped"
+UNMAPPED_COUNTS = f"{UNMAPPED_ROOT}/counts.parquet"
+
+DICT_COLUMNS = ["DENOM_CIA", "DS_CONTA", "CD_CONTA", "GRUPO_DFP", "ESCALA_MOEDA", "MOEDA"]
+
+DICT_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+COUNT_COLUMNS = ["year", "demo", "DS_CONTA", "CD_CONTA", "n_lines", "n_companies", "companies"]
+
+
+def _partition(kind: str, year: int, demo: str, root: str) -> str:
+    return os.path.join(root, kind, f"year={year}", f"demo={demo}", "part-0.parquet")
+
+
+def _write_parquet(table: pa.Table, path: str):
+    # Arquivo temporário + os.replace: leitores nunca veem a partição pela metade
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def _dictionary_table(df: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        column = table.column(i)
+        if pa.types.is_null(column.type):
+            # partição vazia: colunas de texto sem valores viriam como null
+            column = column.cast(pa.list_(pa.string()) if name == "companies" else pa.string())
+        if name in DICT_COLUMNS:
+            # mesmo tipo em todas as partições (o pandas escolhe int8/int16 pelo nº de categorias)
+            if not pa.types.is_dictionary(column.type):
+                column = pc.dictionary_encode(column.cast(pa.string()))
+            column = column.cast(DICT_TYPE)
+        table = table.set_column(i, name, column)
+    return table
+
+
+def unmapped_counts_frame(df_u: pd.DataFrame) -> pd.DataFrame:
+    """
+    Contagens por DS_CONTA das linhas não mapeadas de uma partição: linhas,
+    companhias distintas (quantas e quais) e o CD_CONTA mais frequente daquele rótulo.
+    A lista de companhias permite contar a cobertura de um rótulo entre anos e
+    variações de grafia sem voltar às linhas (ver discovery.label_stats).
+    """
+    if df_u.empty:
+        return pd.DataFrame({
+            "DS_CONTA": pd.Series(dtype=str), "CD_CONTA": pd.Series(dtype=str),
+            "n_lines": pd.Series(dtype="int64"), "n_companies": pd.Series(dtype="int64"),
+            "companies": pd.Series(dtype=object),
+        })
+
+    ds_conta = df_u["DS_CONTA"].astype(str)
+    counts = df_u.groupby(ds_conta, observed=True).agg(
+        n_lines=("DENOM_CIA", "size"),
+        n_companies=("DENOM_CIA", "nunique"),
+    )
+    top_cd = (
+        df_u.groupby([ds_conta, df_u["CD_CONTA"].astype(str)], observed=True)
+        .size()
+        .sort_values(ascending=False, kind="stable")
+        .reset_index()
+        .drop_duplicates("DS_CONTA")
+        .set_index("DS_CONTA")["CD_CONTA"]
+    )
+    counts.insert(0, "CD_CONTA", top_cd)
+    pairs = pd.DataFrame({"DS_CONTA": ds_conta, "DENOM_CIA": df_u["DENOM_CIA"].astype(str)}).drop_duplicates()
+    counts["companies"] = pairs.groupby("DS_CONTA")["DENOM_CIA"].agg(list)
+    return counts.reset_index()
+
+
+def write_unmapped(year: int, demo: str, df_u: pd.DataFrame, root: str = UNMAPPED_ROOT):
+    """
+    Grava as linhas não mapeadas de (year, demo) e as contagens por DS_CONTA
+    nas partições year=/demo= (substitui o que havia para a partição).
+    """
+    rows = df_u.drop(columns=["year", "demo"], errors="ignore")
+    _write_parquet(_dictionary_table(rows), _partition("rows", year, demo, root))
+    _write_parquet(_dictionary_table(unmapped_counts_frame(rows)), _partition("counts", year, demo, root))
+
+
+def has_unmapped(year: int, demo: str, root: str = UNMAPPED_ROOT) -> bool:
+    return os.path.exists(_partition("counts", year, demo, root))
+
+
+def consolidate_counts(years, root: str = UNMAPPED_ROOT) -> pd.DataFrame:
+    """
+    Junta as contagens das partições dos `years` em counts.parquet (pequeno: uma
+    linha por ano/demo/DS_CONTA). As linhas em rows/ não são lidas.
+    """
+    dataset = ds.dataset(os.path.join(root, "counts"), format="parquet", partitioning="hive")
+    table = dataset.to_table(filter=pc.field("year").isin(list(years)))
+    counts = table.to_pandas()
+    for col in ["DS_CONTA", "CD_CONTA", "demo"]:
+        counts[col] = counts[col].astype(str)
+    counts = counts[COUNT_COLUMNS].sort_values(["year", "demo", "n_lines", "DS_CONTA"], ascending=[True, True, False, True])
+    counts = counts.reset_index(drop=True)
+
+    _write_parquet(pa.Table.from_pandas(counts, preserve_index=False), os.path.join(root, "counts.parquet"))
+    return counts
+
+
+def read_unmapped_counts(path: str = UNMAPPED_COUNTS, demo=None) -> pd.DataFrame:
+    """Contagens por ano/demo/DS_CONTA (COUNT_COLUMNS; `companies` = lista de DENOM_CIA)."""
+    filters = None if demo is None else [("demo", "==", demo)]
+    return pd.read_parquet(path, filters=filters)
+
+
+def read_unmapped_rows(root: str = UNMAPPED_ROOT, years=None, demo=None, ds_conta=None, columns=None) -> pd.DataFrame:
+    """
+    Linhas não mapeadas (nível de linha) com os filtros empurrados para o scan:
+    ano/demo escolhem as partições e DS_CONTA é filtrado pelo Arrow.
+    """
+    dataset = ds.dataset(os.path.join(root, "rows"), format="parquet", partitioning="hive")
+    expr = None
+    for cond in (
+        None if years is None else pc.field("year").isin(list(years)),
+        None if demo is None else pc.field("demo") == demo,
+        # lista tipada: `isin([])` não tem tipo e o Arrow recusa (string vs null)
+        None if ds_conta is None else pc.field("DS_CONTA").isin(pa.array(list(ds_conta), pa.string())),
+    ):
+        if cond is not None:
+            expr = cond if expr is None else expr & cond
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
@@ -0,0 +1,125 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from account_map import DS_CONTA_MAP, METRIC_DEMO
+
+# Peso de cada critério no score dos candidatos (soma = 1)
+SCORE_WEIGHTS = {
+    "similarity": 0.4,        # parecido com os rótulos já mapeados da métrica
+    "company_coverage": 0.2,  # publicado por muitas companhias
+    "year_coverage": 0.2,     # presente em todos os anos
+    "frequency": 0.2,         # nº de linhas (escala log)
+}
+
+# Colunas do resultado de discover (também quando não há candidatos)
+CANDIDATE_COLUMNS = [
+    "DS_CONTA", "CD_CONTA", "score", "similarity", "freq", "companies", "years",
+    "company_coverage", "year_coverage", "variants",
+]
+
+# Marcas de acento que sobram depois da decomposição NFKD
+_COMBINING = re.compile("[\u0300-\u036f]")
+
+
+def fold(text: str) -> str:
+    """Normaliza um rótulo: sem acentos, minúsculo e com espaços simples."""
+    text = _COMBINING.sub("", unicodedata.normalize("NFKD", str(text)))
+    return " ".join(text.lower().split())
+
+
+def compile_patterns(patterns):
+    """
+    Uma única regex com todos os padrões (já normalizados). Os mais longos vêm
+    primeiro na alternação, então "resultado bruto" ganha de "resultado".
+    """
+    folded = sorted({fold(p) for p in patterns}, key=len, reverse=True)
+    return re.compile("|".join(re.escape(p) for p in folded))
+
+
+def label_stats(counts: pd.DataFrame, demo: str) -> pd.DataFrame:
+    """
+    Um registro por rótulo normalizado da demonstração `demo`, a partir das
+    contagens do diagnóstico (diagnostics.COUNT_COLUMNS). Variações só de
+    acento/caixa/espaço do mesmo rótulo são somadas; `companies` conta as companhias
+    distintas em todos os anos e variações (as listas de cada contagem, não o maior n_companies).
+    """
+    sel = counts[counts["demo"] == demo]
+    n_years = sel["year"].nunique()
+
+    # fold só nos rótulos distintos (milhares), não nas linhas
+    labels = pd.Series(sel["DS_CONTA"].unique())
+    folded = dict(zip(labels, (fold(x) for x in labels)))
+    sel = sel.assign(label=sel["DS_CONTA"].map(folded)).sort_values("n_lines", ascending=False, kind="stable")
+
+    per_year = sel.groupby(["label", "year"]).agg(n_lines=("n_lines", "sum"))
+    stats = per_year.groupby("label").agg(
+        freq=("n_lines", "sum"),
+        years=("n_lines", "size"),
+    )
+    companies = sel[["label", "companies"]].explode("companies")
+    stats["companies"] = companies.groupby("label")["companies"].nunique()
+    # rótulo/código exibidos = a variação mais frequente
+    stats = stats.join(sel.groupby("label").agg(
+        DS_CONTA=("DS_CONTA", "first"),
+        CD_CONTA=("CD_CONTA", "first"),
+        variants=("DS_CONTA", "nunique"),
+    ))
+
+    stats["company_coverage"] = stats["companies"] / max(stats["companies"].max(), 1) if len(stats) else 0.0
+    stats["year_coverage"] = stats["years"] / max(n_years, 1)
+    return stats.reset_index()
+
+
+def trigrams(label: str) -> frozenset:
+    padded = f"  {label} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(labels, targets) -> np.ndarray:
+    """
+    Similaridade fuzzy (Dice sobre trigramas de caracteres, 0..1) entre cada rótulo
+    e o rótulo-alvo mais parecido (todos já normalizados). Tolera troca de ordem,
+    plural e preposições, e custa uma interseção de conjuntos por par.
+    """
+    if not targets:
+        return np.zeros(len(labels))
+    target_grams = [trigrams(t) for t in targets]
+    scores = []
+    for label in labels:
+        grams = trigrams(label)
+        scores.append(max(2 * len(grams & t) / (len(grams) + len(t)) for t in target_grams))
+    return np.array(scores)
+
+
+def discover(counts: pd.DataFrame, metric: str = None, demo: str = None, patterns=None) -> pd.DataFrame:
+    """
+    Rótulos candidatos para `metric` (ou para qualquer métrica de `demo`), entre as
+    linhas não mapeadas. Com `patterns`, só rótulos que contêm algum deles.
+    Ordenados por score = combinação (SCORE_WEIGHTS) de similaridade com DS_CONTA_MAP,
+    cobertura de companhias, cobertura de anos e frequência.
+    """
+    if metric is not None:
+        demo = METRIC_DEMO[metric]
+        metrics = [metric]
+    elif demo is not None:
+        metrics = [m for m, d in METRIC_DEMO.items() if d == demo]
+    else:
+        raise ValueError("Informe metric ou demo")
+
+    stats = label_stats(counts, demo)
+    if patterns:
+        regex = compile_patterns(patterns)
+        stats = stats[[regex.search(label) is not None for label in stats["label"]]]
+    if stats.empty:
+        return pd.DataFrame(columns=CANDIDATE_COLUMNS)
+
+    targets = sorted({fold(ds) for m in metrics for ds in DS_CONTA_MAP.get(m, [])})
+    stats = stats.assign(similarity=similarity(stats["label"], targets))
+
+    freq = np.log1p(stats["freq"])
+    stats["frequency"] = freq / freq.max() if len(stats) and freq.max() > 0 else 0.0
+    stats["score"] = sum(w * stats[col] for col, w in SCORE_WEIGHTS.items())
+    return stats.sort_values(["score", "freq"], ascending=False)[CANDIDATE_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,100 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from derived_metrics import metric_info
+
+# Cubo de Data Quality, pré-calculado pelo 02_extract_metrics.py a cada execução.
+# A página Data Quality só fatia estas tabelas (nada de isna/pivot/groupby por rerun):
+#   outputs/dq_cube/overview.parquet               linhas e colunas do dataset final
+#   outputs/dq_cube/metrics.parquet                NaNs por métrica (ordem do registro)
+#   outputs/dq_cube/missing.parquet                faltantes métrica x companhia x ano
+#   outputs/dq_cube/unmapped_by_year_demo.parquet  linhas não mapeadas por ano/demo
+#   outputs/dq_cube/unmapped_top.parquet           top UNMAPPED_TOP_N DS_CONTA não mapeados por demo
+DQ_CUBE_ROOT = "outputs/dq_cube"
+DQ_TABLES = ["overview", "metrics", "missing", "unmapped_by_year_demo", "unmapped_top"]
+
+UNMAPPED_TOP_N = 30
+
+
+def dq_cube_paths(root: str = DQ_CUBE_ROOT) -> dict:
+    return {name: os.path.join(root, f"{name}.parquet") for name in DQ_TABLES}
+
+
+def missing_cube(df: pd.DataFrame, metrics) -> pd.DataFrame:
+    """
+    Faltantes de todas as métricas de uma vez: uma linha por métrica/companhia e uma
+    coluna por ano ("2020", ...); True = algum período do ano sem valor. Ano sem
+    linha da companhia fica False, como na matriz que a página montava.
+    """
+    flags = df[metrics].isna()
+    flags.index = pd.MultiIndex.from_arrays(
+        [df["DENOM_CIA"].astype(str), df["year"].astype(int)], names=["DENOM_CIA", "year"]
+    )
+    cube = (
+        flags.groupby(level=["DENOM_CIA", "year"]).max()
+        .rename_axis(columns="metric")
+        .stack(future_stack=True)
+        .unstack("year", fill_value=False)
+    )
+    cube.columns = [str(year) for year in cube.columns]
+    cube = cube.reset_index()
+    cube["metric"] = pd.Categorical(cube["metric"], categories=metrics, ordered=True)
+    cube = cube.sort_values(["metric", "DENOM_CIA"]).reset_index(drop=True)
+    cube["metric"] = cube["metric"].astype(str)
+    return cube[["metric", "DENOM_CIA", *cube.columns[2:]]]
+
+
+def unmapped_tables(counts: pd.DataFrame, top_n: int = UNMAPPED_TOP_N):
+    """(linhas não mapeadas por ano/demo, top `top_n` DS_CONTA por demo) das contagens do diagnóstico."""
+    by_year_demo = (
+        counts.groupby(["year", "demo"])["n_lines"]
+        .sum()
+        .reset_index(name="unmapped_count")
+        .sort_values(["year", "demo"])
+    )
+    top = (
+        counts.groupby(["demo", "DS_CONTA"])["n_lines"]
+        .sum()
+        .reset_index(name="freq")
+        .sort_values(["demo", "freq", "DS_CONTA"], ascending=[True, False, True])
+        .groupby("demo")
+        .head(top_n)
+    )
+    return by_year_demo.reset_index(drop=True), top.reset_index(drop=True)
+
+
+def build_dq_cube(df: pd.DataFrame, counts: pd.DataFrame, top_n: int = UNMAPPED_TOP_N) -> dict:
+    """
+    Todas as tabelas do cubo a partir do dataset final e das contagens de linhas não
+    mapeadas (diagnostics.consolidate_counts). Métricas = as do registro presentes no dataset.
+    """
+    info = metric_info()
+    metrics = [col for col in info if col in df.columns]
+    by_year_demo, top = unmapped_tables(counts, top_n)
+    return {
+        "overview": pd.DataFrame([{"rows": len(df), "columns": df.shape[1]}]),
+        "metrics": pd.DataFrame({
+            "metric": metrics,
+            "label": [info[col]["label"] for col in metrics],
+            "nan_count": df[metrics].isna().sum().to_numpy(),
+        }),
+        "missing": missing_cube(df, metrics),
+        "unmapped_by_year_demo": by_year_demo,
+        "unmapped_top": top,
+    }
+
+
+def write_dq_cube(cube: dict, root: str = DQ_CUBE_ROOT):
+    """Grava cada tabela do cubo (arquivo temporário + os.replace, como os demais outputs)."""
+    os.makedirs(root, exist_ok=True)
+    for name, path in dq_cube_paths(root).items():
+        tmp = path + ".tmp"
+        pq.write_table(pa.Table.from_pandas(cube[name], preserve_index=False), tmp, compression="zstd")
+        os.replace(tmp, path)
+
+
+def read_dq_cube(root: str = DQ_CUBE_ROOT) -> dict:
+    return {name: pd.read_parquet(path) for name, path in dq_cube_paths(root).items()}
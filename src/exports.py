@@ -0,0 +1,86 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from openpyxl import Workbook
+
+# Formatos do dataset final (outputs/final_dataset.<ext>). O Arrow IPC (Feather v2,
+# sem compressão) é o canônico: tipado e lido pelo dashboard via memory map, sem
+# parse. CSV e XLSX são cópias opcionais para quem abre os dados fora do projeto.
+FINAL_DATASET_ROOT = "outputs/final_dataset"
+CANONICAL_FORMAT = "arrow"
+SECONDARY_FORMATS = ["csv", "xlsx"]
+DEFAULT_EXPORTS = ["csv"]
+
+EXTENSIONS = {"arrow": ".arrow", "csv": ".csv", "xlsx": ".xlsx"}
+
+
+def output_path(fmt: str, root: str = FINAL_DATASET_ROOT) -> str:
+    return root + EXTENSIONS[fmt]
+
+
+def write_output(path, writer, **kwargs):
+    """
+    Grava um output em arquivo temporário e troca com os.replace: quem lê
+    outputs/ (ex.: o dashboard durante uma execução) vê o arquivo antigo ou o
+    novo, nunca um arquivo pela metade. `writer` é ex. df.to_csv.
+    """
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp{ext}"  # mantém a extensão (to_excel escolhe o engine por ela)
+    writer(tmp, **kwargs)
+    os.replace(tmp, path)
+
+
+def dataset_table(df: pd.DataFrame) -> pa.Table:
+    """Tabela Arrow do dataset: categoricals viram texto (mesmos tipos que o CSV relido)."""
+    text = {col: str for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)}
+    return pa.Table.from_pandas(df.astype(text), preserve_index=False)
+
+
+def write_arrow(df: pd.DataFrame, path: str):
+    # Sem compressão: o arquivo pode ser mapeado em memória e lido sem cópia
+    table = dataset_table(df)
+    write_output(path, lambda tmp: feather.write_feather(table, tmp, compression="uncompressed"))
+
+
+def write_csv(df: pd.DataFrame, path: str):
+    write_output(path, df.to_csv, index=False)
+
+
+def write_xlsx(df: pd.DataFrame, path: str):
+    """
+    Excel em modo write-only do openpyxl: as linhas são gravadas em sequência,
+    sem montar a planilha inteira (com estilos) em memória como o to_excel.
+    """
+    def writer(tmp):
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")
+        ws.append(list(df.columns))
+        # NaN -> célula vazia; valores como tipos Python (float/int/str)
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+        wb.save(tmp)
+
+    write_output(path, writer)
+
+
+EXPORTERS = {"arrow": write_arrow, "csv": write_csv, "xlsx": write_xlsx}
+
+
+def export_dataset(df: pd.DataFrame, fmt: str, root: str = FINAL_DATASET_ROOT) -> str:
+    """Grava o dataset final no formato `fmt` (ver EXPORTERS); retorna o caminho."""
+    path = output_path(fmt, root)
+    EXPORTERS[fmt](df, path)
+    return path
+
+
+def read_arrow(path: str = output_path(CANONICAL_FORMAT)) -> pd.DataFrame:
+    """
+    Lê o dataset canônico mapeando o arquivo em memória: o Arrow lê as colunas sem
+    parse nem cópia e só a conversão para pandas copia os dados (o mapeamento é
+    liberado em seguida, então o pipeline pode substituir o arquivo).
+    """
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas()
@@ -0,0 +1,353 @@
+import argparse
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import tornado.ioloop
+import tornado.web
+
+from derived_metrics import metric_info
+from exports import CANONICAL_FORMAT, output_path, read_arrow
+from universe import peer_groups
+
+# API HTTP somente leitura sobre o dataset final (outputs/final_dataset.arrow).
+# O arquivo é carregado uma vez num índice em memória (MetricStore); quando o
+# pipeline grava um dataset novo, o índice é recarregado em segundo plano e trocado
+# de uma vez, sem derrubar as requisições em andamento.
+#
+#   python src/metrics_api.py --port 8000
+#
+#   GET /health
+#   GET /metrics                                  métricas disponíveis (rótulo, formato)
+#   GET /companies                                companhias e setor
+#   GET /groups                                   grupos de pares
+#   GET /data?company=&year=&quarter=&metric=     recorte largo (uma linha por companhia/período)
+#   GET /series/<metric>?company=&group=          série temporal (formato longo)
+#   GET /rankings/<metric>?year=&quarter=&group=&top=
+#
+# Filtros aceitam repetição (?company=A&company=B) ou vírgula (?year=2023,2024).
+# Respostas em JSON ou, com ?format=arrow (ou Accept: application/vnd.apache.arrow.stream),
+# Arrow IPC stream. ETag por versão do dataset + consulta: If-None-Match -> 304.
+
+DEFAULT_PORT = 8000
+RELOAD_SECONDS = 2.0
+RESPONSE_CACHE_SIZE = 2048
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+JSON_MIME = "application/json; charset=UTF-8"
+
+log = logging.getLogger("metrics_api")
+
+
+class UnknownKey(KeyError):
+    """Métrica ou grupo que não existe no dataset (vira HTTP 404)."""
+
+
+def dataset_version(path: str):
+    """(mtime_ns, tamanho) do arquivo, ou None se ele não existir (mesma chave do dashboard)."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class MetricStore:
+    """
+    Índice em memória do dataset final: linhas ordenadas por companhia e período,
+    o intervalo de linhas de cada companhia e as colunas de métrica como arrays.
+    Imutável depois de construído (a recarga cria outro).
+    """
+
+    def __init__(self, df: pd.DataFrame, version):
+        self.quarterly = "quarter" in df.columns
+        self.period_keys = ["year", "quarter"] if self.quarterly else ["year"]
+        df = df.sort_values(["DENOM_CIA", *self.period_keys], kind="stable").reset_index(drop=True)
+
+        self.df = df
+        self.version = version
+        self.tag = hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+        self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+        info = metric_info()
+        numeric = [c for c in df.columns if c not in ("year", "quarter") and pd.api.types.is_float_dtype(df[c])]
+        # métricas do registro primeiro (na ordem dele), depois as demais colunas numéricas
+        self.metrics = [c for c in info if c in numeric] + [c for c in numeric if c not in info]
+        self.info = {c: info.get(c, {"label": c, "format": "money"}) for c in self.metrics}
+
+        # company -> (início, fim) das suas linhas
+        names = df["DENOM_CIA"].astype(str).to_numpy()
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+        ends = np.r_[starts[1:], len(names)]
+        self.company_rows = {names[s]: (s, e) for s, e in zip(starts, ends)}
+
+        self.year = df["year"].to_numpy()
+        self.quarter = df["quarter"].to_numpy() if self.quarterly else None
+        self.groups = peer_groups(df)
+
+    @classmethod
+    def load(cls, path: str):
+        version = dataset_version(path)
+        return cls(read_arrow(path), version)
+
+    def companies(self, names=None, group=None):
+        """Companhias pedidas (nomes e/ou grupo de pares); None = todas."""
+        if group is not None:
+            if group not in self.groups:
+                raise UnknownKey(f"grupo desconhecido: {group}")
+            names = list(names or []) + self.groups[group]
+        return names
+
+    def rows(self, companies=None, years=None, quarters=None) -> np.ndarray:
+        """Posições das linhas que passam nos filtros (companhia pelo índice; período por máscara)."""
+        if companies is None:
+            idx = np.arange(len(self.df))
+        else:
+            ranges = [self.company_rows[c] for c in dict.fromkeys(companies) if c in self.company_rows]
+            idx = np.concatenate([np.arange(s, e) for s, e in ranges]) if ranges else np.array([], dtype=int)
+        if years:
+            idx = idx[np.isin(self.year[idx], years)]
+        if quarters and self.quarterly:
+            idx = idx[np.isin(self.quarter[idx], quarters)]
+        return idx
+
+    def check_metrics(self, metrics):
+        unknown = [m for m in metrics if m not in self.info]
+        if unknown:
+            raise UnknownKey(f"métrica desconhecida: {', '.join(unknown)}")
+        return metrics
+
+    def slice(self, companies=None, years=None, quarters=None, metrics=None) -> pd.DataFrame:
+        metrics = self.check_metrics(metrics) if metrics else self.metrics
+        cols = ["DENOM_CIA", *[c for c in ("sector",) if c in self.df.columns], *self.period_keys, *metrics]
+        return self.df.iloc[self.rows(companies, years, quarters)][cols]
+
+    def series(self, metric, companies=None) -> pd.DataFrame:
+        self.check_metrics([metric])
+        sel = self.df.iloc[self.rows(companies)]
+        return sel[["DENOM_CIA", *self.period_keys, metric]].rename(columns={metric: "value"})
+
+    def ranking(self, metric, year, quarter=None, companies=None, top=None) -> pd.DataFrame:
+        """Maior valor = 1 (empate: ordem das linhas, como no dashboard); sem valor fica de fora."""
+        self.check_metrics([metric])
+        sel = self.df.iloc[self.rows(companies, [year], [quarter] if quarter else None)]
+        sel = sel[sel[metric].notna()]
+        if self.quarterly and quarter is None:
+            # sem trimestre: o último disponível do ano
+            sel = sel[sel["quarter"] == sel["quarter"].max()]
+        sel = sel.sort_values(metric, ascending=False, kind="stable")
+        out = sel[["DENOM_CIA", *self.period_keys, metric]].rename(columns={metric: "value"})
+        out.insert(0, "rank", np.arange(1, len(out) + 1))
+        return out.head(top) if top else out
+
+
+def encode(df: pd.DataFrame, fmt: str, store: MetricStore) -> bytes:
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    # to_json: NaN -> null, sem loop em Python por linha
+    data = df.to_json(orient="records", force_ascii=False)
+    return f'{{"version":"{store.tag}","rows":{len(df)},"data":{data}}}'.encode("utf-8")
+
+
+class StoreHolder:
+    """Store atual + recarga quando o arquivo muda. Respostas ficam em cache por versão."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.store = MetricStore.load(path) if dataset_version(path) else None
+        self.loading = False
+        self.responses = collections.OrderedDict()
+
+    async def reload_if_changed(self):
+        version = dataset_version(self.path)
+        if self.loading or version is None or (self.store is not None and version == self.store.version):
+            return
+        self.loading = True
+        try:
+            # fora do event loop: as requisições continuam servidas pelo store anterior
+            store = await tornado.ioloop.IOLoop.current().run_in_executor(None, MetricStore.load, self.path)
+            self.store = store
+            self.responses.clear()
+            log.info("Dataset recarregado: %s (%d linhas)", self.path, len(store.df))
+        except Exception:
+            log.exception("Falha ao recarregar %s; mantendo a versão anterior", self.path)
+        finally:
+            self.loading = False
+
+    def cached(self, key, build):
+        """(corpo, etag) da resposta `key`, calculada uma vez por versão do dataset."""
+        hit = self.responses.get(key)
+        if hit is not None:
+            self.responses.move_to_end(key)
+            return hit
+        body = build()
+        hit = (body, '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"')
+        self.responses[key] = hit
+        if len(self.responses) > RESPONSE_CACHE_SIZE:
+            self.responses.popitem(last=False)
+        return hit
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, holder: StoreHolder):
+        self.holder = holder
+        self._etag = None
+
+    def list_arg(self, name, cast=str):
+        values = [v for raw in self.get_arguments(name) for v in raw.split(",") if v]
+        try:
+            return [cast(v) for v in values] or None
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason=f"valor inválido em {name}")
+
+    def output_format(self):
+        fmt = self.get_argument("format", None)
+        if fmt is None:
+            fmt = "arrow" if ARROW_MIME in self.request.headers.get("Accept", "") else "json"
+        if fmt not in ("json", "arrow"):
+            raise tornado.web.HTTPError(400, reason="format deve ser json ou arrow")
+        return fmt
+
+    def respond(self, build_frame):
+        """Resposta (em cache por versão + URL + formato) com ETag; 304 se o cliente já tem."""
+        store = self.holder.store
+        if store is None:
+            raise tornado.web.HTTPError(503, reason="dataset ainda não gerado (rode o pipeline)")
+        fmt = self.output_format()
+        query = tuple(sorted((k, tuple(v)) for k, v in self.request.query_arguments.items()))
+        key = (store.version, self.request.path, query, fmt)
+        try:
+            body, self._etag = self.holder.cached(key, lambda: encode(build_frame(store), fmt, store))
+        except UnknownKey as e:
+            raise tornado.web.HTTPError(404, reason=str(e.args[0]))
+
+        self.set_header("Content-Type", ARROW_MIME if fmt == "arrow" else JSON_MIME)
+        self.set_header("Cache-Control", "no-cache")  # sempre revalida via ETag
+        self.write(body)
+
+    def compute_etag(self):
+        # ETag já calculada com a resposta; o finish() do tornado devolve 304 se bater
+        return self._etag
+
+    def write_error(self, status_code, **kwargs):
+        self.set_header("Content-Type", JSON_MIME)
+        self.finish(json.dumps({"error": self._reason}, ensure_ascii=False))
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        store = self.holder.store
+        self.set_header("Cache-Control", "no-cache")
+        self.write({
+            "status": "ok" if store is not None else "no_dataset",
+            "dataset": self.holder.path,
+            "version": store.tag if store else None,
+            "loaded_at": store.loaded_at if store else None,
+            "rows": len(store.df) if store else 0,
+        })
+
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.respond(lambda s: pd.DataFrame(
+            [{"metric": m, "label": s.info[m]["label"], "format": s.info[m]["format"]} for m in s.metrics]
+        ))
+
+
+class CompaniesHandler(BaseHandler):
+    def get(self):
+        cols = ["DENOM_CIA", "sector"]
+        self.respond(lambda s: s.df[[c for c in cols if c in s.df.columns]].drop_duplicates("DENOM_CIA"))
+
+
+class GroupsHandler(BaseHandler):
+    def get(self):
+        self.respond(lambda s: pd.DataFrame(
+            [{"group": g, "companies": len(members)} for g, members in s.groups.items()]
+        ))
+
+
+class DataHandler(BaseHandler):
+    def get(self):
+        companies = self.list_arg("company")
+        group = self.get_argument("group", None)
+        self.respond(lambda s: s.slice(
+            s.companies(companies, group), self.list_arg("year", int), self.list_arg("quarter", int),
+            self.list_arg("metric"),
+        ))
+
+
+class SeriesHandler(BaseHandler):
+    def get(self, metric):
+        companies = self.list_arg("company")
+        group = self.get_argument("group", None)
+        self.respond(lambda s: s.series(metric, s.companies(companies, group)))
+
+
+class RankingsHandler(BaseHandler):
+    def get(self, metric):
+        years = self.list_arg("year", int)
+        quarters = self.list_arg("quarter", int)
+        top = self.list_arg("top", int)
+        companies = self.list_arg("company")
+        group = self.get_argument("group", None)
+
+        def build(s):
+            year = years[0] if years else int(s.year.max())
+            return s.ranking(metric, year, quarters[0] if quarters else None, s.companies(companies, group),
+                             top[0] if top else None)
+
+        self.respond(build)
+
+
+def make_app(path: str = output_path(CANONICAL_FORMAT), reload_seconds: float = RELOAD_SECONDS):
+    holder = StoreHolder(path)
+    args = {"holder": holder}
+    app = tornado.web.Application([
+        (r"/health", HealthHandler, args),
+        (r"/metrics", MetricsHandler, args),
+        (r"/companies", CompaniesHandler, args),
+        (r"/groups", GroupsHandler, args),
+        (r"/data", DataHandler, args),
+        (r"/series/([^/]+)", SeriesHandler, args),
+        (r"/rankings/([^/]+)", RankingsHandler, args),
+    ])
+    app.holder = holder
+    app.reloader = tornado.ioloop.PeriodicCallback(holder.reload_if_changed, reload_seconds * 1000)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP somente leitura das métricas (dataset final).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--dataset", default=output_path(CANONICAL_FORMAT))
+    parser.add_argument("--reload-seconds", type=float, default=RELOAD_SECONDS,
+                        help="intervalo de checagem de dataset novo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Um log por requisição derrubaria o throughput; só avisos/erros do tornado
+    logging.getLogger("tornado.access").setLevel(logging.WARNING)
+
+    app = make_app(args.dataset, args.reload_seconds)
+    app.listen(args.port, address=args.address)
+    app.reloader.start()
+    store = app.holder.store
+    print(f"API em http://{args.address}:{args.port} | dataset: {args.dataset} "
+          f"({len(store.df) if store else 0} linhas)")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
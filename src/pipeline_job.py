@@ -0,0 +1,157 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from run_report import LAST_RUN
+
+# Execução do pipeline em segundo plano a partir do dashboard: no máximo uma por
+# vez (lock em arquivo, vale entre sessões e entre processos do Streamlit)
+PIPELINE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "02_extract_metrics.py")
+OUTPUTS_DIR = "outputs"
+LOCK_PATH = f"{OUTPUTS_DIR}/.pipeline.lock"
+STATUS_PATH = f"{OUTPUTS_DIR}/pipeline_status.json"
+LOG_PATH = f"{OUTPUTS_DIR}/pipeline.log"
+
+# Argumentos que definem o dataset gerado (universo, períodos, formatos exportados):
+# uma nova execução pelo dashboard repete os da última, em vez de voltar aos defaults
+DATASET_ARGS = ("universe", "periods", "export")
+
+
+def _open_lock() -> int:
+    # O arquivo de lock nunca é apagado: o que vale é o flock sobre ele, não a existência
+    os.makedirs(OUTPUTS_DIR, exist_ok=True)
+    return os.open(LOCK_PATH, os.O_CREAT | os.O_RDWR)
+
+
+def _try_lock(fd: int) -> bool:
+    """Lock exclusivo sem esperar; False se outro processo/sessão já o detém."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def last_run_args(path: str = LAST_RUN) -> list:
+    """
+    Argumentos de DATASET_ARGS da última execução (outputs/run_report/last_run.json)
+    na forma de linha de comando; [] se ela não existir (defaults do pipeline).
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("args") or {}
+    except (FileNotFoundError, ValueError):
+        return []
+
+    args = []
+    for name in DATASET_ARGS:
+        value = previous.get(name)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            # lista vazia também conta: "--export" sem valores = só Arrow
+            args += [f"--{name}", *value]
+        else:
+            args += [f"--{name}", str(value)]
+    return args
+
+
+def _write_status(**fields):
+    tmp = STATUS_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(fields, f, indent=2)
+    os.replace(tmp, STATUS_PATH)
+
+
+def is_running() -> bool:
+    """
+    Há um pipeline em andamento? O lock é liberado pelo sistema quando o último
+    processo que o detém termina, então uma execução que caiu não deixa lock órfão.
+    """
+    fd = _open_lock()
+    try:
+        return not _try_lock(fd)
+    finally:
+        os.close(fd)
+
+
+def _watch(proc, started, fd):
+    """Espera o processo terminar, registra o resultado e libera o lock."""
+    returncode = proc.wait()
+    _write_status(
+        state="ok" if returncode == 0 else "failed",
+        returncode=returncode,
+        started=started,
+        finished=time.time(),
+    )
+    os.close(fd)
+
+
+def start_pipeline(args=()) -> bool:
+    """
+    Dispara src/02_extract_metrics.py em segundo plano e retorna na hora.
+    Single-flight: se já houver uma execução (desta ou de outra sessão/processo),
+    não inicia outra e retorna False. A saída vai para outputs/pipeline.log.
+    """
+    # flock: entre duas sessões que chegam aqui juntas, só uma obtém o lock
+    fd = _open_lock()
+    if not _try_lock(fd):
+        os.close(fd)
+        return False
+
+    started = time.time()
+    try:
+        with open(LOG_PATH, "w", encoding="utf-8") as log:
+            # O filho herda o descritor (e o lock): se o dashboard cair, o lock
+            # continua valendo até o pipeline terminar
+            proc = subprocess.Popen(
+                [sys.executable, "-u", PIPELINE_SCRIPT, *args],
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                pass_fds=(fd,) if fcntl is not None else (),
+            )
+    except Exception:
+        os.close(fd)
+        raise
+
+    os.ftruncate(fd, 0)
+    os.write(fd, json.dumps({"pid": proc.pid, "started": started}).encode())
+    _write_status(state="running", returncode=None, started=started, finished=None)
+
+    threading.Thread(target=_watch, args=(proc, started, fd), daemon=True).start()
+    return True
+
+
+def pipeline_status() -> dict:
+    """Estado da última execução: running/ok/failed (ou idle se nunca rodou)."""
+    try:
+        with open(STATUS_PATH, "r", encoding="utf-8") as f:
+            status = json.load(f)
+    except (FileNotFoundError, ValueError):
+        status = {"state": "idle"}
+
+    # O processo que acompanhava a execução (ex.: servidor reiniciado) não gravou o resultado
+    if status.get("state") == "running" and not is_running():
+        status["state"] = "unknown"
+    return status
+
+
+def log_tail(lines: int = 20) -> str:
+    """Últimas linhas do log da execução (progresso no dashboard)."""
+    try:
+        with open(LOG_PATH, "r", encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except FileNotFoundError:
+        return ""
@@ -0,0 +1,181 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+import uuid
+
+import pandas as pd
+
+try:
+    import resource  # só Unix; no Windows o pico de RSS fica vazio
+except ImportError:
+    resource = None
+
+# Relatório de desempenho do 02_extract_metrics.py, um registro por estágio (e por ano):
+#   outputs/run_report/last_run.json   a última execução (metadados + estágios)
+#   outputs/run_report/stages.parquet  histórico das últimas MAX_RUNS execuções (página Data Quality)
+#   outputs/run_report/profile.*       saída do --profile (opcional)
+RUN_REPORT_ROOT = "outputs/run_report"
+LAST_RUN = f"{RUN_REPORT_ROOT}/last_run.json"
+RUN_HISTORY = f"{RUN_REPORT_ROOT}/stages.parquet"
+MAX_RUNS = 50
+
+STAGE_COLUMNS = [
+    "run_id", "started", "stage", "parent", "year", "demo", "wall_s", "cpu_s", "rss_peak_delta_mb",
+    "rows_in", "rows_out", "bytes_read", "pid",
+]
+
+# Linhas mostradas no resumo do --profile
+PROFILE_TOP = 25
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo até agora (MB), ou None sem o módulo resource."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class RunReport:
+    """
+    Coleta os tempos de uma execução. Cada `stage()` mede tempo de relógio, tempo
+    de CPU do processo e quanto o pico de RSS subiu durante o estágio; linhas e
+    bytes são preenchidos por quem chama no dict devolvido pelo `with`.
+    Estágios abertos dentro de outro guardam o nome dele em `parent`.
+    Workers do ProcessPoolExecutor usam um RunReport próprio e devolvem `records`.
+    """
+
+    def __init__(self, run_id: str = None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.records = []
+        self._open = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str, year: int = None, demo: str = None, rows_in: int = None):
+        record = {
+            "stage": name, "parent": self._open[-1] if self._open else None, "year": year, "demo": demo,
+            "rows_in": rows_in, "rows_out": None, "bytes_read": None, "pid": os.getpid(),
+        }
+        self._open.append(name)
+        rss0 = peak_rss_mb()
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield record
+        finally:
+            self._open.pop()
+            record["wall_s"] = time.perf_counter() - wall0
+            record["cpu_s"] = time.process_time() - cpu0
+            rss1 = peak_rss_mb()
+            record["rss_peak_delta_mb"] = None if rss0 is None else rss1 - rss0
+            self.records.append(record)
+
+    def adopt(self, records):
+        """Junta os registros de um worker como filhos do estágio aberto agora."""
+        parent = self._open[-1] if self._open else None
+        for record in records:
+            self.records.append({**record, "parent": record["parent"] or parent})
+
+    def frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.records).assign(run_id=self.run_id, started=self.started)
+        df = df.reindex(columns=STAGE_COLUMNS)
+        return df.astype({
+            "year": "Int64", "rows_in": "Int64", "rows_out": "Int64", "bytes_read": "Int64", "pid": "Int64",
+            "wall_s": float, "cpu_s": float, "rss_peak_delta_mb": float,
+        })
+
+    def save(self, root: str = RUN_REPORT_ROOT, **meta) -> pd.DataFrame:
+        """Grava last_run.json e acrescenta a execução ao histórico Parquet (últimas MAX_RUNS)."""
+        os.makedirs(root, exist_ok=True)
+        stages = self.frame()
+
+        last_run = {
+            "run_id": self.run_id,
+            "started": self.started,
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "peak_rss_mb": peak_rss_mb(),
+            **meta,
+            "stages": json.loads(stages.drop(columns=["run_id", "started"]).to_json(orient="records")),
+        }
+        _replace_with(os.path.join(root, "last_run.json"), lambda tmp: _dump_json(last_run, tmp))
+
+        history_path = os.path.join(root, "stages.parquet")
+        history = stages
+        if os.path.exists(history_path):
+            previous = pd.read_parquet(history_path)
+            keep = previous["run_id"].drop_duplicates().tail(MAX_RUNS - 1)
+            history = pd.concat([previous[previous["run_id"].isin(keep)], stages], ignore_index=True)
+        _replace_with(history_path, lambda tmp: history.to_parquet(tmp, index=False))
+        return stages
+
+
+def _dump_json(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def _replace_with(path, write):
+    # Arquivo temporário + os.replace, como os demais outputs lidos pelo dashboard
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def read_run_history(path: str = RUN_HISTORY) -> pd.DataFrame:
+    """Histórico de estágios de todas as execuções guardadas (colunas STAGE_COLUMNS)."""
+    # reindex: execuções gravadas antes de uma coluna existir ficam com NA nela
+    return pd.read_parquet(path).reindex(columns=STAGE_COLUMNS)
+
+
+@contextlib.contextmanager
+def profiled(mode: str = None, root: str = RUN_REPORT_ROOT):
+    """
+    Hook opcional para investigar hot spots (--profile no 02_extract_metrics.py):
+    "cprofile" grava profile.prof (abrir com snakeviz/pstats) e um resumo por tempo
+    acumulado; "tracemalloc" grava as linhas que mais alocaram. Só enxerga o processo
+    principal, então rode com --jobs 1 para incluir o processamento dos anos.
+    """
+    if mode is None:
+        yield
+        return
+
+    os.makedirs(root, exist_ok=True)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(root, "profile.prof"))
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            _write_summary(os.path.join(root, "profile.txt"), out.getvalue())
+    elif mode == "tracemalloc":
+        tracemalloc.start(10)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = [f"Pico rastreado: {peak / 2**20:.1f} MB", ""]
+            lines += [str(stat) for stat in snapshot.statistics("lineno")[:PROFILE_TOP]]
+            _write_summary(os.path.join(root, "tracemalloc.txt"), "\n".join(lines) + "\n")
+    else:
+        raise ValueError(f"Modo de profile desconhecido: {mode}")
+
+
+def _write_summary(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    print(f"\nProfile salvo: {path}")
+    print(text)
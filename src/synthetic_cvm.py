@@ -0,0 +1,196 @@
+import argparse
+import io
+import os
+import random
+import zipfile
+
+from cvm_reader import CSV_ENCODING, CSV_SEP, SOURCES, statement_filename
+from universe import BANKS
+
+# Gera ZIPs no formato da DFP/ITR da CVM (e o cadastro de companhias) em qualquer
+# escala, para medir o pipeline sem baixar os arquivos reais.
+#
+#   python src/synthetic_cvm.py --companies 700 --years 2020 2024 --accounts 150 --output-dir /tmp/cvm/data_raw
+
+HEADER = [
+    "CNPJ_CIA", "DT_REFER", "VERSAO", "DENOM_CIA", "CD_CVM", "GRUPO_DFP", "MOEDA", "ESCALA_MOEDA",
+    "ORDEM_EXERC", "DT_INI_EXERC", "DT_FIM_EXERC", "CD_CONTA", "DS_CONTA", "VL_CONTA", "ST_CONTA_FIXA",
+]
+
+# Contas fixas de cada demonstração (código, rótulo, filhos gerados?); o resto
+# das `accounts` são contas "folha" genéricas espalhadas sob as contas com filhos
+TEMPLATE = {
+    "BPA": [
+        ("1", "Ativo Total", False),
+        ("1.01", "Ativo Circulante", True),
+        ("1.02", "Ativo Não Circulante", True),
+    ],
+    "BPP": [
+        ("2", "Passivo Total", False),
+        ("2.01", "Passivo Circulante", True),
+        ("2.02", "Passivo Não Circulante", True),
+        ("2.03", "Patrimônio Líquido Consolidado", True),
+    ],
+    "DRE": [
+        ("3.01", "Receitas da Intermediação Financeira", True),
+        ("3.02", "Despesas da Intermediação Financeira", True),
+        ("3.03", "Resultado Bruto de Intermediação Financeira", False),
+        ("3.04", "Outras Despesas e Receitas Operacionais", True),
+        ("3.05", "Resultado Antes dos Tributos sobre o Lucro", False),
+        ("3.11", "Lucro ou Prejuízo Líquido Consolidado do Período", False),
+    ],
+}
+
+# Rótulos alternativos publicados por parte das companhias (variações reais de layout)
+LABEL_VARIANTS = {
+    "Patrimônio Líquido Consolidado": ["Patrimônio Líquido"],
+    "Lucro ou Prejuízo Líquido Consolidado do Período": [
+        "Lucro (Prejuízo) Líquido do Período",
+        "Lucro/Prejuízo do Período",
+    ],
+    "Resultado Bruto de Intermediação Financeira": ["Resultado Bruto Intermediação Financeira"],
+}
+
+DEFAULT_COMPANIES = 700
+DEFAULT_ACCOUNTS = 150
+DEFAULT_YEARS = [2020, 2021, 2022, 2023, 2024]
+VARIANT_SHARE = 0.1
+
+
+def company_names(n: int):
+    """Os 5 bancos do projeto + companhias genéricas até completar `n`."""
+    names = BANKS[:n] + [f"COMPANHIA SINTETICA {i:04d} S.A." for i in range(max(n - len(BANKS), 0))]
+    return names
+
+
+def account_plan(demo: str, accounts: int, rng: random.Random):
+    """
+    Lista (código, rótulo, código do pai) com `accounts` contas: as fixas do
+    TEMPLATE + folhas genéricas de nível 3 sob as contas marcadas com filhos.
+    """
+    plan = [(cd, ds, cd.rpartition(".")[0] or None) for cd, ds, _ in TEMPLATE[demo]]
+    parents = [cd for cd, _, has_children in TEMPLATE[demo] if has_children]
+    for k in range(max(accounts - len(plan), 0)):
+        parent = parents[k % len(parents)]
+        seq = k // len(parents) + 1
+        label = f"Outras Contas {demo} {parent} {seq}"
+        if rng.random() < VARIANT_SHARE:
+            # variação só de caixa/acento (mesmo rótulo normalizado)
+            label = label.upper()
+        plan.append((f"{parent}.{seq:02d}", label, parent))
+    return plan
+
+
+def statement_values(plan, scale: float, rng: random.Random):
+    """Folhas aleatórias; contas com filhos = soma dos filhos; raiz = soma do nível 2."""
+    values = {}
+    children = {}
+    for cd, _, parent in plan:
+        if parent is not None:
+            children.setdefault(parent, []).append(cd)
+
+    def value(cd):
+        if cd not in values:
+            kids = children.get(cd)
+            values[cd] = round(sum(value(k) for k in kids), 2) if kids else round(rng.random() * scale, 2)
+        return values[cd]
+
+    for cd, _, _ in plan:
+        value(cd)
+    return values
+
+
+def company_labels(plan, rng: random.Random):
+    """Rótulos que esta companhia publica (parte usa LABEL_VARIANTS)."""
+    labels = {}
+    for cd, ds, _ in plan:
+        if ds in LABEL_VARIANTS and rng.random() < VARIANT_SHARE:
+            labels[cd] = rng.choice(LABEL_VARIANTS[ds])
+        else:
+            labels[cd] = ds
+    return labels
+
+
+def period_dates(source: str, year: int):
+    """(DT_REFER, DT_INI_EXERC) de cada documento: 1 anual na DFP, 3 trimestres no ITR."""
+    if source == "dfp":
+        return [(f"{year}-12-31", f"{year}-01-01")]
+    return [(f"{year}-03-31", f"{year}-01-01"), (f"{year}-06-30", f"{year}-01-01"), (f"{year}-09-30", f"{year}-01-01")]
+
+
+def write_statement(f, demo: str, year: int, source: str, companies, accounts: int, seed: int):
+    """Escreve um CSV (latin1, ';') com as linhas ÚLTIMO/PENÚLTIMO de todas as companhias."""
+    rng = random.Random(f"{seed}-{source}-{demo}-{year}")
+    out = io.TextIOWrapper(f, encoding=CSV_ENCODING, newline="")
+    out.write(CSV_SEP.join(HEADER) + "\n")
+
+    for cd_cvm, name in enumerate(companies, start=1):
+        plan = account_plan(demo, accounts, random.Random(f"{seed}-{demo}-{cd_cvm}"))
+        labels = company_labels(plan, random.Random(f"{seed}-labels-{demo}-{cd_cvm}"))
+        scale = 10 ** rng.uniform(4, 8)
+        for dt_refer, dt_ini in period_dates(source, year):
+            for ordem, offset in (("ÚLTIMO", 0), ("PENÚLTIMO", 1)):
+                ref_year = year - offset
+                ini = dt_ini.replace(str(year), str(ref_year))
+                fim = dt_refer.replace(str(year), str(ref_year))
+                values = statement_values(plan, scale * (1 - 0.05 * offset), rng)
+                for cd, _, _ in plan:
+                    out.write(CSV_SEP.join([
+                        f"{cd_cvm:014d}", dt_refer, "1", name, str(cd_cvm), f"DF Consolidado - {demo}",
+                        "REAL", "MIL", ordem, ini if demo == "DRE" else "", fim, cd, labels[cd],
+                        f"{values[cd]:.2f}", "S",
+                    ]) + "\n")
+    out.flush()
+    out.detach()
+
+
+def write_zip(year: int, output_dir: str, companies, accounts: int, seed: int, source: str = "dfp") -> str:
+    """data_raw/{dfp|itr}_cia_aberta_{year}.zip com os CSVs consolidados BPA/BPP/DRE."""
+    path = os.path.join(output_dir, f"{SOURCES[source]['prefix']}_{year}.zip")
+    tmp = path + ".tmp"
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as z:
+        for demo in TEMPLATE:
+            with z.open(statement_filename(year, demo, source), "w") as f:
+                write_statement(f, demo, year, source, companies, accounts, seed)
+    os.replace(tmp, path)
+    return path
+
+
+def write_cadastro(output_dir: str, companies):
+    """cad_cia_aberta.csv com CD_CVM/SETOR_ATIV (bancos + setores genéricos)."""
+    sectors = ["Bancos", "Energia Elétrica", "Comércio (Atacado e Varejo)", "Telecomunicações", "Construção Civil"]
+    path = os.path.join(output_dir, "cad_cia_aberta.csv")
+    with open(path, "w", encoding=CSV_ENCODING, newline="") as f:
+        f.write("CNPJ_CIA;DENOM_SOCIAL;SIT;CD_CVM;SETOR_ATIV\n")
+        for cd_cvm, name in enumerate(companies, start=1):
+            sector = "Bancos" if name in BANKS else sectors[1 + cd_cvm % (len(sectors) - 1)]
+            f.write(f"{cd_cvm:014d};{name};ATIVO;{cd_cvm};{sector}\n")
+    return path
+
+
+def generate(output_dir: str, companies: int = DEFAULT_COMPANIES, years=DEFAULT_YEARS,
+             accounts: int = DEFAULT_ACCOUNTS, seed: int = 0, sources=("dfp",)):
+    """Gera os ZIPs de `years` para cada fonte + o cadastro. Determinístico para o mesmo seed."""
+    os.makedirs(output_dir, exist_ok=True)
+    names = company_names(companies)
+    paths = [write_zip(year, output_dir, names, accounts, seed, source) for source in sources for year in years]
+    paths.append(write_cadastro(output_dir, names))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos no formato DFP/ITR da CVM.")
+    parser.add_argument("--companies", type=int, default=DEFAULT_COMPANIES)
+    parser.add_argument("--years", type=int, nargs="+", default=DEFAULT_YEARS)
+    parser.add_argument("--accounts", type=int, default=DEFAULT_ACCOUNTS, help="contas por demonstração")
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCES), default=["dfp"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="data_raw")
+    args = parser.parse_args()
+
+    for path in generate(args.output_dir, args.companies, args.years, args.accounts, args.seed, args.sources):
+        print(f"Gerado: {path}")
+
+
+if __name__ == "__main__":
+    main()
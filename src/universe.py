@@ -0,0 +1,89 @@
+import os
+
+import pandas as pd
+import requests
+
+from cvm_download import DownloadManifest, download_file, make_session
+
+# Cadastro de companhias abertas da CVM (traz o setor de atividade, SETOR_ATIV)
+CAD_URL = "https://dados.cvm.gov.br/dados/CIA_ABERTA/CAD/DADOS/cad_cia_aberta.csv"
+CAD_PATH = "data_raw/cad_cia_aberta.csv"
+
+NO_SECTOR = "Não classificado"
+
+BANKS = [
+    "ITAU UNIBANCO HOLDING S.A.",
+    "BCO BRASIL S.A.",
+    "BCO BRADESCO S.A.",
+    "BCO SANTANDER (BRASIL) S.A.",
+    "BCO BTG PACTUAL S.A."
+]
+
+# Universo processado pelo pipeline (--universe). None = todas as companhias da DFP.
+UNIVERSES = {
+    "banks": BANKS,
+    "all": None,
+}
+
+DEFAULT_UNIVERSE = "banks"
+
+# Grupos de pares fixos; o dashboard acrescenta um grupo por setor (SETOR_ATIV)
+PEER_GROUPS = {
+    "Top 5 bancos": BANKS,
+}
+
+
+def universe_companies(name: str):
+    """Lista de DENOM_CIA do universo `name` (None = sem filtro de companhia)."""
+    if name not in UNIVERSES:
+        raise ValueError(f"Universo desconhecido: {name} (opções: {', '.join(UNIVERSES)})")
+    return UNIVERSES[name]
+
+
+def load_sectors(path: str = CAD_PATH) -> pd.DataFrame:
+    """
+    CD_CVM -> SETOR_ATIV a partir do cadastro da CVM (baixado se ainda não existir).
+    Sem o cadastro (ex.: sem rede), devolve um frame vazio e as companhias ficam
+    como NO_SECTOR.
+    """
+    if not os.path.exists(path):
+        try:
+            with make_session(1) as session:
+                download_file(session, CAD_URL, path, DownloadManifest())
+        except requests.RequestException as e:
+            print(f"Aviso: cadastro da CVM indisponível ({e}); setores ficarão como '{NO_SECTOR}'.")
+            return pd.DataFrame({"CD_CVM": pd.Series(dtype="int64"), "SETOR_ATIV": pd.Series(dtype=object)})
+
+    cad = pd.read_csv(path, sep=";", encoding="latin1", usecols=["CD_CVM", "SETOR_ATIV"])
+    # Uma companhia pode ter mais de um registro (ex.: cancelado e reaberto): fica o último
+    return cad.dropna(subset=["CD_CVM"]).drop_duplicates("CD_CVM", keep="last")
+
+
+def company_sectors(companies: pd.DataFrame, sectors: pd.DataFrame) -> pd.Series:
+    """
+    `companies` tem DENOM_CIA/CD_CVM (como lidos da DFP). Devolve uma Series
+    DENOM_CIA -> setor, com NO_SECTOR onde o cadastro não tem a companhia.
+    """
+    merged = companies.drop_duplicates("DENOM_CIA").merge(sectors, on="CD_CVM", how="left")
+    return merged.set_index("DENOM_CIA")["SETOR_ATIV"].fillna(NO_SECTOR)
+
+
+def peer_groups(df: pd.DataFrame) -> dict:
+    """
+    Grupos de pares disponíveis para o dataset final `df`: os fixos de PEER_GROUPS
+    (só com as companhias presentes), um por setor e o universo inteiro.
+    """
+    present = set(df["DENOM_CIA"].dropna().unique())
+    groups = {}
+    for name, members in PEER_GROUPS.items():
+        members = [c for c in members if c in present]
+        if members:
+            groups[name] = members
+
+    if "sector" in df.columns:
+        by_sector = df.dropna(subset=["DENOM_CIA"]).groupby("sector")["DENOM_CIA"].unique()
+        for sector, members in by_sector.items():
+            groups[f"Setor: {sector}"] = sorted(members)
+
+    groups["Todas as companhias"] = sorted(present)
+    return groups
@@ -0,0 +1,196 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from account_tree import CHECK_TOLERANCE, check_children
+
+# Validação dos dados (regras contábeis e de consistência), gravada pelo 02_extract_metrics.py:
+#   outputs/validation/violations.parquet  uma linha por violação (lida pela página Data Quality)
+#
+# As regras são declaradas em RULES e cada tipo é avaliado de uma vez para todas as
+# companhias/períodos, com operações de frame (sem laço por companhia):
+#   identity  conta de uma demonstração = conta de outra (ex.: Ativo Total = Passivo Total)
+#   children  conta pai = soma dos filhos diretos, em toda a árvore da demonstração
+#   sign      métrica do dataset final com o sinal esperado
+#   zscore    métrica longe do histórico da própria companhia (z-score contra os demais períodos)
+# identity/children usam as linhas das demonstrações e rodam por ano (process_year);
+# sign/zscore usam o dataset final, todos os anos juntos.
+VALIDATION_ROOT = "outputs/validation"
+VIOLATIONS = f"{VALIDATION_ROOT}/violations.parquet"
+
+# `value` é o valor checado e `expected` o de referência (outra conta, soma dos
+# filhos, média do histórico); `score` é o tamanho da violação: diferença relativa
+# (identity/children) ou z-score.
+VIOLATION_COLUMNS = ["rule", "severity", "DENOM_CIA", "year", "DT_REFER", "subject", "value", "expected", "score"]
+TEXT_COLUMNS = ["rule", "severity", "DENOM_CIA", "DT_REFER", "subject"]
+
+STATEMENT_KINDS = ("identity", "children")
+
+# |z| acima disso é outlier; o z só é calculado com pelo menos MIN_HISTORY outros períodos
+Z_THRESHOLD = 4.0
+MIN_HISTORY = 4
+
+
+def identity(left, right, label, tolerance=CHECK_TOLERANCE, severity="error"):
+    """`left`/`right` = (demo, CD_CONTA)."""
+    return {"kind": "identity", "left": left, "right": right, "label": label, "tolerance": tolerance, "severity": severity}
+
+
+def children(demo, label, tolerance=CHECK_TOLERANCE, severity="warning"):
+    return {"kind": "children", "demo": demo, "label": label, "tolerance": tolerance, "severity": severity}
+
+
+def sign(metric, label, severity="error"):
+    """A métrica deve ser positiva."""
+    return {"kind": "sign", "metric": metric, "label": label, "severity": severity}
+
+
+def zscore(metric, label, threshold=Z_THRESHOLD, min_history=MIN_HISTORY, severity="warning"):
+    return {
+        "kind": "zscore", "metric": metric, "label": label, "threshold": threshold,
+        "min_history": min_history, "severity": severity,
+    }
+
+
+RULES = {
+    "balance_identity": identity(("BPA", "1"), ("BPP", "2"), "Ativo Total (BPA) = Passivo Total (BPP)"),
+    "BPA_children": children("BPA", "BPA: conta = soma das subcontas"),
+    "BPP_children": children("BPP", "BPP: conta = soma das subcontas"),
+    "total_assets_positive": sign("total_assets", "Ativo Total > 0"),
+    "equity_positive": sign("equity", "Patrimônio Líquido > 0", severity="warning"),
+    "ROE_outlier": zscore("ROE", "ROE fora do histórico da companhia"),
+    "ROA_outlier": zscore("ROA", "ROA fora do histórico da companhia"),
+    "total_assets_YoY_outlier": zscore("total_assets_YoY", "Crescimento do Ativo fora do histórico"),
+    "equity_YoY_outlier": zscore("equity_YoY", "Crescimento do PL fora do histórico"),
+}
+
+
+def empty_violations() -> pd.DataFrame:
+    return pd.DataFrame(columns=VIOLATION_COLUMNS).astype({
+        "year": "int64", "value": float, "expected": float, "score": float,
+    })
+
+
+def _violations(name, rule, rows, subject, value, expected, score) -> pd.DataFrame:
+    # `rows` tem DENOM_CIA/year/DT_REFER das linhas que violaram a regra
+    return pd.DataFrame({
+        "rule": name,
+        "severity": rule["severity"],
+        "DENOM_CIA": rows["DENOM_CIA"].astype(str).to_numpy(),
+        "year": rows["year"].to_numpy(dtype="int64"),
+        "DT_REFER": rows["DT_REFER"].astype(str).to_numpy(),
+        "subject": subject,
+        "value": np.asarray(value, dtype=float),
+        "expected": np.asarray(expected, dtype=float),
+        "score": np.asarray(score, dtype=float),
+    })
+
+
+def _relative(diff, expected):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return diff / np.abs(expected)
+
+
+def _account_values(statements, demo, code) -> pd.Series:
+    """VL_CONTA de `code` por (DENOM_CIA, DT_REFER); a primeira linha, como na extração."""
+    df = statements.get(demo)
+    if df is None:
+        # mesmo formato de uma demonstração sem linhas (o cruzamento sai vazio)
+        df = pd.DataFrame(columns=["DENOM_CIA", "DT_REFER", "CD_CONTA", "VL_CONTA"])
+    rows = df.loc[df["CD_CONTA"] == code, ["DENOM_CIA", "DT_REFER", "VL_CONTA"]]
+    rows = rows.astype({"DENOM_CIA": str, "DT_REFER": str}).drop_duplicates(["DENOM_CIA", "DT_REFER"])
+    return rows.set_index(["DENOM_CIA", "DT_REFER"])["VL_CONTA"]
+
+
+def check_statements(statements: dict, year: int, rules=RULES) -> pd.DataFrame:
+    """
+    Regras sobre as linhas das demonstrações de um ano (`statements` = {demo: df}),
+    só o exercício corrente (ÚLTIMO).
+    """
+    current = {
+        demo: df[df["ORDEM_EXERC"] == "ÚLTIMO"] if "ORDEM_EXERC" in df.columns else df
+        for demo, df in statements.items()
+    }
+    frames = [empty_violations()]
+    for name, rule in rules.items():
+        if rule["kind"] == "identity":
+            left = _account_values(current, *rule["left"]).rename("value")
+            right = _account_values(current, *rule["right"]).rename("expected")
+            both = pd.concat([left, right], axis=1, join="inner").reset_index()
+            diff = both["value"] - both["expected"]
+            bad = both[diff.abs() > rule["tolerance"]].assign(year=year)
+            subject = f"{rule['left'][0]} {rule['left'][1]} x {rule['right'][0]} {rule['right'][1]}"
+            frames.append(_violations(
+                name, rule, bad, subject, bad["value"], bad["expected"], _relative(diff[bad.index], bad["expected"])
+            ))
+        elif rule["kind"] == "children":
+            df = current.get(rule["demo"])
+            if df is None or df.empty:
+                continue
+            bad = check_children(df, rule["tolerance"]).assign(year=year)
+            frames.append(_violations(
+                name, rule, bad, bad["CD_CONTA"].astype(str), bad["VL_CONTA"], bad["children_sum"],
+                _relative(bad["diff"], bad["children_sum"]),
+            ))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _leave_one_out_z(df: pd.DataFrame, metric: str, keys):
+    """
+    z-score de cada valor contra os demais períodos do mesmo grupo (média e desvio
+    sem o próprio valor, senão um outlier infla o desvio que o mede). Retorna
+    (z, média dos demais, nº de outros períodos).
+    """
+    x = df[metric].astype(float)
+    sums = (
+        pd.DataFrame({"n": x.notna().astype(int), "s": x, "ss": x ** 2})
+        .groupby([df[k] for k in keys], observed=True, sort=False)
+        .transform("sum")
+    )
+    n_other = sums["n"] - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (sums["s"] - x) / n_other
+        var = (sums["ss"] - x ** 2 - n_other * mean ** 2) / (n_other - 1)
+        z = (x - mean) / np.sqrt(var.clip(lower=0))
+    return z, mean, n_other
+
+
+def check_dataset(pivot: pd.DataFrame, rules=RULES) -> pd.DataFrame:
+    """
+    Regras sobre o dataset final (banco/período com as métricas em colunas), todas
+    as companhias e anos de uma vez. No trimestral o histórico do z-score é o mesmo
+    trimestre nos outros anos (a DRE é acumulada no ano).
+    """
+    keys = ["DENOM_CIA", "quarter"] if "quarter" in pivot.columns else ["DENOM_CIA"]
+    frames = [empty_violations()]
+    for name, rule in rules.items():
+        metric = rule.get("metric")
+        if rule["kind"] in STATEMENT_KINDS or metric not in pivot.columns:
+            continue
+        if rule["kind"] == "sign":
+            bad = pivot[pivot[metric] <= 0]
+            frames.append(_violations(name, rule, bad, metric, bad[metric], np.nan, np.nan))
+        elif rule["kind"] == "zscore":
+            z, mean, n_other = _leave_one_out_z(pivot, metric, keys)
+            hit = ((n_other >= rule["min_history"]) & (z.abs() > rule["threshold"])).to_numpy()
+            bad = pivot[hit]
+            frames.append(_violations(name, rule, bad, metric, bad[metric], mean[hit], z[hit]))
+        else:
+            raise ValueError(f"Tipo de regra desconhecido: {rule['kind']}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_violations(violations: pd.DataFrame, path: str = VIOLATIONS):
+    """Grava as violações em Parquet (texto com dictionary encoding), via arquivo temporário."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = violations.reindex(columns=VIOLATION_COLUMNS).astype({col: "category" for col in TEXT_COLUMNS})
+    tmp = path + ".tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def read_violations(path: str = VIOLATIONS) -> pd.DataFrame:
+    return pd.read_parquet(path)
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Testes com os dados sintéticos da CVM (src/synthetic_cvm.py), sem rede:
+#
+#   python -m pytest -q tests
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT, "src")
+sys.path.insert(0, SRC_DIR)
+
+import synthetic_cvm  # noqa: E402
+
+# Escala pequena: os 5 anos do pipeline (YEARS) em poucos segundos
+COMPANIES = 12
+ACCOUNTS = 30
+
+
+def run_script(name, *args, cwd):
+    """Roda um script de src/ (ex.: 02_extract_metrics.py) como no terminal, com `cwd` como raiz."""
+    return subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, name), *args],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Diretório temporário como cwd (os módulos usam caminhos relativos: data_raw/, outputs/)."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(scope="session")
+def pipeline_dir(tmp_path_factory):
+    """ZIPs sintéticos + uma execução completa do pipeline (universo 'all'), compartilhados na sessão."""
+    root = tmp_path_factory.mktemp("pipeline")
+    synthetic_cvm.generate(str(root / "data_raw"), COMPANIES, synthetic_cvm.DEFAULT_YEARS, ACCOUNTS, seed=0)
+    run_script("02_extract_metrics.py", "--universe", "all", cwd=root)
+    return root
+
+
+@pytest.fixture
+def in_pipeline_dir(pipeline_dir, monkeypatch):
+    monkeypatch.chdir(pipeline_dir)
+    return pipeline_dir
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from account_tree import AccountTree, check_children, subtree_metrics
+from exports import read_arrow
+
+ROWS = [
+    # companhia, conta, rótulo, valor
+    ("A", "1", "Ativo Total", 100.0),
+    ("A", "1.01", "Ativo Circulante", 60.0),
+    ("A", "1.01.01", "Caixa", 20.0),
+    ("A", "1.01.02", "Aplicações", 40.0),
+    ("A", "1.02", "Ativo Não Circulante", 40.0),
+    ("A", "1.02.01", "Imobilizado", 35.0),  # pai 1.02 = 40: soma dos filhos não fecha
+    ("A", "1.10", "Outros", 0.0),  # "1.10" vem depois de "1.02" (não de "1.01")
+    ("B", "1", "Ativo Total", 50.0),
+    ("B", "1.01", "Caixa e Equivalentes de Caixa", 10.0),
+    ("B", "1.02", "Ativos Financeiros", 40.0),
+]
+
+
+def statement():
+    df = pd.DataFrame(ROWS, columns=["DENOM_CIA", "CD_CONTA", "DS_CONTA", "VL_CONTA"])
+    return df.assign(DT_REFER="2024-12-31")
+
+
+def test_subtree_and_children_use_hierarchical_order():
+    tree = AccountTree(statement())
+    sub = tree.subtree("1.01")
+    assert sub.loc[sub["DENOM_CIA"] == "A", "CD_CONTA"].tolist() == ["1.01", "1.01.01", "1.01.02"]
+    children = tree.children("1")
+    assert children.loc[children["DENOM_CIA"] == "A", "CD_CONTA"].tolist() == ["1.01", "1.02", "1.10"]
+    assert tree.children("1.01.01").empty
+
+
+def test_rollup_and_node_value():
+    tree = AccountTree(statement())
+    rollup = tree.rollup("1.01").set_index("DENOM_CIA")["VL_CONTA"]
+    assert rollup["A"] == 60.0 and rollup["B"] == 10.0
+    value = tree.node_value("1.02.01").set_index("DENOM_CIA")["VL_CONTA"]
+    assert value["A"] == 35.0 and np.isnan(value["B"])
+
+
+def test_check_children_tree_matches_flat():
+    df = statement()
+    tree = AccountTree(df).check_children()
+    flat = check_children(df)
+    assert tree["CD_CONTA"].tolist() == ["1.02"]
+    assert tree["children_sum"].tolist() == [35.0]
+    # mesmas violações; a árvore só muda a ordem (pré-ordem em vez da ordem do arquivo)
+    pd.testing.assert_frame_equal(tree, flat.astype({"DENOM_CIA": str}), check_dtype=False)
+
+
+def test_subtree_metrics_respect_layout_labels():
+    definitions = {
+        "current_assets": ("BPA", "1.01", ["Ativo Circulante"]),
+        "cash_and_equivalents": ("BPA", "1.01", ["Caixa e Equivalentes de Caixa"]),
+        "assets_rollup": ("BPA", "1"),
+    }
+    out = subtree_metrics({"BPA": statement()}, definitions).set_index(["metric", "DENOM_CIA"])["VL_CONTA"]
+    assert out[("current_assets", "A")] == 60.0
+    assert ("current_assets", "B") not in out.index
+    assert out[("cash_and_equivalents", "B")] == 10.0
+    assert ("cash_and_equivalents", "A") not in out.index
+    assert out[("assets_rollup", "A")] == 100.0
+
+
+def test_pipeline_subtree_metrics(in_pipeline_dir):
+    df = read_arrow("outputs/final_dataset.arrow")
+    assert {"current_assets", "noncurrent_assets", "current_assets_prior"} <= set(df.columns)
+    # sintéticos: pais = soma dos filhos, então 1.01 + 1.02 = Ativo Total
+    np.testing.assert_allclose(df["current_assets"] + df["noncurrent_assets"], df["total_assets"], rtol=1e-9)
@@ -0,0 +1,53 @@
+import logging
+import os
+
+from streamlit.testing.v1 import AppTest
+
+from .conftest import SRC_DIR
+
+APP = os.path.join(SRC_DIR, "app.py")
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def run_app(page=None):
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    if page is not None:
+        at.sidebar.selectbox[0].select(page)
+        at.run()
+    return at
+
+
+def test_benchmark_page(in_pipeline_dir):
+    # Avisos de API depreciada do Streamlit vão para o logger, a cada render
+    deprecations = Collect()
+    logger = logging.getLogger("streamlit.deprecation_util")
+    logger.addHandler(deprecations)
+    try:
+        at = run_app()
+    finally:
+        logger.removeHandler(deprecations)
+    assert not at.exception
+    assert deprecations.messages == []
+    assert at.get("plotly_chart")
+    # tabela filtrada: R$ continua numérico (ordena por valor), só a exibição é formatada
+    table = at.dataframe[0].value
+    assert table["total_assets"].dtype.kind == "f"
+    for mode in ["Companhias", "Mediana e percentis", "Top N + outros"]:
+        at.radio[0].set_value(mode)
+        at.run()
+        assert not at.exception, mode
+
+
+def test_data_quality_page(in_pipeline_dir):
+    at = run_app("Data Quality")
+    assert not at.exception
+    assert at.dataframe
@@ -0,0 +1,36 @@
+import importlib.util
+import os
+
+from .conftest import ROOT
+
+spec = importlib.util.spec_from_file_location("run_benchmarks", os.path.join(ROOT, "benchmarks", "run_benchmarks.py"))
+run_benchmarks = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(run_benchmarks)
+
+
+def stage(seconds, rss):
+    return {"seconds": seconds, "min_seconds": seconds, "peak_mb": 1.0, "rss_peak_mb": rss}
+
+
+def test_compare_flags_memory_regressions():
+    baseline = {"stages": {"load": stage(1.0, 100.0), "small": stage(1.0, 10.0), "old": {"seconds": 1.0}}}
+    results = {
+        "load": stage(1.0, 200.0),  # mesmo tempo, o dobro de memória
+        "small": stage(1.0, 20.0),  # dobra, mas abaixo do piso de ruído
+        "old": stage(1.0, 500.0),  # baseline antiga sem RSS: só tempo
+    }
+    lines, regressions = run_benchmarks.compare(results, baseline)
+    assert regressions == ["load"]
+    assert "REGRESSÃO (memória)" in lines[0]
+
+
+def test_measure_sees_arrow_allocations():
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = pa.array(np.arange(5_000_000))
+    stats, _ = run_benchmarks.measure(lambda: pc.add(values, 1), 2)
+    # ~40 MB no pool do Arrow, invisíveis ao tracemalloc
+    if stats["rss_peak_mb"] is not None:
+        assert stats["rss_peak_mb"] > 30
@@ -0,0 +1,132 @@
+import importlib
+import os
+
+import pytest
+import requests
+
+import cvm_download
+from cvm_reader import zip_path, zip_url
+
+extract = importlib.import_module("02_extract_metrics")
+
+URL = "https://example.test/dfp_cia_aberta_2024.zip"
+CONTENT = b"0123456789" * 100
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}")
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self._body), chunk_size):
+            yield self._body[i:i + chunk_size]
+
+
+class FakeServer:
+    """Session falsa que responde como a CVM: ETag, GET condicional e Range/If-Range."""
+
+    def __init__(self, content=CONTENT, etag='"v1"'):
+        self.content = content
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        headers = headers or {}
+        self.requests.append(headers)
+        validators = {"ETag": self.etag}
+        if headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304, headers=validators)
+        if "Range" in headers and headers.get("If-Range") == self.etag:
+            offset = int(headers["Range"].split("=")[1].rstrip("-"))
+            return FakeResponse(206, self.content[offset:], validators)
+        return FakeResponse(200, self.content, validators)
+
+
+@pytest.fixture
+def manifest(workdir):
+    return cvm_download.DownloadManifest("data_raw/download_manifest.json")
+
+
+def test_download_then_conditional_get(manifest):
+    server = FakeServer()
+    path = "data_raw/file.zip"
+    assert cvm_download.download_file(server, URL, path, manifest) == "downloaded"
+    assert open(path, "rb").read() == CONTENT
+    assert manifest.get(os.path.normpath(path))["complete"]
+
+    assert cvm_download.download_file(server, URL, path, manifest) == "unchanged"
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+
+    # Republicado no servidor: nova ETag => baixa de novo
+    server.content, server.etag = b"new" * 10, '"v2"'
+    assert cvm_download.download_file(server, URL, path, manifest) == "downloaded"
+    assert open(path, "rb").read() == b"new" * 10
+
+
+def test_resume_partial_download(manifest):
+    server = FakeServer()
+    path = "data_raw/file.zip"
+    os.makedirs("data_raw")
+    with open(path + ".part", "wb") as f:
+        f.write(CONTENT[:300])
+    manifest.update(os.path.normpath(path), url=URL, complete=False, etag='"v1"', last_modified=None)
+
+    assert cvm_download.download_file(server, URL, path, manifest) == "resumed"
+    assert server.requests[-1]["Range"] == "bytes=300-"
+    assert open(path, "rb").read() == CONTENT
+    assert not os.path.exists(path + ".part")
+
+
+def test_resume_restarts_when_file_changed(manifest):
+    server = FakeServer(etag='"v2"')
+    path = "data_raw/file.zip"
+    os.makedirs("data_raw")
+    with open(path + ".part", "wb") as f:
+        f.write(b"stale")
+    manifest.update(os.path.normpath(path), url=URL, complete=False, etag='"v1"', last_modified=None)
+
+    assert cvm_download.download_file(server, URL, path, manifest) == "downloaded"
+    assert open(path, "rb").read() == CONTENT
+
+
+def test_ensure_raw_data_refresh_revalidates_existing(workdir, monkeypatch):
+    calls = []
+
+    def fake_download_many(targets, jobs):
+        calls.append(list(targets))
+        return {path: "unchanged" for _, path in targets}
+
+    monkeypatch.setattr(extract, "download_many", fake_download_many)
+    os.makedirs("data_raw")
+    for year in (2023, 2024):
+        open(zip_path(year), "wb").close()
+
+    extract.ensure_raw_data([2023, 2024])
+    assert calls == []
+
+    extract.ensure_raw_data([2023, 2024], refresh=True)
+    assert calls == [[(zip_url(2023), zip_path(2023)), (zip_url(2024), zip_path(2024))]]
+
+
+def test_ensure_raw_data_refresh_offline_keeps_local_copy(workdir, monkeypatch):
+    monkeypatch.setattr(
+        extract, "download_many", lambda targets, jobs: {path: "error: offline" for _, path in targets}
+    )
+    os.makedirs("data_raw")
+    open(zip_path(2024), "wb").close()
+    extract.ensure_raw_data([2024], refresh=True)
+
+    with pytest.raises(RuntimeError):
+        extract.ensure_raw_data([2023], refresh=True)
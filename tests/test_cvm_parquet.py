@@ -0,0 +1,51 @@
+import os
+import zipfile
+
+import cvm_parquet
+import synthetic_cvm
+from cvm_reader import CSV_ENCODING, CSV_SEP, statement_filename, zip_path
+
+YEAR = 2023
+BPA = statement_filename(YEAR, "BPA")
+
+
+def write_synthetic(companies=3, seed=0):
+    synthetic_cvm.generate("data_raw", companies, [YEAR], 10, seed)
+
+
+def test_ingest_and_read(workdir):
+    write_synthetic()
+    path = cvm_parquet.ingest_statement(YEAR, BPA)
+    assert os.path.exists(path)
+    assert cvm_parquet.is_fresh(YEAR, BPA)
+    df = cvm_parquet.read_cached(YEAR, BPA, ordem_exerc="ÚLTIMO")
+    assert len(df) > 0
+    assert set(df["ORDEM_EXERC"].astype(str)) == {"ÚLTIMO"}
+
+
+def test_ingest_header_only_statement(workdir):
+    os.makedirs("data_raw")
+    with zipfile.ZipFile(zip_path(YEAR), "w") as z:
+        z.writestr(BPA, (CSV_SEP.join(synthetic_cvm.HEADER) + "\n").encode(CSV_ENCODING))
+
+    cvm_parquet.ingest_statement(YEAR, BPA)
+    assert cvm_parquet.is_fresh(YEAR, BPA)
+    df = cvm_parquet.read_cached(YEAR, BPA, ordem_exerc="ÚLTIMO")
+    assert df.empty
+    assert list(df.columns) == synthetic_cvm.HEADER
+
+
+def test_restored_zip_with_older_mtime_invalidates(workdir):
+    write_synthetic(seed=0)
+    cvm_parquet.ingest_statement(YEAR, BPA)
+    before = cvm_parquet.read_cached(YEAR, BPA)
+
+    # Outro conteúdo, mas com mtime anterior ao do Parquet (como cp -p / rsync -t)
+    write_synthetic(seed=1)
+    os.utime(zip_path(YEAR), (0, 0))
+    assert not cvm_parquet.is_fresh(YEAR, BPA)
+
+    cvm_parquet.ingest_statement(YEAR, BPA)
+    assert cvm_parquet.is_fresh(YEAR, BPA)
+    after = cvm_parquet.read_cached(YEAR, BPA)
+    assert not after["VL_CONTA"].equals(before["VL_CONTA"])
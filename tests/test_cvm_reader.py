@@ -0,0 +1,60 @@
+import os
+
+import synthetic_cvm
+from cvm_reader import (
+    extract_members,
+    extracted_dir,
+    extracted_path,
+    read_statement,
+    statement_filename,
+    statement_files,
+    statement_source,
+    zip_path,
+)
+
+YEAR = 2023
+BPA = statement_filename(YEAR, "BPA")
+
+
+def write_zip(seed):
+    synthetic_cvm.generate("data_raw", 3, [YEAR], 10, seed)
+
+
+def test_reads_from_zip_without_extraction(workdir):
+    write_zip(0)
+    assert statement_source(YEAR, BPA) == zip_path(YEAR)
+    df = read_statement(YEAR, BPA, ordem_exerc="ÚLTIMO")
+    assert len(df) > 0
+
+
+def test_newer_zip_wins_over_extracted_csv(workdir):
+    write_zip(0)
+    extract_members(zip_path(YEAR), [BPA], extracted_dir(YEAR))
+    assert statement_source(YEAR, BPA) == extracted_path(YEAR, BPA)
+    extracted = read_statement(YEAR, BPA)
+
+    # ZIP baixado de novo depois da extração (conteúdo diferente, mtime mais novo)
+    write_zip(1)
+    csv_time = os.path.getmtime(zip_path(YEAR)) - 60
+    os.utime(extracted_path(YEAR, BPA), (csv_time, csv_time))
+    assert statement_source(YEAR, BPA) == zip_path(YEAR)
+    assert not read_statement(YEAR, BPA)["VL_CONTA"].equals(extracted["VL_CONTA"])
+
+    # Extraído de novo: o CSV volta a valer
+    extract_members(zip_path(YEAR), [BPA], extracted_dir(YEAR))
+    assert statement_source(YEAR, BPA) == extracted_path(YEAR, BPA)
+
+
+def test_download_extract_writes_only_used_statements(workdir):
+    import importlib
+    import zipfile
+
+    download = importlib.import_module("01_download_cvm_dfp")
+    write_zip(0)
+    # membros que o pipeline não lê (DFC, individuais) também vêm no ZIP da CVM
+    with zipfile.ZipFile(zip_path(YEAR), "a") as z:
+        z.writestr(statement_filename(YEAR, "DFC_MI"), "x")
+        z.writestr(f"dfp_cia_aberta_BPA_ind_{YEAR}.csv", "x")
+
+    download.extract_zip(zip_path(YEAR), YEAR, "dfp")
+    assert sorted(os.listdir(extracted_dir(YEAR))) == sorted(statement_files(YEAR))
@@ -0,0 +1,36 @@
+import pandas as pd
+
+import dashboard_data
+
+
+def test_ranking_table_orders_by_latest_period():
+    ranks = pd.DataFrame({
+        "DENOM_CIA": ["A", "B", "A", "B"],
+        "year": [2023, 2023, 2024, 2024],
+        "ROE": pd.array([1, 2, 2, 1], dtype="Int64"),
+    })
+    table = dashboard_data.ranking_table(ranks, "ROE")
+    assert list(table.columns) == ["2023", "2024"]
+    assert list(table.index) == ["B", "A"]
+
+
+def test_ranking_table_duplicate_company_period():
+    # Mesma DENOM_CIA duas vezes no período (ex.: dois CNPJ): uma linha, a melhor posição
+    ranks = pd.DataFrame({
+        "DENOM_CIA": ["A", "A", "B", "A", "B"],
+        "year": [2023, 2023, 2023, 2024, 2024],
+        "ROE": pd.array([3, 1, 2, pd.NA, 1], dtype="Int64"),
+    })
+    table = dashboard_data.ranking_table(ranks, "ROE")
+    assert table.loc["A", "2023"] == 1
+    assert pd.isna(table.loc["A", "2024"])
+    assert list(table.index) == ["B", "A"]
+
+
+def test_rankings_from_pipeline_outputs(in_pipeline_dir):
+    df = dashboard_data.load_final_dataset()
+    companies = sorted(df["DENOM_CIA"].astype(str).unique())
+    ranks = dashboard_data.load_rankings(companies, sorted(df["year"].unique()))
+    table = dashboard_data.ranking_table(ranks, "ROE")
+    assert set(table.index) == set(companies)
+    assert len(table.columns) == df["year"].nunique()
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from derived_metrics import DERIVED_METRICS, evaluate, formula, growth, ratio, resolve_order, rolling_mean
+
+
+def annual(**columns):
+    """Pivot anual de uma companhia "A" em 2021-2024 (ou menos, pelo tamanho das colunas)."""
+    n = len(next(iter(columns.values())))
+    return pd.DataFrame({"DENOM_CIA": "A", "year": range(2021, 2021 + n), **columns})
+
+
+def test_resolve_order_puts_inputs_first():
+    order = resolve_order(available={"total_assets", "equity", "net_income", "operating_result_proxy"})
+    assert order.index("avg_equity") < order.index("ROAE")
+    # escopo trimestral fica de fora no anual
+    assert "total_assets_QoQ" not in order
+    assert "total_assets_QoQ" in resolve_order(available={"total_assets", "equity"}, quarterly=True)
+
+
+def test_resolve_order_skips_metrics_without_inputs():
+    order = resolve_order(available={"total_assets"})
+    assert "total_assets_YoY" in order
+    assert "ROE" not in order and "ROAE" not in order
+
+
+def test_resolve_order_rejects_cycles_and_unknown_inputs():
+    cyclic = {
+        "a": formula(["b"], np.negative, "a", "money"),
+        "b": formula(["a"], np.negative, "b", "money"),
+    }
+    with pytest.raises(ValueError, match="circular"):
+        resolve_order(cyclic)
+    with pytest.raises(ValueError, match="desconhecida"):
+        resolve_order({"x": ratio("nope", "equity", "x")})
+
+
+def test_yoy_uses_previous_row_without_prior():
+    out = evaluate(annual(total_assets=[100.0, 110.0, 121.0]), {"g": growth("total_assets")})
+    np.testing.assert_allclose(out["g"], [np.nan, 0.1, 0.1])
+
+
+def test_yoy_prefers_restated_prior():
+    df = annual(total_assets=[100.0, 110.0, 132.0], total_assets_prior=[80.0, np.nan, 120.0])
+    out = evaluate(df, {"g": growth("total_assets")})
+    # 2021 tem YoY pelo comparativo; 2022 cai na linha anterior; 2023 usa o reapresentado (120)
+    np.testing.assert_allclose(out["g"], [0.25, 0.1, 0.1])
+
+
+def test_windows_need_consecutive_years():
+    df = pd.DataFrame({"DENOM_CIA": ["A", "A", "B", "B"], "year": [2021, 2023, 2022, 2023], "equity": [10.0, 20.0, 5.0, 15.0]})
+    out = evaluate(df, {"avg": rolling_mean("equity", 2, "avg")})
+    # A pulou 2022; B é outra companhia e não herda os valores de A
+    np.testing.assert_allclose(out["avg"], [np.nan, np.nan, np.nan, 10.0])
+
+
+def test_restatement_is_prior_minus_original():
+    df = annual(equity=[100.0, 110.0], equity_prior=[np.nan, 105.0])
+    out = evaluate(df, {"equity_restatement": DERIVED_METRICS["equity_restatement"]})
+    np.testing.assert_allclose(out["equity_restatement"], [np.nan, 5.0])
+
+
+def test_quarterly_yoy_compares_same_quarter():
+    df = pd.DataFrame({
+        "DENOM_CIA": "A",
+        "year": [2023, 2023, 2024, 2024],
+        "quarter": [1, 2, 1, 2],
+        "total_assets": [100.0, 200.0, 110.0, 220.0],
+    })
+    out = evaluate(df, {"yoy": growth("total_assets"), "qoq": growth("total_assets", scope="quarter")})
+    np.testing.assert_allclose(out["yoy"], [np.nan, np.nan, 0.1, 0.1])
+    # 2024T1 não tem QoQ: o trimestre anterior (2023T4) não está no pivot
+    np.testing.assert_allclose(out["qoq"], [np.nan, 1.0, np.nan, 1.0])
+
+
+def test_pipeline_dataset_has_prior_based_yoy(in_pipeline_dir):
+    from exports import read_arrow
+
+    df = read_arrow("outputs/final_dataset.arrow")
+    first = df[df["year"] == df["year"].min()]
+    # o primeiro ano também tem YoY, vindo do comparativo do próprio arquivo
+    expected = first["total_assets"] / first["total_assets_prior"] - 1
+    np.testing.assert_allclose(first["total_assets_YoY"], expected)
@@ -0,0 +1,48 @@
+import pandas as pd
+
+from diagnostics import read_unmapped_counts, read_unmapped_rows, unmapped_counts_frame
+from discovery import CANDIDATE_COLUMNS, discover, label_stats
+
+from .conftest import run_script
+
+
+def test_discover_ranks_unmapped_labels(in_pipeline_dir):
+    top = discover(read_unmapped_counts(), demo="DRE")
+    assert list(top.columns) == CANDIDATE_COLUMNS
+    assert len(top) > 0
+    assert top["score"].is_monotonic_decreasing
+
+
+def test_discover_without_candidates(in_pipeline_dir):
+    top = discover(read_unmapped_counts(), metric="net_income", patterns=["zzzz"])
+    assert top.empty
+    assert list(top.columns) == CANDIDATE_COLUMNS
+
+
+def test_read_unmapped_rows_empty_labels(in_pipeline_dir):
+    lines = read_unmapped_rows(demo="DRE", ds_conta=[])
+    assert lines.empty
+    assert "DS_CONTA" in lines.columns
+
+
+def test_dre_discovery_script_without_candidates(in_pipeline_dir):
+    run_script("03_dre_discovery.py", "--pattern", "zzzz", cwd=in_pipeline_dir)
+    assert (in_pipeline_dir / "outputs" / "operating_result_proxy_candidates_top.csv").exists()
+    assert (in_pipeline_dir / "outputs" / "operating_result_proxy_candidates_lines.csv").exists()
+
+
+def test_company_coverage_counts_distinct_companies_across_variants_and_years():
+    def partition(year, rows):
+        df = pd.DataFrame(rows, columns=["DENOM_CIA", "DS_CONTA", "CD_CONTA"])
+        return unmapped_counts_frame(df).assign(year=year, demo="DRE")
+
+    counts = pd.concat([
+        # mesma conta com e sem acento, publicada por companhias diferentes
+        partition(2023, [("A", "Receita de Intermediação", "3.01"), ("B", "Receita de Intermediacao", "3.01")]),
+        partition(2024, [("C", "Receita de Intermediação", "3.01"), ("A", "Receita de Intermediação", "3.01")]),
+        partition(2024, [("A", "Outras Receitas", "3.09")]),
+    ], ignore_index=True)
+    stats = label_stats(counts, "DRE").set_index("label")
+    assert stats.loc["receita de intermediacao", "companies"] == 3
+    assert stats.loc["receita de intermediacao", "variants"] == 2
+    assert stats.loc["outras receitas", "company_coverage"] == 1 / 3
@@ -0,0 +1,29 @@
+import importlib
+
+import pandas as pd
+
+extract = importlib.import_module("02_extract_metrics")
+
+
+def dre(rows):
+    df = pd.DataFrame(rows, columns=["DENOM_CIA", "DT_REFER", "DS_CONTA", "VL_CONTA"])
+    return df.assign(CD_CONTA="3.11", ORDEM_EXERC="ÚLTIMO")
+
+
+def test_mapping_usage_keeps_label_changes_between_quarters():
+    statements = {"DRE": dre([
+        ("A", "2024-03-31", "Lucro ou Prejuízo Líquido Consolidado do Período", 1.0),
+        ("A", "2024-06-30", "Lucro/Prejuízo do Período", 2.0),
+    ])}
+    _, usage = extract.extract_metrics(statements)
+    report = extract.mapping_usage_report(usage, ["A", "B"], 2024)
+
+    net_income = report[report["metric"] == "net_income"].set_index(["DENOM_CIA", "DT_REFER"])["ds_conta_used"]
+    assert net_income[("A", "2024-03-31")] == "Lucro ou Prejuízo Líquido Consolidado do Período"
+    assert net_income[("A", "2024-06-30")] == "Lucro/Prejuízo do Período"
+
+    # lacunas: métrica sem candidato na data e companhia sem nenhuma métrica
+    equity = report[(report["metric"] == "equity") & (report["DENOM_CIA"] == "A")]
+    assert len(equity) == 2 and equity["ds_conta_used"].isna().all()
+    assert report.loc[report["DENOM_CIA"] == "B", "DT_REFER"].isna().all()
+    assert len(report[report["DENOM_CIA"] == "B"]) == len(extract.METRIC_DEMO)
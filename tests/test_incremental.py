@@ -0,0 +1,58 @@
+import importlib
+
+import pandas as pd
+import pytest
+
+import synthetic_cvm
+from exports import read_arrow
+
+from .conftest import ACCOUNTS, COMPANIES, run_script
+
+extract = importlib.import_module("02_extract_metrics")
+
+
+def pipeline(root, *args):
+    return run_script("02_extract_metrics.py", "--universe", "all", *args, cwd=root).stdout
+
+
+@pytest.fixture
+def fresh_run(tmp_path):
+    synthetic_cvm.generate(str(tmp_path / "data_raw"), COMPANIES, synthetic_cvm.DEFAULT_YEARS, ACCOUNTS, seed=0)
+    pipeline(tmp_path)
+    return tmp_path
+
+
+def test_unchanged_inputs_skip_everything(fresh_run):
+    assert "Nenhuma entrada mudou" in pipeline(fresh_run)
+
+
+def test_only_changed_year_is_reprocessed(fresh_run):
+    before = read_arrow(str(fresh_run / "outputs" / "final_dataset.arrow"))
+
+    # Só o ZIP de 2023 muda (outro seed => outros valores)
+    synthetic_cvm.write_zip(2023, str(fresh_run / "data_raw"), synthetic_cvm.company_names(COMPANIES), ACCOUNTS, seed=7)
+    out = pipeline(fresh_run)
+    assert "Anos a reprocessar: [2023]" in out
+
+    after = read_arrow(str(fresh_run / "outputs" / "final_dataset.arrow"))
+    changed = after.set_index(["DENOM_CIA", "year"])["total_assets"] != before.set_index(["DENOM_CIA", "year"])["total_assets"]
+    assert set(changed[changed].index.get_level_values("year")) == {2023}
+
+
+def test_full_flag_reprocesses_all_years(fresh_run):
+    out = pipeline(fresh_run, "--full")
+    assert f"Anos a reprocessar: {synthetic_cvm.DEFAULT_YEARS}" in out
+
+
+def test_changed_years(workdir):
+    inputs = {2023: "a", 2024: "b"}
+    manifest = {"config_hash": "cfg", "years": {"2023": "a", "2024": "old"}}
+    # sem o cache do ano em disco, o ano é reprocessado mesmo com o hash igual
+    assert extract.changed_years(manifest, "cfg", inputs) == [2023, 2024]
+
+    (workdir / extract.YEAR_CACHE_DIR).mkdir(parents=True)
+    for year in inputs:
+        pd.to_pickle(None, extract.year_cache_path(year))
+    assert extract.changed_years(manifest, "cfg", inputs) == [2024]
+    # configuração diferente: todos os anos
+    assert extract.changed_years(manifest, "other", inputs) == [2023, 2024]
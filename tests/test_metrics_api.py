@@ -0,0 +1,69 @@
+import io
+import json
+import shutil
+
+import pyarrow as pa
+import pytest
+from tornado.testing import AsyncHTTPTestCase
+
+import metrics_api
+from exports import read_arrow, write_arrow
+
+
+class MetricsApiTest(AsyncHTTPTestCase):
+    @pytest.fixture(autouse=True)
+    def dataset(self, pipeline_dir, tmp_path):
+        # cópia do dataset do pipeline: os testes de recarga regravam o arquivo
+        self.path = str(tmp_path / "final_dataset.arrow")
+        shutil.copy(pipeline_dir / "outputs" / "final_dataset.arrow", self.path)
+
+    def get_app(self):
+        return metrics_api.make_app(self.path)
+
+    def get_json(self, url, **kwargs):
+        response = self.fetch(url, **kwargs)
+        assert response.code == 200, response.body
+        return response, json.loads(response.body)
+
+    def test_etag_and_not_modified(self):
+        response, body = self.get_json("/metrics")
+        etag = response.headers["ETag"]
+        assert any(m["metric"] == "ROE" for m in body["data"])
+
+        again = self.fetch("/metrics", headers={"If-None-Match": etag})
+        assert again.code == 304
+        # outra consulta, outra ETag
+        other, _ = self.get_json("/metrics?format=json")
+        assert other.headers["ETag"] != etag
+
+    def test_etag_changes_when_dataset_is_rewritten(self):
+        response, before = self.get_json("/data?year=2024")
+        etag = response.headers["ETag"]
+
+        df = read_arrow(self.path)
+        write_arrow(df[df["DENOM_CIA"] != df["DENOM_CIA"].iloc[0]], self.path)
+        self.io_loop.run_sync(self._app.holder.reload_if_changed)
+
+        after = self.fetch("/data?year=2024", headers={"If-None-Match": etag})
+        assert after.code == 200
+        assert after.headers["ETag"] != etag
+        after = json.loads(after.body)
+        assert after["version"] != before["version"]
+        assert after["rows"] == before["rows"] - 1
+
+    def test_rankings_and_arrow_format(self):
+        _, top = self.get_json("/rankings/ROE?year=2024&top=3")
+        assert [row["rank"] for row in top["data"]] == [1, 2, 3]
+        values = [row["value"] for row in top["data"]]
+        assert values == sorted(values, reverse=True)
+
+        response = self.fetch("/series/ROE?format=arrow")
+        assert response.code == 200
+        assert response.headers["Content-Type"] == metrics_api.ARROW_MIME
+        table = pa.ipc.open_stream(io.BytesIO(response.body)).read_all()
+        assert "value" in table.column_names
+
+    def test_unknown_metric_or_group_is_404(self):
+        assert self.fetch("/series/nope").code == 404
+        assert self.fetch("/data?group=nope").code == 404
+        assert self.fetch("/data?year=abc").code == 400
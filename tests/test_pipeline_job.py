@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+import pipeline_job
+
+
+@pytest.fixture
+def slow_pipeline(workdir, monkeypatch):
+    """Troca o pipeline por um script que só espera `seconds` (arg) e sai com o código dado."""
+    script = workdir / "fake_pipeline.py"
+    script.write_text("import sys, time\ntime.sleep(float(sys.argv[1]))\nsys.exit(int(sys.argv[2]))\n")
+    monkeypatch.setattr(pipeline_job, "PIPELINE_SCRIPT", str(script))
+    return workdir
+
+
+def wait_finished(timeout=10):
+    deadline = time.time() + timeout
+    # o status final é gravado um instante antes de o lock ser liberado
+    while pipeline_job.is_running() and time.time() < deadline:
+        time.sleep(0.05)
+    return pipeline_job.pipeline_status()
+
+
+def test_single_flight(slow_pipeline):
+    assert pipeline_job.start_pipeline(["1", "0"])
+    assert pipeline_job.is_running()
+    assert not pipeline_job.start_pipeline(["0", "0"])
+
+    status = wait_finished()
+    assert status["state"] == "ok"
+    assert not pipeline_job.is_running()
+    # lock liberado: a próxima execução pode começar
+    assert pipeline_job.start_pipeline(["0", "0"])
+    wait_finished()
+
+
+def test_concurrent_starts_run_once(slow_pipeline):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pipeline_job.start_pipeline(["1", "0"]))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    wait_finished()
+
+
+def test_failed_run_releases_lock(slow_pipeline):
+    assert pipeline_job.start_pipeline(["0", "3"])
+    status = wait_finished()
+    assert status["state"] == "failed"
+    assert status["returncode"] == 3
+    assert not pipeline_job.is_running()
+
+
+def test_last_run_args_repeat_dataset_config(pipeline_dir, workdir):
+    # conftest roda o pipeline com --universe all
+    args = pipeline_job.last_run_args(str(pipeline_dir / "outputs" / "run_report" / "last_run.json"))
+    assert args[:4] == ["--universe", "all", "--periods", "annual"]
+    assert args[4] == "--export"
+    assert "--refresh" not in args
+
+    assert pipeline_job.last_run_args(str(workdir / "missing.json")) == []
+    (workdir / "last_run.json").write_text('{"args": {"universe": "banks", "periods": "quarterly", "export": []}}')
+    assert pipeline_job.last_run_args(str(workdir / "last_run.json")) == [
+        "--universe", "banks", "--periods", "quarterly", "--export",
+    ]
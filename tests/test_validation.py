@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from validation import (
+    RULES,
+    VIOLATION_COLUMNS,
+    check_dataset,
+    check_statements,
+    read_violations,
+    write_violations,
+)
+
+DATE = "2024-12-31"
+
+
+def statement(rows):
+    df = pd.DataFrame(rows, columns=["DENOM_CIA", "CD_CONTA", "DS_CONTA", "VL_CONTA"])
+    return df.assign(DT_REFER=DATE, ORDEM_EXERC="ÚLTIMO")
+
+
+def test_balance_identity_and_children():
+    statements = {
+        "BPA": statement([
+            ("A", "1", "Ativo Total", 100.0), ("A", "1.01", "Circulante", 100.0),
+            ("B", "1", "Ativo Total", 80.0), ("B", "1.01", "Circulante", 70.0),
+        ]),
+        "BPP": statement([("A", "2", "Passivo Total", 100.0), ("B", "2", "Passivo Total", 90.0)]),
+    }
+    v = check_statements(statements, 2024)
+    assert list(v.columns) == VIOLATION_COLUMNS
+
+    identity = v[v["rule"] == "balance_identity"]
+    assert identity["DENOM_CIA"].tolist() == ["B"]
+    assert identity[["value", "expected"]].iloc[0].tolist() == [80.0, 90.0]
+
+    children = v[v["rule"] == "BPA_children"]
+    assert children["DENOM_CIA"].tolist() == ["B"]
+    assert children["subject"].tolist() == ["1"]
+    assert (v["year"] == 2024).all()
+
+
+def test_prior_rows_are_not_checked():
+    bpa = statement([("A", "1", "Ativo Total", 100.0), ("A", "1.01", "Circulante", 50.0)])
+    bpa["ORDEM_EXERC"] = "PENÚLTIMO"
+    assert check_statements({"BPA": bpa}, 2024).empty
+
+
+def test_empty_or_missing_statements():
+    empty = statement([])
+    assert check_statements({"BPA": empty, "BPP": empty}, 2024).empty
+    assert check_statements({"BPA": empty}, 2024).empty
+
+
+def test_sign_and_zscore_rules():
+    years = list(range(2015, 2025))
+    roe = [0.10, 0.11, 0.09, 0.10, 0.12, 0.10, 0.11, 0.09, 0.10, 0.90]
+    pivot = pd.DataFrame({
+        "DENOM_CIA": "A",
+        "year": years,
+        "DT_REFER": [f"{y}-12-31" for y in years],
+        "total_assets": [100.0] * 9 + [-1.0],
+        "ROE": roe,
+    })
+    v = check_dataset(pivot)
+    sign = v[v["rule"] == "total_assets_positive"]
+    assert sign["year"].tolist() == [2024]
+
+    outlier = v[v["rule"] == "ROE_outlier"]
+    assert outlier["year"].tolist() == [2024]
+    # média dos demais anos, sem o próprio outlier
+    assert np.isclose(outlier["expected"].iloc[0], np.mean(roe[:-1]))
+    assert outlier["score"].iloc[0] > RULES["ROE_outlier"]["threshold"]
+
+
+def test_zscore_needs_history():
+    pivot = pd.DataFrame({"DENOM_CIA": "A", "year": [2022, 2023, 2024], "DT_REFER": "x", "ROE": [0.1, 0.1, 5.0]})
+    assert check_dataset(pivot).empty
+
+
+def test_violations_roundtrip(workdir):
+    v = check_dataset(pd.DataFrame({"DENOM_CIA": ["A"], "year": [2024], "DT_REFER": [DATE], "equity": [-5.0]}))
+    write_violations(v, "outputs/validation/violations.parquet")
+    back = read_violations("outputs/validation/violations.parquet")
+    assert back["rule"].astype(str).tolist() == ["equity_positive"]
+    assert back["severity"].astype(str).tolist() == ["warning"]
+
+
+def test_pipeline_writes_violations(in_pipeline_dir):
+    v = read_violations()
+    assert list(v.columns) == VIOLATION_COLUMNS
+    # nos sintéticos os pais são a soma dos filhos
+    assert not v["rule"].astype(str).isin(["BPA_children", "BPP_children"]).any()